@@ -5,45 +5,54 @@ import os
 import plotly.graph_objects as go
 import plotly.express as px
 from dotenv import load_dotenv
-import requests
-import json
 import re
 import numpy as np
-from typing import Dict, Optional, Union
+from typing import Any, Callable, Dict, FrozenSet, Hashable, List, Optional, Tuple, Union
+import time
 import traceback
+from batch import BATCH_LLM_CONCURRENCY, BATCH_MAX_QUERIES, bounded_map, shared_slices, unique_queries
+from code_cache import ResultCache
+from dataset_prep import normalize_text
+from dataset_registry import Dataset, DatasetRegistry
+from location_index import LocationIndex
+from intent_parser import SummaryFastPath
+from llm_client import LLMClient, LLMError
+from prompts import PromptBuilder
+from response_cache import ResponseCache, query_entities
+from executor_pool import ExecutionError, ExecutorPool
+from figure_cache import FigureCache, add_validators, not_modified
+from sandbox import run_generated_code
+from downsample import downsample_figure
+from serialization import dumps, figure_dict, json_response, raw_json, typed_arrays
+from singleflight import SingleFlight
+from sql_engine import ENGINES, SqlEngine, engine_kind, sql_figure, summary_values
+from tracing import Timings, current_trace, init_app
+from compression import init_app as init_compression
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)
-
-# ✅ Dropbox Direct Download Links
-DATASET_FILES = {
-    "us_cases": "data/covid19_us_daily_cases.csv",
-    "us_deaths": "data/covid19_us_daily_deaths.csv",
-    "global_cases": "data/covid19_global_daily_cases.csv",
-    "global_deaths": "data/covid19_global_daily_deaths.csv",
-}
-
-# ✅ Load datasets from Dropbox
-def load_datasets() -> Dict[str, pd.DataFrame]:
-    datasets = {}
-    for key, url in DATASET_FILES.items():
-        print(f"Loading dataset '{key}' from local file...")
-        try:
-            datasets[key] = pd.read_csv(url)
-            print(f"✅ Loaded '{key}'")
-        except Exception as e:
-            print(f"❌ Error loading '{key}': {e}")
-    return datasets
-
-DATASETS = load_datasets()
+init_app(app)
+init_compression(app)
+
+REGISTRY = DatasetRegistry.load()
+LLM = LLMClient.from_env()
+LLM_CACHE = ResponseCache.from_env()
+RESULT_CACHE = ResultCache(int(os.getenv("RESULT_CACHE_SIZE", "256")))
+FIGURE_CACHE = FigureCache.from_env()
+FAST_PATH = SummaryFastPath()
+PROMPTS = PromptBuilder.from_env()
+FLIGHTS = SingleFlight()
+SQL = SqlEngine.from_env()
+LLM_MODEL = "agentica-org/deepcoder-14b-preview:free"
+LLM_PARAMS = {"query": {}, "summary": {"temperature": 0}, "query_sql": {}, "summary_sql": {"temperature": 0}}
 
 # ===== Helper Functions =====
 def extract_code_from_llm_response(text: str) -> str:
     # Extract code inside triple backticks
-    match = re.search(r"```(?:python)?(.*?)```", text, re.DOTALL)
+    match = re.search(r"```(?:python|sql)?(.*?)```", text, re.DOTALL)
     if match:
         return match.group(1).strip()
     else:
@@ -66,159 +75,241 @@ def safe_convert(obj):
         return float(obj)
     return str(obj)
 
-def run_code_and_return_plot(code: str, df: pd.DataFrame, user_query: str) -> Dict[str, Optional[Union[dict, str]]]:
-    local_env = {"df": df.copy(), "pd": pd, "go": go, "px": px}
+def run_code_and_return_plot(code: str, df: pd.DataFrame, user_query: str,
+                             frames: Optional[Dict[str, pd.DataFrame]] = None,
+                             index: Optional[LocationIndex] = None,
+                             typed: bool = False) -> Dict[str, Optional[Union[bytes, dict, str]]]:
+    timings = Timings()
+    rewrites: List[str] = []
     try:
-        exec(code, {}, local_env)
+        with timings.stage("exec"):
+            local_env = run_generated_code(code, df, frames, index, rewrites, pd=pd, go=go, px=px)
         fig = local_env.get("fig")
         if fig is None:
-            return {"plot": None, "error": "LLM did not generate a figure."}
-        fig_dict = fig.to_dict()
-        fig_json = json.loads(json.dumps(fig_dict, default=safe_convert))
-        return {"plot": fig_json, "error": None}
+            return {"plot": None, "error": "LLM did not generate a figure.", "timings": timings, "rewrites": rewrites}
+        return {**figure_result(fig, timings, typed), "rewrites": rewrites}
+    except (MemoryError, ExecutionError):
+        # the executor turns these into its memory / error statuses (and counts them)
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        return {"plot": None, "error": str(e) or type(e).__name__, "timings": timings, "rewrites": rewrites}
+
+def run_sql_and_return_plot(sql: str, dataset: Dataset, typed: bool = False) -> Dict[str, Optional[Union[bytes, dict, str]]]:
+    timings = Timings()
+    try:
+        with timings.stage("sql"):
+            result = SQL.query(dataset, sql)
+        with timings.stage("chart"):
+            fig = sql_figure(sql, result)
+        return figure_result(fig, timings, typed)
+    except (MemoryError, ExecutionError):
+        raise
     except Exception as e:
         traceback.print_exc()
+        return {"plot": None, "error": str(e) or type(e).__name__, "timings": timings}
+
+def figure_result(fig: go.Figure, timings: Timings, typed: bool) -> Dict[str, Optional[Union[bytes, dict, str]]]:
+    with timings.stage("figure_dict"):
+        fig_dict = figure_dict(fig)
+    with timings.stage("downsample"):
+        fig_dict, points = downsample_figure(fig_dict)
+    with timings.stage("serialize"):
+        plot = dumps(typed_arrays(fig_dict) if typed else fig_dict)
+    return {"plot": plot, "points": points, "error": None, "timings": timings}
+
+def run_code_and_return_summary(code: str, df: pd.DataFrame,
+                                frames: Optional[Dict[str, pd.DataFrame]] = None,
+                                index: Optional[LocationIndex] = None) -> str:
+    return format_summary(run_generated_code(code, df, frames, index, pd=pd))
+
+def run_sql_and_return_summary(sql: str, dataset: Dataset) -> str:
+    return format_summary(summary_values(SQL.query(dataset, sql)))
+
+def format_summary(local_env: dict) -> str:
+    response_lines = []
+    if "total" in local_env:
+        response_lines.append(f"Total: {safe_convert(local_env.get('total'))}")
+    if "max_daily" in local_env:
+        response_lines.append(f"Max Daily: {safe_convert(local_env.get('max_daily'))}")
+    if "peak_date" in local_env:
+        response_lines.append(f"Peak Date: {safe_convert(local_env.get('peak_date'))}")
+    summary_text = "\n".join(response_lines) if response_lines else "Data not available"
+    return summary_text.strip()
+
+def plot_task(dataset: Dataset, code: str, user_query: str,
+              typed: bool = False) -> Dict[str, Optional[Union[bytes, dict, str]]]:
+    return run_code_and_return_plot(code, dataset.df, user_query, dataset.rollups, dataset.index, typed)
+
+def summary_task(dataset: Dataset, code: str) -> str:
+    return run_code_and_return_summary(code, dataset.df, dataset.rollups, dataset.index)
+
+def sql_plot_task(dataset: Dataset, sql: str, user_query: str,
+                  typed: bool = False) -> Dict[str, Optional[Union[bytes, dict, str]]]:
+    return run_sql_and_return_plot(sql, dataset, typed)
+
+def sql_summary_task(dataset: Dataset, sql: str) -> str:
+    return run_sql_and_return_summary(sql, dataset)
+
+def plot_batch_task(dataset: Dataset, code: str, user_query: str) -> Dict[str, Optional[Union[bytes, dict, str]]]:
+    return run_code_and_return_plot(code, dataset.df, user_query, dataset.rollups, shared_slices(dataset))
+
+def summary_batch_task(dataset: Dataset, code: str) -> Dict[str, Optional[str]]:
+    try:
+        return {"summary": run_code_and_return_summary(code, dataset.df, dataset.rollups, shared_slices(dataset)),
+                "error": None}
+    except (MemoryError, ExecutionError):
+        raise
+    except Exception as e:
+        return {"summary": None, "error": f"Code execution error: {e}"}
+
+def execute_plot(dataset: Dataset, code: str, user_query: str,
+                 typed: bool = False, engine: str = "pandas") -> Dict[str, Optional[Union[bytes, dict, str]]]:
+    trace = current_trace()
+    trace.set(result_cache="miss")
+    try:
+        with trace.span("execute"):
+            result = EXECUTOR.run(engine_kind("query", engine), dataset, code, user_query, typed)
+    except ExecutionError as e:
         return {"plot": None, "error": str(e)}
+    # exec (or sql / chart) / figure_dict / downsample / serialize, measured in the executor
+    trace.add_timings(result.get("timings"))
+    if result.get("rewrites"):
+        trace.set(rewrites=result["rewrites"])
+    if result.get("points"):
+        trace.set(points=result["points"])
+    return result
+
+def execute_summary(dataset: Dataset, code: str, engine: str = "pandas") -> str:
+    """The summary text of `code` (raises ExecutionError, so failed runs are never cached)."""
+    trace = current_trace()
+    trace.set(result_cache="miss")
+    with trace.span("execute"):
+        return EXECUTOR.run(engine_kind("summary", engine), dataset, code)
+
+def generate_code(kind: str, dataset: Dataset, user_query: str, entities: FrozenSet[str]) -> Tuple[str, float]:
+    """Ask the LLM for a snippet; return it and the seconds it took (raises LLMError)."""
+    trace = current_trace()
+    with trace.span("prompt"):
+        prompt, prompt_tokens = PROMPTS.build(kind, dataset, user_query, entities)
+    trace.set(prompt_tokens=prompt_tokens)
+    started = time.perf_counter()
+    with trace.span("llm"):
+        content = LLM.complete([{"role": "user", "content": prompt}], LLM_MODEL, **LLM_PARAMS[kind])
+    with trace.span("extract"):
+        code = extract_code_from_llm_response(content)
+    return code, time.perf_counter() - started
+
+def execute_batch(kind: str, dataset: Dataset, items: List[Tuple[str, str]]) -> List[dict]:
+    """Run (code, query) pairs as separate executor tasks, as many at a time as there are executors."""
+    def run(item: Tuple[str, str]) -> dict:
+        code, user_query = item
+        try:
+            if kind == "query":
+                return EXECUTOR.run("query_batch", dataset, code, user_query)
+            return EXECUTOR.run("summary_batch", dataset, code)
+        except ExecutionError as e:
+            return {"error": str(e)}
+
+    results = bounded_map(run, items, max(1, EXECUTOR.workers))
+    return [{"error": f"{type(r).__name__}: {r}"} if isinstance(r, Exception) else r for r in results]
+
+def coalesced(stage: str, key: Hashable, fn: Callable[[], Any]) -> Any:
+    """`fn()`, shared with identical requests already computing it."""
+    value, shared = FLIGHTS.do(stage, key, fn)
+    if shared:
+        current_trace().set(coalesced=stage)
+    return value
+
+def plot_for_code(dataset: Dataset, code: str, user_query: str, encoding: str,
+                  engine: str = "pandas") -> Dict[str, Any]:
+    return coalesced("execute_query", (dataset.version, code, encoding, engine),
+                     lambda: FIGURE_CACHE.memoize(dataset.version, code, lambda: execute_plot(
+                         dataset, code, user_query, encoding == "typed", engine), encoding, engine))
+
+def summary_for_code(dataset: Dataset, code: str, engine: str = "pandas") -> str:
+    kind = engine_kind("summary", engine)
+    return coalesced("execute_summary", (dataset.version, code),
+                     lambda: RESULT_CACHE.memoize(kind, dataset.version, code,
+                                                  lambda: execute_summary(dataset, code, engine)))
+
+def new_plot(dataset: Dataset, user_query: str, entities: FrozenSet[str], encoding: str,
+             engine: str = "pandas") -> Tuple[str, Dict[str, Any]]:
+    """Code (or SQL) from the LLM and its figure; it is cached before identical waiting requests resume."""
+    kind = engine_kind("query", engine)
+    code, llm_seconds = generate_code(kind, dataset, user_query, entities)
+    result = plot_for_code(dataset, code, user_query, encoding, engine)
+    # Only cache code that actually produced a figure.
+    if result["error"] is None:
+        LLM_CACHE.put(kind, dataset.key, user_query, code, llm_seconds, entities)
+    return code, result
+
+def new_summary(dataset: Dataset, user_query: str, entities: FrozenSet[str],
+                engine: str = "pandas") -> Tuple[str, str]:
+    kind = engine_kind("summary", engine)
+    code, llm_seconds = generate_code(kind, dataset, user_query, entities)
+    summary_text = summary_for_code(dataset, code, engine)
+    LLM_CACHE.put(kind, dataset.key, user_query, code, llm_seconds, entities)
+    return code, summary_text
+
+def engine_error(engine: str) -> Optional[tuple]:
+    """A 400 response for an unknown engine, or for engine=sql without duckdb installed."""
+    if engine not in ENGINES:
+        return jsonify({"error": f"Invalid engine: {engine} (expected {' or '.join(ENGINES)})"}), 400
+    if engine == "sql" and not SQL.available:
+        return jsonify({"error": "engine=sql is not available: the duckdb package is not installed."}), 400
+    return None
+
+# The executor zygote is forked here, with the datasets mapped and before any thread starts
+EXECUTOR = ExecutorPool.from_env(REGISTRY, {"query": plot_task, "summary": summary_task,
+                                            "query_sql": sql_plot_task, "summary_sql": sql_summary_task,
+                                            "query_batch": plot_batch_task, "summary_batch": summary_batch_task})
+REGISTRY.watch(float(os.getenv("DATASET_RELOAD_INTERVAL", "30")))
 
 # ===== /query Route =====
-@app.route("/query", methods=["POST"])
+# GET takes the same fields as query parameters, so browsers can revalidate figures with If-None-Match
+@app.route("/query", methods=["GET", "POST"])
 def handle_query():
     try:
-        user_query = request.json.get("query", "")
-        dataset_key = request.json.get("dataset", "us_deaths")
+        params = request.args if request.method == "GET" else request.json
+        user_query = params.get("query", "")
+        dataset_key = params.get("dataset", "us_deaths")
+        # plotly.js >= 2.28 clients can ask for base64 typed arrays instead of number lists
+        encoding = "typed" if params.get("typed_arrays") in (True, "1", "true") else "json"
+        # "sql": the LLM writes a DuckDB query instead of a pandas snippet
+        engine = params.get("engine", "pandas")
         if not user_query:
             return jsonify({"error": "Query cannot be empty."}), 400
-        df = DATASETS.get(dataset_key)
-        if df is None:
+        dataset = REGISTRY.get(dataset_key)
+        if dataset is None:
             return jsonify({"error": f"Invalid dataset key: {dataset_key}"}), 400
-        if 'Date' in df.columns:
-            df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-        columns_list = ', '.join(df.columns.tolist())
-        prompt = f"""
-You are a Python data visualization expert using Plotly and Pandas.
-
-📝 A user asked: "{user_query}"
-
-You are working with a Pandas DataFrame named `df` loaded from a COVID-19 dataset: `{dataset_key}`.
-
-The available datasets are:
-
----
-
-🔹 **Dataset: global_deaths**
-- Columns: 'Country/Region', 'Province/State', 'Lat', 'Long', 'Date', 'Deaths', 'Daily_Deaths'
-- Use `Daily_Deaths` for daily death queries (e.g., "deaths in India on April 21, 2021")
-- Use `Deaths` for cumulative totals (e.g., "total deaths in Italy until May 2021")
-- Filter by: 'Country/Region', optionally 'Province/State'
-- Use: `px.bar()` for single-day, `px.line()` for trends
-
----
-
-🔹 **Dataset: us_deaths**
-- Columns: 'Admin2', 'Province_State', 'Country_Region', 'Date', 'Deaths', 'Daily_Deaths'
-- Use `Daily_Deaths` for daily trends or per-date queries
-- Use `Deaths` only for cumulative totals if the user asks for total deaths
-- Filter by: 'Province_State' or 'Admin2'
-- Use: `px.bar()` for single-day or comparison, `px.line()` for time series
-
----
-
-🔹 **Dataset: global_cases**
-- Columns: 'Country/Region', 'Province/State', 'Lat', 'Long', 'Date', 'Cases', 'Daily_Cases'
-- Use `Daily_Cases` for daily new cases or trends
-- Use `Cases` for cumulative totals
-- Filter by: 'Country/Region' and optionally 'Province/State'
-- Use: `px.line()` for trends, `px.bar()` for one-time comparisons
-
----
-
-🔹 **Dataset: us_cases**
-- Columns: 'Admin2', 'Province_State', 'Country_Region', 'Date', 'Cases', 'Daily_Cases'
-- Use `Daily_Cases` for trends or day-specific queries
-- Use `Cases` if the user asks for total or cumulative cases
-- Filter by: 'Province_State' or 'Admin2'
-- Use: `px.bar()` for daily comparisons, `px.line()` for time series
-
----
-must use columns which are available in the dataset : {columns_list}
-
-
-
-📅 Date Handling (All Datasets):
-- Always convert using: `df['Date'] = pd.to_datetime(df['Date'])`
-- For exact date: `df['Date'] == pd.to_datetime('YYYY-MM-DD')`
-- For month/year: use `.dt.month` and `.dt.year`
-
-📊 Aggregation Tips:
-- Use `groupby('Date')` or `groupby('Province_State')` as needed
-- Always use `.reset_index()` after groupby
-
-🖼️ Output Format:
-- Only return Python code in triple backticks
-- Assign your chart to a variable called `fig`
-- DO NOT use markdown, `print()`, or `return fig`
-
-Example output format:
-
-```python
-fig = px.line(...)
-fig.update_layout(title="...")
-Your task is to understand the dataset type from {dataset_key} and generate an appropriate Plotly chart using only available column names{columns_list}.
-- When using `update_xaxes` or `update_yaxes`, only use valid Plotly properties.
-- For `rangemode`, allowed values are: 'normal', 'tozero', 'nonnegative'.
-- Do NOT use 'auto' for `rangemode`.
-
-🎯 Example Plotly Visualizations:
-
-first make the df based on the user selected dataset and then make the plot
-1️ Line Chart - Daily Cases Over Time in india
-
-fig = px.line(df[df['Country/Region'] == 'India'], 
-              x='Date', 
-              y='Daily_Cases',
-              title='Daily COVID-19 Cases in India Over Time')
-fig.show()
-
-2  Bar Chart – Top 10 Countries by Daily Deaths
-
-
-country_deaths = df.groupby('Country/Region')['Daily_Deaths'].sum().reset_index()
-top10 = country_deaths.sort_values(by='Daily_Deaths', ascending=False).head(10)
-fig = px.bar(top10, x='Country/Region', y='Daily_Deaths', title='Top 10 Countries by Daily Deaths')
-fig.show()
-
-3 Choropleth Map – Global Daily Deaths
-
-global_deaths = df.groupby('Country/Region')['Daily_Deaths'].sum().reset_index()
-fig = px.choropleth(global_deaths, locations='Country/Region', locationmode='country names',
-                    color='Daily_Deaths', title='Global COVID-19 Daily Deaths')
-fig.show()
-
-4  Pie Chart – Share of Daily Cases Among Top 5 Countries
-
-country_cases = df.groupby('Country/Region')['Daily_Cases'].sum().reset_index()
-top5 = country_cases.sort_values(by='Daily_Cases', ascending=False).head(5)
-fig = px.pie(top5, names='Country/Region', values='Daily_Cases', title='Top 5 Countries by Daily Cases')
-fig.show()
-
-5 Area Chart – Daily Cases Over Time for Selected Countries
-
-country_cases = df.groupby('Country/Region')['Daily_Cases'].sum().reset_index()
-fig = px.area(country_cases, x='Date', y='Daily_Cases', color='Country/Region', title='Daily Cases Over Time by Country')
-fig.show()
-
- Note: Always ensure proper data filtering, grouping, and sorting before plotting. Stick to using Daily_Cases for cases and Daily_Deaths for deaths across all chart types.
-
- """
-        headers = {"Authorization": f"Bearer {os.getenv('OPENROUTER_API_KEY')}", "Content-Type": "application/json"}
-        payload = {"model": "agentica-org/deepcoder-14b-preview:free", "messages": [{"role": "user", "content": prompt}]}
-        response = requests.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=payload)
-        if response.status_code != 200:
-            return jsonify({"error": f"OpenRouter API error: {response.text}"}), 500
-        llm_data = response.json()
-        code = extract_code_from_llm_response(llm_data["choices"][0]["message"]["content"])
-        result = run_code_and_return_plot(code, df, user_query)
-        return jsonify({"code": code, "visualization": result["plot"], "error": result["error"]})
+        error = engine_error(engine)
+        if error:
+            return error
+        trace = current_trace()
+        trace.set(dataset=dataset_key, engine=engine)
+        with trace.span("llm_cache"):
+            entities = query_entities(user_query, dataset.vocabulary)
+            code = LLM_CACHE.get(engine_kind("query", engine), dataset_key, user_query, entities)
+        trace.set(llm_cache="miss" if code is None else "hit", result_cache="hit")
+        # Concurrent identical questions share one LLM call and one run.
+        if code is None:
+            try:
+                code, result = coalesced("generate_query",
+                                         (dataset.version, normalize_text(user_query), encoding, engine),
+                                         lambda: new_plot(dataset, user_query, entities, encoding, engine))
+            except LLMError as e:
+                return jsonify({"error": f"OpenRouter API error: {e}"}), 500
+        else:
+            etag = FIGURE_CACHE.revalidate(dataset.version, code, request.if_none_match, encoding, engine)
+            if etag is not None:
+                trace.set(result_cache="not_modified")
+                return not_modified(etag)
+            result = plot_for_code(dataset, code, user_query, encoding, engine)
+        with trace.span("response"):
+            response = json_response({"code": code, "visualization": raw_json(result["plot"]),
+                                      "points": result.get("points"), "error": result["error"]})
+        return add_validators(response, result.get("etag"))
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": f"{type(e).__name__}: {str(e)}"}), 500
@@ -229,73 +320,166 @@ def handle_summary():
     try:
         user_query = request.json.get("query", "")
         dataset_key = request.json.get("dataset", "us_deaths")
+        engine = request.json.get("engine", "pandas")
         if not user_query:
             return jsonify({"error": "Query cannot be empty."}), 400
-        df = DATASETS.get(dataset_key)
-        if df is None:
+        dataset = REGISTRY.get(dataset_key)
+        if dataset is None:
             return jsonify({"error": f"Invalid dataset key: {dataset_key}"}), 400
-        if 'Date' in df.columns:
-            df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-        columns_list = ', '.join(df.columns.tolist())
-        prompt = f"""
-You are a Python data analyst.
-
-### User Query:
-"{user_query}"
-
-You are working with a Pandas DataFrame `df` with columns:
-{columns_list}
-
----
-
-### Task:
-- Understand the query and calculate ONLY what's requested:
-   - For total deaths or cases ➜ assign to `total`
-   - For max daily ➜ assign to `max_daily`
-   - For peak date ➜ assign to `peak_date`
-- If not asked, DO NOT calculate unnecessary values.
-- If data is missing, assign "Data not available".
-- If the dataset is related to deaths always use Daily_Deaths column to give output or to make sum or to get deaths between to dates
-Only return Python code inside triple backticks. No explanations.
-
-### Example:
-
-Query: "Total deaths in India"
-```python
-filtered_df = df[df['Country/Region'] == 'India']
-total = filtered_df['Daily_Deaths'].sum()
-
-Query: "Max daily deaths in USA"
-```python
-filtered_df = df[df['Country/Region'] == 'USA']
-max_daily = filtered_df['Daily_Deaths'].max()
-
-
-If unclear:
-total = "Data not available"
-"""
-        headers = {"Authorization": f"Bearer {os.getenv('OPENROUTER_API_KEY')}", "Content-Type": "application/json"}
-        payload = {"model": "agentica-org/deepcoder-14b-preview:free", "messages": [{"role": "user", "content": prompt}], "temperature": 0}
-        response = requests.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=payload)
-        if response.status_code != 200:
-            return jsonify({"error": f"OpenRouter API error: {response.text}"}), 500
-        llm_data = response.json()
-        code = extract_code_from_llm_response(llm_data["choices"][0]["message"]["content"])
-        local_env = {"df": df.copy(), "pd": pd}
-        exec(code, {}, local_env)
-        response_lines = []
-        if "total" in local_env:
-            response_lines.append(f"Total: {safe_convert(local_env.get('total'))}")
-        if "max_daily" in local_env:
-            response_lines.append(f"Max Daily: {safe_convert(local_env.get('max_daily'))}")
-        if "peak_date" in local_env:
-            response_lines.append(f"Peak Date: {safe_convert(local_env.get('peak_date'))}")
-        summary_text = "\n".join(response_lines) if response_lines else "Data not available"
-        return jsonify({"summary": summary_text.strip(), "error": None})
+        error = engine_error(engine)
+        if error:
+            return error
+        df = dataset.df
+        trace = current_trace()
+        trace.set(dataset=dataset_key, engine=engine)
+        with trace.span("fast_path"):
+            fast_values = FAST_PATH.answer(user_query, dataset_key, dataset.version, df, dataset.rollups,
+                                           dataset.vocabulary)
+        trace.set(fast_path=fast_values is not None)
+        if fast_values is not None:
+            return jsonify({"summary": format_summary(fast_values), "error": None})
+        with trace.span("llm_cache"):
+            entities = query_entities(user_query, dataset.vocabulary)
+            code = LLM_CACHE.get(engine_kind("summary", engine), dataset_key, user_query, entities)
+        trace.set(llm_cache="miss" if code is None else "hit", result_cache="hit")
+        try:
+            if code is None:
+                code, summary_text = coalesced("generate_summary",
+                                               (dataset.version, normalize_text(user_query), engine),
+                                               lambda: new_summary(dataset, user_query, entities, engine))
+            else:
+                summary_text = summary_for_code(dataset, code, engine)
+        except LLMError as e:
+            return jsonify({"error": f"OpenRouter API error: {e}"}), 500
+        except ExecutionError as e:
+            # a failed, timed-out or killed snippet is an answer, like a /query plot error
+            return jsonify({"summary": None, "error": str(e)})
+        return jsonify({"summary": summary_text, "error": None})
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": f"{type(e).__name__}: {str(e)}"}), 500
 
+# ===== Batch Routes =====
+def read_batch_request() -> Tuple[Optional[Dataset], List[str], Optional[tuple]]:
+    """(dataset, queries, None) for a valid batch request, else (None, [], error response)."""
+    queries = request.json.get("queries")
+    dataset_key = request.json.get("dataset", "us_deaths")
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q for q in queries):
+        return None, [], (jsonify({"error": "`queries` must be a non-empty list of questions."}), 400)
+    if len(queries) > BATCH_MAX_QUERIES:
+        return None, [], (jsonify({"error": f"At most {BATCH_MAX_QUERIES} queries per batch."}), 400)
+    dataset = REGISTRY.get(dataset_key)
+    if dataset is None:
+        return None, [], (jsonify({"error": f"Invalid dataset key: {dataset_key}"}), 400)
+    return dataset, queries, None
+
+def cached_result(kind: str, dataset: Dataset, code: str) -> Optional[dict]:
+    """Figures come from the figure cache; summaries are cached as their text, like /summary."""
+    if kind == "query":
+        return FIGURE_CACHE.get(dataset.version, code)
+    summary_text = RESULT_CACHE.get("summary", dataset.version, code)
+    return None if summary_text is None else {"summary": summary_text, "error": None}
+
+def store_result(kind: str, dataset: Dataset, code: str, result: dict) -> None:
+    if kind == "query":
+        FIGURE_CACHE.put(dataset.version, code, result)
+    else:
+        RESULT_CACHE.put("summary", dataset.version, code, result["summary"])
+
+def answer_batch(kind: str, dataset: Dataset, queries: List[str]) -> List[dict]:
+    """Answers for distinct queries: fast path, cached or concurrently generated code, executor runs."""
+    trace = current_trace()
+    answers: List[Optional[dict]] = [None] * len(queries)
+    if kind == "summary":
+        with trace.span("fast_path"):
+            for i, user_query in enumerate(queries):
+                fast_values = FAST_PATH.answer(user_query, dataset.key, dataset.version, dataset.df,
+                                               dataset.rollups, dataset.vocabulary)
+                if fast_values is not None:
+                    answers[i] = {"summary": format_summary(fast_values), "error": None}
+    todo = [i for i, answer in enumerate(answers) if answer is None]
+    with trace.span("llm_cache"):
+        entities = {i: query_entities(queries[i], dataset.vocabulary) for i in todo}
+        codes = {i: LLM_CACHE.get(kind, dataset.key, queries[i], entities[i]) for i in todo}
+    misses = [i for i in todo if codes[i] is None]
+    llm_seconds = {}
+    with trace.span("llm"):
+        generated = bounded_map(lambda i: generate_code(kind, dataset, queries[i], entities[i]), misses,
+                                BATCH_LLM_CONCURRENCY)
+    for i, outcome in zip(misses, generated):
+        if isinstance(outcome, Exception):
+            answers[i] = {"error": f"OpenRouter API error: {outcome}" if isinstance(outcome, LLMError)
+                          else f"{type(outcome).__name__}: {outcome}"}
+        else:
+            codes[i], llm_seconds[i] = outcome
+    todo = [i for i in todo if answers[i] is None]
+
+    # Each distinct snippet runs at most once.
+    results = {}
+    for i in todo:
+        cached = cached_result(kind, dataset, codes[i])
+        if cached is not None:
+            results[codes[i]] = cached
+    pending = list({codes[i]: queries[i] for i in todo if codes[i] not in results}.items())
+    trace.set(llm_calls=len(misses), executed=len(pending))
+    if pending:
+        with trace.span("execute"):
+            for (code, _), result in zip(pending, execute_batch(kind, dataset, pending)):
+                results[code] = result
+                if result.get("error") is None:
+                    store_result(kind, dataset, code, result)
+    for i in todo:
+        answers[i] = {"code": codes[i], **results[codes[i]]}
+        if i in llm_seconds and answers[i].get("error") is None:
+            LLM_CACHE.put(kind, dataset.key, queries[i], codes[i], llm_seconds[i], entities[i])
+    return answers
+
+@app.route("/batch_summary", methods=["POST"])
+def handle_batch_summary():
+    try:
+        dataset, queries, error = read_batch_request()
+        if error:
+            return error
+        distinct, positions = unique_queries(queries)
+        trace = current_trace()
+        trace.set(dataset=dataset.key, queries=len(queries), distinct=len(distinct))
+        answers = answer_batch("summary", dataset, distinct)
+        return jsonify({"results": [{"query": user_query, "summary": answers[position].get("summary"),
+                                     "error": answers[position]["error"]}
+                                    for user_query, position in zip(queries, positions)]})
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": f"{type(e).__name__}: {str(e)}"}), 500
+
+@app.route("/batch_query", methods=["POST"])
+def handle_batch_query():
+    try:
+        dataset, queries, error = read_batch_request()
+        if error:
+            return error
+        distinct, positions = unique_queries(queries)
+        trace = current_trace()
+        trace.set(dataset=dataset.key, queries=len(queries), distinct=len(distinct))
+        answers = answer_batch("query", dataset, distinct)
+        with trace.span("response"):
+            response = json_response({"results": [
+                {"query": user_query, "code": answers[position].get("code"),
+                 "visualization": raw_json(answers[position].get("plot")),
+                 "points": answers[position].get("points"), "error": answers[position]["error"]}
+                for user_query, position in zip(queries, positions)]})
+        return response
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": f"{type(e).__name__}: {str(e)}"}), 500
+
+# ===== /cache_stats Route =====
+@app.route("/cache_stats", methods=["GET"])
+def cache_stats():
+    return jsonify({**LLM_CACHE.report(), "results": RESULT_CACHE.report(),
+                    "figures": FIGURE_CACHE.report(),
+                    "summary_fast_path": FAST_PATH.report(), "executor": EXECUTOR.report(),
+                    "prompts": PROMPTS.report(), "coalescing": FLIGHTS.report()})
+
 # ===== Run Flask =====
 if __name__ == "__main__":
     print("🚀 Flask server running at http://localhost:5000")
@@ -1,8 +1,9 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import requests
 import json
 import os
+from llm_client import LLMClient, LLMError
+from viz_retrieval import VisualizationIndex
 
 app = Flask(__name__)
 CORS(app)  # Allow all origins for development
@@ -11,65 +12,80 @@ CORS(app)  # Allow all origins for development
 with open('visualizations.json', 'r') as f:
     visualizations = json.load(f)
 print(f"Loaded {len(visualizations)} visualizations from JSON file.")
-# Get OpenRouter API Key from environment variable
-OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
+# Pooled OpenRouter client (reads OPENROUTER_API_KEY from the environment)
+LLM = LLMClient.from_env()
+
+# Embedding index over the catalog (data/viz_chroma); the LLM only reranks a few candidates
+try:
+    VIZ_INDEX = VisualizationIndex.from_env(visualizations)
+except Exception as e:
+    print(f"Visualization index unavailable ({e}); the LLM will see the whole catalog.")
+    VIZ_INDEX = None
+# A top match this similar, and this far ahead of the runner-up, skips the LLM
+VIZ_ACCEPT_SCORE = float(os.getenv("VIZ_ACCEPT_SCORE", "0.6"))
+VIZ_ACCEPT_MARGIN = float(os.getenv("VIZ_ACCEPT_MARGIN", "0.05"))
+
+def visualization_result(viz):
+    return {
+        "text": f"Here is the best visualization for your query: {viz.get('title')}",
+        "title": viz.get("title"),
+        "description": viz.get("description"),
+        "viz_url": viz.get("viz_url")
+    }
 
-def call_openrouter_llm(user_query):
-    print(f"Loaded {len(visualizations)} visualizations from JSON file.")
+def retrieve_candidates(user_query):
+    if VIZ_INDEX is None:
+        return [(viz, None) for viz in visualizations]
+    return VIZ_INDEX.search(user_query)
 
+def call_openrouter_llm(user_query):
+    candidates = retrieve_candidates(user_query)
+    if not candidates:
+        return {"error": "No visualizations available."}
+    best, score = candidates[0]
+    runner_up = candidates[1][1] if len(candidates) > 1 else None
+    if score is not None and score >= VIZ_ACCEPT_SCORE and (runner_up is None or score - runner_up >= VIZ_ACCEPT_MARGIN):
+        print(f"Vector match ({score:.2f}): {best['id']}")
+        return visualization_result(best)
+
+    catalog = [{key: viz.get(key) for key in ("id", "title", "description", "tags")} for viz, _ in candidates]
     prompt = f"""
 You are a Visualization Retrieval AI.
 
-Given the following `visualization.json`:
-
-[INSERT visualization.json CONTENT HERE]
-
-And the user query:
+Given the user query:
 
 "{user_query}"
 
-Select the most relevant visualization. Match based on tags, title, and description. If no perfect match, suggest the closest available visualization.
+Select the most relevant visualization from the candidates below. Match based on tags, title, and description. If no perfect match, suggest the closest available visualization.
 
 
-Visualizations List:
-{json.dumps(visualizations, indent=2)}
+Candidates:
+{json.dumps(catalog, indent=2)}
 
 User Query: "{user_query}"
 
 Respond ONLY in this JSON format:
-{{"id": "viz_xxx", "title": "...", "description": "...", "viz_url": "..." }}
+{{"id": "viz_xxx", "title": "...", "description": "..." }}
 """
 
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json"
-    }
-
-    data = {
-        "model": "mistralai/mistral-7b-instruct",
-        "messages": [
-            {"role": "system", "content": "You are a visualization selector."},
-            {"role": "user", "content": prompt}
-        ]
-    }
-
-    response = requests.post("https://openrouter.ai/api/v1/chat/completions", headers=headers, json=data)
-
-    if response.status_code == 200:
-        try:
-            content = response.json()['choices'][0]['message']['content']
-            result = json.loads(content)
-            print(f"LLM Response: {result}")
-            return {
-                "text": f"Here is the best visualization for your query: {result.get('title')}",
-                "title": result.get("title"),
-                "description": result.get("description"),
-                "viz_url": result.get("viz_url")
-            }
-        except Exception as e:
-            return {"error": f"Failed to parse LLM response: {str(e)}"}
-    else:
-        return {"error": f"OpenRouter API Error: {response.status_code}"}
+    messages = [
+        {"role": "system", "content": "You are a visualization selector."},
+        {"role": "user", "content": prompt}
+    ]
+
+    try:
+        content = LLM.complete(messages, "mistralai/mistral-7b-instruct")
+    except LLMError as e:
+        return {"error": f"OpenRouter API Error: {e.status_code or e}"}
+
+    try:
+        result = json.loads(content)
+        print(f"LLM Response: {result}")
+        chosen = next((viz for viz, _ in candidates if viz["id"] == result.get("id")), None)
+        # An id outside the candidates has no catalog entry (and no viz_url): use the closest match.
+        return visualization_result(chosen or best)
+    except Exception as e:
+        return {"error": f"Failed to parse LLM response: {str(e)}"}
 
 @app.route('/get_visualization', methods=['POST'])
 def get_visualization():
@@ -0,0 +1,105 @@
+"""Helpers for answering many questions about one dataset in one request.
+
+Dashboards ask /summary the same thing once per state. /batch_summary and
+/batch_query take the whole list. Each question is first answered the
+cheapest way it can be (fast path, cached code, cached result). Questions
+that still need code call the LLM concurrently, at most
+BATCH_LLM_CONCURRENCY calls at a time. Each snippet that still has to run
+is its own executor task, with its own deadline and result, so one slow
+or runaway snippet fails alone.
+
+Each executor process keeps one `SharedSlices` per dataset version
+(`shared_slices`). It stands in for the dataset's LocationIndex and
+memoizes the last BATCH_SHARED_SLICES `slice_location` results by their
+arguments, so fifty snippets filtering Texas slice it once, whichever
+executor runs them. The rollups are the shared groupbys by date.
+"""
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar, Union
+
+import pandas as pd
+
+from dataset_prep import normalize_text
+from dataset_registry import Dataset
+from location_index import LocationIndex
+from sandbox import dataset_view
+
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "100"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "4"))
+BATCH_SHARED_SLICES = int(os.getenv("BATCH_SHARED_SLICES", "64"))
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def unique_queries(queries: Sequence[str]) -> Tuple[List[str], List[int]]:
+    """Distinct queries (first spelling kept) and, per input query, its position among them."""
+    seen: Dict[str, int] = {}
+    distinct, positions = [], []
+    for query in queries:
+        key = normalize_text(query)
+        if key not in seen:
+            seen[key] = len(distinct)
+            distinct.append(query)
+        positions.append(seen[key])
+    return distinct, positions
+
+
+def bounded_map(fn: Callable[[T], R], items: Sequence[T], limit: int) -> List[Union[R, Exception]]:
+    """`fn` over `items` with at most `limit` calls in flight; failures come back as exceptions."""
+    def call(item: T) -> Union[R, Exception]:
+        try:
+            return fn(item)
+        except Exception as e:
+            return e
+
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(limit, len(items)))) as pool:
+        return list(pool.map(call, items))
+
+
+class SharedSlices:
+    """`slice_location` for batch snippets: each recently used slice is computed once."""
+
+    def __init__(self, index: LocationIndex, max_slices: int = BATCH_SHARED_SLICES):
+        self.index = index
+        self.max_slices = max_slices
+        self._slices: "OrderedDict[Tuple[Any, ...], pd.DataFrame]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def slice(self, location: str, start: Optional[Any] = None, end: Optional[Any] = None,
+              column: Optional[str] = None, exact: bool = False) -> pd.DataFrame:
+        key = (location, start, end, column, exact)
+        try:
+            hash(key)
+        except TypeError:  # e.g. a list of dates: nothing to share
+            return self.index.slice(location, start, end, column, exact)
+        with self._lock:
+            frame = self._slices.get(key)
+            if frame is not None:
+                self._slices.move_to_end(key)
+        if frame is None:
+            frame = self.index.slice(location, start, end, column, exact)
+            with self._lock:
+                self._slices[key] = frame
+                while len(self._slices) > self.max_slices:
+                    self._slices.popitem(last=False)
+        # A view per caller, so one snippet's column writes never leak into another's.
+        return dataset_view(frame)
+
+
+_shared: Dict[str, Tuple[str, SharedSlices]] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_slices(dataset: Dataset) -> SharedSlices:
+    """This process's SharedSlices for the dataset's current version."""
+    with _shared_lock:
+        cached = _shared.get(dataset.key)
+        if cached is None or cached[0] != dataset.version:
+            cached = _shared[dataset.key] = (dataset.version, SharedSlices(dataset.index))
+        return cached[1]
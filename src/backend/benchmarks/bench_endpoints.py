@@ -0,0 +1,350 @@
+"""End-to-end latency, throughput and memory of the Flask endpoints, offline.
+
+Usage (from src/backend):
+    python benchmarks/bench_endpoints.py --scales 1 10 100 --requests 200 --concurrency 4
+    python benchmarks/bench_endpoints.py --scales 1 --cold --llm-latency 1.5
+    python benchmarks/bench_endpoints.py --record     # fill in corpus entries without a completion
+
+For each scale it writes synthetic `covid19_*_daily_*.csv` files with the
+real files' columns and N times their locations (1x is 3342 US counties
+and 289 global places over 1143 days, ~4.2M rows in all; 100x is ~420M
+rows and needs tens of GB of disk and RAM for the store build). A local
+stub stands in for OpenRouter (OPENROUTER_BASE_URL). It answers with the
+completions recorded in recorded_completions.json, picking the entry
+whose query appears in the prompt, after an optional --llm-latency delay.
+
+Each endpoint is served by a fresh app process, so peaks are not shared:
+/query and /summary by --app (app or app1) and /get_visualization by
+app2. The queries for that endpoint are replayed --requests times from
+--concurrency client threads. The script reports p50/p95/p99 latency,
+throughput, error count, stub calls, and peak RSS (VmHWM) for the app
+process and its largest code executor. Executor RSS includes the mapped
+dataset pages it touched, which are shared with the app process.
+The app's caches stay on by default, so replays turn into cache hits the
+way repeated questions do in production. Use --cold to turn off the LLM
+and result caches. The /summary fast path always stays on.
+
+--record sends corpus entries that have no completion to the real
+OpenRouter API (OPENROUTER_API_KEY) once and saves the answers.
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import requests
+
+BACKEND = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND))
+
+from llm_client import LLMClient
+
+CORPUS = Path(__file__).resolve().parent / "recorded_completions.json"
+ENDPOINTS = ("/query", "/summary", "/get_visualization")
+US_COUNTIES, GLOBAL_PLACES, DAYS = 3342, 289, 1143
+STATES = [
+    "Alabama", "Alaska", "Arizona", "Arkansas", "California", "Colorado", "Connecticut", "Delaware",
+    "District of Columbia", "Florida", "Georgia", "Hawaii", "Idaho", "Illinois", "Indiana", "Iowa", "Kansas",
+    "Kentucky", "Louisiana", "Maine", "Maryland", "Massachusetts", "Michigan", "Minnesota", "Mississippi",
+    "Missouri", "Montana", "Nebraska", "Nevada", "New Hampshire", "New Jersey", "New Mexico", "New York",
+    "North Carolina", "North Dakota", "Ohio", "Oklahoma", "Oregon", "Pennsylvania", "Rhode Island",
+    "South Carolina", "South Dakota", "Tennessee", "Texas", "Utah", "Vermont", "Virginia", "Washington",
+    "West Virginia", "Wisconsin", "Wyoming", "American Samoa", "Guam", "Northern Mariana Islands",
+    "Puerto Rico", "Virgin Islands", "Diamond Princess", "Grand Princess",
+]
+COUNTRIES = [
+    "US", "India", "Brazil", "France", "Germany", "United Kingdom", "Italy", "Russia", "Turkey", "Spain",
+    "Argentina", "Colombia", "Mexico", "Poland", "Iran", "Ukraine", "South Africa", "Japan", "Indonesia",
+    "Netherlands", "Canada", "China", "Australia", "Peru", "Chile", "Korea, South", "Belgium", "Sweden",
+] + [f"Country {i}" for i in range(167)]
+
+
+# ----- synthetic data -----
+def write_measure_csv(path: Path, ids: pd.DataFrame, measure: str, rate: float, days: int, seed: int,
+                      block: int = 256) -> None:
+    """Long daily rows for `ids`, written a block of locations at a time."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2020-01-22", periods=days)
+    with open(path, "w", newline="") as f:
+        for start in range(0, len(ids), block):
+            part = ids.iloc[start:start + block]
+            daily = rng.poisson(rate, (len(part), days))
+            rows = part.loc[part.index.repeat(days)].reset_index(drop=True)
+            rows["Date"] = np.tile(dates, len(part))
+            rows[measure] = daily.cumsum(axis=1).ravel()
+            rows[f"Daily_{measure}"] = daily.ravel()
+            rows.to_csv(f, header=start == 0, index=False, date_format="%Y-%m-%d")
+
+
+def write_synthetic(data_dir: Path, scale: int, days: int) -> None:
+    data_dir.mkdir(parents=True, exist_ok=True)
+    counties = US_COUNTIES * scale
+    us = pd.DataFrame({
+        "Admin2": [f"County {i}" for i in range(counties)],
+        "Province_State": [STATES[i % len(STATES)] for i in range(counties)],
+        "Country_Region": "US",
+    })
+    places = GLOBAL_PLACES * scale
+    world = pd.DataFrame({
+        "Country/Region": [COUNTRIES[i % len(COUNTRIES)] for i in range(places)],
+        "Province/State": [f"Province {i}" if i >= len(COUNTRIES) else None for i in range(places)],
+        "Lat": 0.0, "Long": 0.0,
+    })
+    for name, ids, measure, rate, seed in (("us_daily_cases", us, "Cases", 20, 1),
+                                           ("us_daily_deaths", us, "Deaths", 1, 2),
+                                           ("global_daily_cases", world, "Cases", 300, 3),
+                                           ("global_daily_deaths", world, "Deaths", 5, 4)):
+        write_measure_csv(data_dir / f"covid19_{name}.csv", ids, measure, rate, days, seed)
+
+
+def prepare_workdir(root: Path, scale: int, days: int) -> Path:
+    """A directory to run the apps from: data/ (built once per scale) and the viz catalog."""
+    workdir = root / f"scale-{scale}"
+    if not (workdir / "data" / "covid19_global_daily_deaths.csv").exists():
+        print(f"📝 Writing {scale}x synthetic data to {workdir / 'data'}")
+        write_synthetic(workdir / "data", scale, days)
+    shutil.copy(BACKEND / "visualizations.json", workdir / "visualizations.json")
+    return workdir
+
+
+# ----- recorded-LLM stub -----
+class RecordedLLM(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, corpus: List[dict], latency: float, record: bool):
+        super().__init__(("127.0.0.1", 0), RecordedLLMHandler)
+        self.corpus = corpus
+        self.latency = latency
+        self.live = LLMClient(os.getenv("OPENROUTER_API_KEY")) if record else None
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def completion(self, payload: dict) -> Optional[str]:
+        prompt = "\n".join(message.get("content", "") for message in payload.get("messages", []))
+        matches = [entry for entry in self.corpus if entry["query"] in prompt]
+        if not matches:
+            return None
+        entry = max(matches, key=lambda e: len(e["query"]))
+        with self.lock:
+            self.calls += 1
+            if entry.get("completion") is None and self.live is not None:
+                params = {k: v for k, v in payload.items() if k not in ("model", "messages", "stream")}
+                entry["completion"] = self.live.complete(payload["messages"], payload["model"], **params)
+                save_corpus(self.corpus)
+        return entry.get("completion")
+
+
+class RecordedLLMHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        content = self.server.completion(payload)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if content is None:
+            self._reply(404, {"error": {"message": "no recorded completion for this prompt"}})
+        else:
+            self._reply(200, {"choices": [{"message": {"role": "assistant", "content": content}}]})
+
+    def _reply(self, status: int, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+def load_corpus() -> List[dict]:
+    with open(CORPUS) as f:
+        return json.load(f)
+
+
+def save_corpus(corpus: List[dict]) -> None:
+    with open(CORPUS, "w") as f:
+        json.dump(corpus, f, indent=4)
+        f.write("\n")
+
+
+# ----- app processes -----
+def serve(module: str, port: int) -> None:
+    app = __import__(module).app
+    app.run(host="127.0.0.1", port=port, threaded=True)
+
+
+def free_port() -> int:
+    with ThreadingHTTPServer(("127.0.0.1", 0), BaseHTTPRequestHandler) as probe:
+        return probe.server_address[1]
+
+
+def start_app(module: str, workdir: Path, llm_url: str, cold: bool, timeout: float):
+    port = free_port()
+    env = {**os.environ, "OPENROUTER_BASE_URL": llm_url, "OPENROUTER_API_KEY": "recorded",
+           "LLM_MAX_RETRIES": "0", "LLM_CACHE_PATH": "", "TRACE_LOG": "0", "DATASET_RELOAD_INTERVAL": "3600"}
+    if cold:
+        env.update(LLM_CACHE_SIZE="0", RESULT_CACHE_SIZE="0")
+    log = open(workdir / f"{module}.log", "w")
+    process = subprocess.Popen([sys.executable, __file__, "--serve", module, "--port", str(port)],
+                               cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"{module} exited during startup, see {log.name}")
+        try:
+            requests.get(url + "/", timeout=1)
+            return process, url, time.perf_counter() - started
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"{module} did not start within {timeout:.0f}s, see {log.name}")
+
+
+def status_kb(pid: int, field: str) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except FileNotFoundError:
+        pass
+    return 0
+
+
+def child_pids(pid: int) -> List[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # "pid (comm) state ppid ...": comm may contain spaces
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (FileNotFoundError, ProcessLookupError, IndexError):
+            continue
+        if ppid == pid:
+            children.append(int(entry))
+    return children
+
+
+# ----- load -----
+def replay(url: str, endpoint: str, entries: List[dict], total: int, concurrency: int) -> Dict[str, object]:
+    local = threading.local()
+
+    def one(i: int):
+        entry = entries[i % len(entries)]
+        body = {"query": entry["query"]}
+        if "dataset" in entry:
+            body["dataset"] = entry["dataset"]
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        started = time.perf_counter()
+        response = local.session.post(url + endpoint, json=body, timeout=600)
+        seconds = time.perf_counter() - started
+        try:
+            failed = response.status_code != 200 or bool(response.json().get("error"))
+        except ValueError:
+            failed = True
+        return seconds, failed, len(response.content)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    wall = time.perf_counter() - started
+    latencies = np.array([seconds for seconds, _, _ in results]) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "requests": total, "errors": sum(failed for _, failed, _ in results),
+        "p50_ms": round(p50, 2), "p95_ms": round(p95, 2), "p99_ms": round(p99, 2),
+        "throughput_rps": round(total / wall, 2),
+        "mean_bytes": int(np.mean([size for _, _, size in results])),
+    }
+
+
+def bench_endpoint(endpoint: str, module: str, workdir: Path, llm: RecordedLLM, corpus: List[dict],
+                   args) -> Dict[str, object]:
+    entries = [entry for entry in corpus if entry["endpoint"] == endpoint]
+    process, url, startup = start_app(module, workdir, llm.url, args.cold, args.startup_timeout)
+    try:
+        calls_before = llm.calls
+        result = replay(url, endpoint, entries, args.requests, args.concurrency)
+        result.update(
+            startup_s=round(startup, 2), llm_calls=llm.calls - calls_before,
+            rss_mb=round(status_kb(process.pid, "VmHWM") / 1024, 1),
+            exec_rss_mb=round(max([status_kb(pid, "VmHWM") for pid in child_pids(process.pid)] or [0]) / 1024, 1),
+        )
+        return result
+    finally:
+        process.terminate()
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--days", type=int, default=DAYS)
+    parser.add_argument("--endpoints", nargs="+", choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument("--app", choices=["app", "app1"], default="app", help="serves /query and /summary")
+    parser.add_argument("--requests", type=int, default=200, help="per endpoint")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="stub delay per completion, seconds")
+    parser.add_argument("--cold", action="store_true", help="disable the LLM and result caches")
+    parser.add_argument("--record", action="store_true")
+    parser.add_argument("--workdir", help="keep generated data here (reused across runs)")
+    parser.add_argument("--startup-timeout", type=float, default=3600)
+    parser.add_argument("--json", help="also write the results here")
+    parser.add_argument("--serve")
+    parser.add_argument("--port", type=int)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+
+    corpus = load_corpus()
+    llm = RecordedLLM(corpus, args.llm_latency, args.record)
+    threading.Thread(target=llm.serve_forever, daemon=True).start()
+    root = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="bench-endpoints-"))
+    results = []
+    try:
+        print(f"{'scale':>5}  {'endpoint':<18} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>7} "
+              f"{'errors':>6} {'llm':>4} {'rss MB':>7} {'exec MB':>7} {'start s':>7}")
+        for scale in args.scales:
+            workdir = prepare_workdir(root, scale, args.days)
+            for endpoint in args.endpoints:
+                module = "app2" if endpoint == "/get_visualization" else args.app
+                r = bench_endpoint(endpoint, module, workdir, llm, corpus, args)
+                results.append({"scale": scale, "endpoint": endpoint, "app": module, **r})
+                print(f"{scale:>4}x  {endpoint:<18} {r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['p99_ms']:8.1f} "
+                      f"{r['throughput_rps']:7.1f} {r['errors']:6} {r['llm_calls']:4} {r['rss_mb']:7.1f} "
+                      f"{r['exec_rss_mb']:7.1f} {r['startup_s']:7.1f}")
+    finally:
+        llm.shutdown()
+        if not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Location filtering: boolean-mask scans vs LocationIndex slices.
+
+Usage (from src/backend):
+    python benchmarks/bench_location_index.py            # data/store datasets
+    python benchmarks/bench_location_index.py --synthetic --counties 3340
+
+For each dataset it times `df[df[col] == value]` (optionally with a date
+range) against `LocationIndex.slice` for a primary location (state /
+country) and a finer one (county / province), and checks both return the
+same rows.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dataset_prep import freeze_dataset, prepare_dataset, primary_location
+from location_index import LocationIndex
+
+START, END = "2021-01-01", "2021-03-31"
+
+
+def synthetic_datasets(counties: int, days: int = 1143):
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2020-01-22", periods=days)
+    states = np.array([f"State {i}" for i in range(58)])
+    us = pd.DataFrame({
+        "Admin2": np.repeat([f"County {i}" for i in range(counties)], days),
+        "Province_State": np.repeat(states[np.arange(counties) % len(states)], days),
+        "Country_Region": "US",
+        "Date": np.tile(dates, counties),
+    })
+    countries = np.array([f"Country {i}" for i in range(200)])
+    places = 289
+    world = pd.DataFrame({
+        "Province/State": np.repeat([f"Province {i}" if i % 3 == 0 else None for i in range(places)], days),
+        "Country/Region": np.repeat(countries[np.arange(places) % len(countries)], days),
+        "Date": np.tile(dates, places),
+    })
+    datasets = {}
+    for key, base, measure in (("us_cases", us, "Daily_Cases"), ("us_deaths", us, "Daily_Deaths"),
+                               ("global_cases", world, "Daily_Cases"), ("global_deaths", world, "Daily_Deaths")):
+        raw = base.assign(**{measure: rng.poisson(5, len(base)).astype("int32")})
+        datasets[key] = freeze_dataset(prepare_dataset(raw))
+    return datasets
+
+
+def best_of(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def mask_scan(df, col, value, start=None, end=None):
+    mask = df[col] == value
+    if start is not None:
+        mask &= (df["Date"] >= start) & (df["Date"] <= end)
+    return df[mask]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--synthetic", action="store_true")
+    parser.add_argument("--counties", type=int, default=3340)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    if args.synthetic:
+        datasets = synthetic_datasets(args.counties)
+    else:
+        from dataset_store import load_datasets
+        datasets = load_datasets()
+
+    for key, df in datasets.items():
+        started = time.perf_counter()
+        index = LocationIndex(df)
+        build_ms = (time.perf_counter() - started) * 1000
+        primary = primary_location(df)
+        cases = [(primary, df[primary].iloc[len(df) // 2])]
+        cases += [(col, df[col].dropna().iloc[len(df) // 3]) for col in index.parents]
+        print(f"{key}: {len(df):,} rows, index built in {build_ms:.1f} ms")
+        for col, value in cases:
+            for bounds in ((None, None), (START, END)):
+                mask_s, expected = best_of(lambda: mask_scan(df, col, value, *bounds), args.repeat)
+                slice_s, got = best_of(lambda: index.slice(value, *bounds, column=col), args.repeat)
+                # slice() returns rows by date; masks keep the store's (location, date) order.
+                expected = expected.sort_values("Date", kind="mergesort").reset_index(drop=True)
+                same = expected.equals(got.reset_index(drop=True))
+                label = f"{col}={value!s}" + (f" [{START}..{END}]" if bounds[0] else "")
+                print(f"  {label:<52} rows={len(got):>6}  mask={mask_s * 1000:7.2f} ms  "
+                      f"slice={slice_s * 1000:6.3f} ms  speedup={mask_s / slice_s:6.1f}x  same_rows={same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""Prompt size and time-to-first-token: the old all-datasets prompts vs prompts.py.
+
+Usage (from src/backend, with data/ present):
+    python benchmarks/bench_prompts.py
+    python benchmarks/bench_prompts.py --live --repeat 5    # needs OPENROUTER_API_KEY
+
+For every dataset and both kinds ("query", "summary") it renders the old
+prompt (copied below from app.py as it was) and the PromptBuilder prompt
+for the corpus questions about that dataset (recorded_completions.json).
+It reports approximate tokens (prompts.count_tokens), build time with the
+prefix rendered vs reused, and, with --live, the median time to the
+first streamed token from OpenRouter for each prompt.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dataset_registry import DatasetRegistry
+from llm_client import LLMClient
+from prompts import PromptBuilder, count_tokens
+from response_cache import query_entities
+from rollups import describe_rollups
+
+CORPUS = Path(__file__).resolve().parent / "recorded_completions.json"
+MODEL = "agentica-org/deepcoder-14b-preview:free"
+
+LEGACY_QUERY = """
+You are a Python data visualization expert using Plotly and Pandas.
+
+📝 A user asked: "{user_query}"
+
+You are working with a Pandas DataFrame named `df` loaded from a COVID-19 dataset: `{dataset_key}`.
+
+The available datasets are:
+
+---
+
+🔹 **Dataset: global_deaths**
+- Columns: 'Country/Region', 'Province/State', 'Lat', 'Long', 'Date', 'Deaths', 'Daily_Deaths'
+- Use `Daily_Deaths` for daily death queries (e.g., "deaths in India on April 21, 2021")
+- Use `Deaths` for cumulative totals (e.g., "total deaths in Italy until May 2021")
+- Filter by: 'Country/Region', optionally 'Province/State'
+- Use: `px.bar()` for single-day, `px.line()` for trends
+
+---
+
+🔹 **Dataset: us_deaths**
+- Columns: 'Admin2', 'Province_State', 'Country_Region', 'Date', 'Deaths', 'Daily_Deaths'
+- Use `Daily_Deaths` for daily trends or per-date queries
+- Use `Deaths` only for cumulative totals if the user asks for total deaths
+- Filter by: 'Province_State' or 'Admin2'
+- Use: `px.bar()` for single-day or comparison, `px.line()` for time series
+
+---
+
+🔹 **Dataset: global_cases**
+- Columns: 'Country/Region', 'Province/State', 'Lat', 'Long', 'Date', 'Cases', 'Daily_Cases'
+- Use `Daily_Cases` for daily new cases or trends
+- Use `Cases` for cumulative totals
+- Filter by: 'Country/Region' and optionally 'Province/State'
+- Use: `px.line()` for trends, `px.bar()` for one-time comparisons
+
+---
+
+🔹 **Dataset: us_cases**
+- Columns: 'Admin2', 'Province_State', 'Country_Region', 'Date', 'Cases', 'Daily_Cases'
+- Use `Daily_Cases` for trends or day-specific queries
+- Use `Cases` if the user asks for total or cumulative cases
+- Filter by: 'Province_State' or 'Admin2'
+- Use: `px.bar()` for daily comparisons, `px.line()` for time series
+
+---
+must use columns which are available in the dataset : {columns_list}
+
+
+
+📅 Date Handling (All Datasets):
+- `Date` is already datetime64: never call `pd.to_datetime` on it
+- For exact date: `df['Date'] == pd.to_datetime('YYYY-MM-DD')`
+- For year/month/week: filter on the precomputed `Year`, `Month` and `Week` columns
+
+📊 Aggregation Tips:
+- Pre-aggregated frames already summed by date (prefer them over grouping `df` when they answer the question):
+{rollups_text}
+- Filter a single state/country/county with `slice_location('Texas', start='2021-01-01', end='2021-03-31')` (start/end optional) instead of `df[df[...] == ...]`; it returns those rows of `df`, sorted by date
+- Use `groupby('Date')` or `groupby('Province_State')` as needed
+- Always use `.reset_index()` after groupby
+
+🖼️ Output Format:
+- Only return Python code in triple backticks
+- Assign your chart to a variable called `fig`
+- DO NOT use markdown, `print()`, or `return fig`
+
+Example output format:
+
+```python
+fig = px.line(...)
+fig.update_layout(title="...")
+Your task is to understand the dataset type from {dataset_key} and generate an appropriate Plotly chart using only available column names{columns_list}.
+- When using `update_xaxes` or `update_yaxes`, only use valid Plotly properties.
+- For `rangemode`, allowed values are: 'normal', 'tozero', 'nonnegative'.
+- Do NOT use 'auto' for `rangemode`.
+
+🎯 Example Plotly Visualizations:
+
+first make the df based on the user selected dataset and then make the plot
+1️ Line Chart - Daily Cases Over Time in india
+
+fig = px.line(df[df['Country/Region'] == 'India'],
+              x='Date',
+              y='Daily_Cases',
+              title='Daily COVID-19 Cases in India Over Time')
+fig.show()
+
+2  Bar Chart – Top 10 Countries by Daily Deaths
+
+
+country_deaths = df.groupby('Country/Region')['Daily_Deaths'].sum().reset_index()
+top10 = country_deaths.sort_values(by='Daily_Deaths', ascending=False).head(10)
+fig = px.bar(top10, x='Country/Region', y='Daily_Deaths', title='Top 10 Countries by Daily Deaths')
+fig.show()
+
+3 Choropleth Map – Global Daily Deaths
+
+global_deaths = df.groupby('Country/Region')['Daily_Deaths'].sum().reset_index()
+fig = px.choropleth(global_deaths, locations='Country/Region', locationmode='country names',
+                    color='Daily_Deaths', title='Global COVID-19 Daily Deaths')
+fig.show()
+
+4  Pie Chart – Share of Daily Cases Among Top 5 Countries
+
+country_cases = df.groupby('Country/Region')['Daily_Cases'].sum().reset_index()
+top5 = country_cases.sort_values(by='Daily_Cases', ascending=False).head(5)
+fig = px.pie(top5, names='Country/Region', values='Daily_Cases', title='Top 5 Countries by Daily Cases')
+fig.show()
+
+5 Area Chart – Daily Cases Over Time for Selected Countries
+
+country_cases = df.groupby('Country/Region')['Daily_Cases'].sum().reset_index()
+fig = px.area(country_cases, x='Date', y='Daily_Cases', color='Country/Region', title='Daily Cases Over Time by Country')
+fig.show()
+
+ Note: Always ensure proper data filtering, grouping, and sorting before plotting. Stick to using Daily_Cases for cases and Daily_Deaths for deaths across all chart types.
+
+ """
+
+LEGACY_SUMMARY = """
+You are a Python data analyst.
+
+### User Query:
+"{user_query}"
+
+You are working with a Pandas DataFrame `df` with columns:
+{columns_list}
+
+Pre-aggregated frames already summed by date are also available (prefer them when they answer the query):
+{rollups_text}
+To filter a single state/country/county, use `slice_location('Texas', start='2021-01-01', end='2021-03-31')` (start/end optional) instead of `df[df[...] == ...]`; it returns those rows of `df`, sorted by date.
+
+---
+
+### Task:
+- Understand the query and calculate ONLY what's requested:
+   - For total deaths or cases ➜ assign to `total`
+   - For max daily ➜ assign to `max_daily`
+   - For peak date ➜ assign to `peak_date`
+- If not asked, DO NOT calculate unnecessary values.
+- If data is missing, assign "Data not available".
+- If the dataset is related to deaths always use Daily_Deaths column to give output or to make sum or to get deaths between to dates
+Only return Python code inside triple backticks. No explanations.
+
+### Example:
+
+Query: "Total deaths in India"
+```python
+filtered_df = df[df['Country/Region'] == 'India']
+total = filtered_df['Daily_Deaths'].sum()
+
+Query: "Max daily deaths in USA"
+```python
+filtered_df = df[df['Country/Region'] == 'USA']
+max_daily = filtered_df['Daily_Deaths'].max()
+
+
+If unclear:
+total = "Data not available"
+"""
+LEGACY = {"query": LEGACY_QUERY, "summary": LEGACY_SUMMARY}
+
+
+def legacy_prompt(kind: str, dataset, query: str) -> str:
+    return LEGACY[kind].format(user_query=query, dataset_key=dataset.key,
+                               columns_list=", ".join(dataset.df.columns.tolist()),
+                               rollups_text=describe_rollups(dataset.rollups))
+
+
+def time_to_first_token(llm: LLMClient, prompt: str, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in llm.stream([{"role": "user", "content": prompt}], MODEL, max_tokens=1):
+            break
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--examples", type=int, help="examples per prompt (default: per kind)")
+    parser.add_argument("--live", action="store_true", help="measure time to first token on OpenRouter")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    registry = DatasetRegistry.load()
+    with open(CORPUS) as f:
+        corpus = json.load(f)
+    llm = LLMClient.from_env() if args.live else None
+    header = f"{'dataset':<14} {'kind':<8} {'old tok':>8} {'new tok':>8} {'saved':>6} {'build us':>9} {'reuse us':>9}"
+    print(header + (f" {'old ttft':>9} {'new ttft':>9}" if llm else ""))
+    for key in registry.keys():
+        dataset = registry.get(key)
+        for kind in ("query", "summary"):
+            queries = [e["query"] for e in corpus if e["endpoint"] == f"/{kind}" and e.get("dataset") == key]
+            if not queries:
+                continue
+            builder = PromptBuilder(examples=args.examples)
+            old, new, build, reuse = [], [], [], []
+            for query in queries:
+                entities = query_entities(query, dataset.vocabulary)
+                old.append(count_tokens(legacy_prompt(kind, dataset, query)))
+                started = time.perf_counter()
+                new.append(builder.build(kind, dataset, query, entities).tokens)
+                (reuse if build else build).append(time.perf_counter() - started)
+            old_tokens, new_tokens = statistics.mean(old), statistics.mean(new)
+            line = (f"{key:<14} {kind:<8} {old_tokens:8.0f} {new_tokens:8.0f} {1 - new_tokens / old_tokens:6.0%} "
+                    f"{build[0] * 1e6:9.0f} {statistics.mean(reuse or build) * 1e6:9.0f}")
+            if llm:
+                query = queries[0]
+                old_ttft = time_to_first_token(llm, legacy_prompt(kind, dataset, query), args.repeat)
+                entities = query_entities(query, dataset.vocabulary)
+                new_ttft = time_to_first_token(llm, builder.build(kind, dataset, query, entities).text, args.repeat)
+                line += f" {old_ttft:8.2f}s {new_ttft:8.2f}s"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Peak RSS per concurrent request: deep-copy exec vs copy-on-write views.
+
+Usage (from src/backend):
+    python benchmarks/bench_sandbox_memory.py --rows 3000000 --concurrency 8
+
+The synthetic dataset is written to a temporary Arrow store and each mode
+maps it in its own subprocess, so the peaks are not shared between modes.
+"""
+import argparse
+import subprocess
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dataset_store import map_store, to_arrow_table, write_store
+
+SNIPPET = """
+df['Date'] = pd.to_datetime(df['Date'])
+texas = df[df['Province_State'] == 'Texas']
+daily = texas.groupby('Date')['Daily_Cases'].sum().reset_index()
+total = daily['Daily_Cases'].sum()
+"""
+
+
+def synthetic_us_cases(rows: int) -> pd.DataFrame:
+    """A raw us_cases-shaped frame with ~`rows` rows (1143 days per county)."""
+    rng = np.random.default_rng(0)
+    days = 1143
+    counties = max(rows // days, 1)
+    states = np.array(["California", "Texas", "New York", "Florida", "Ohio"])
+    dates = pd.date_range("2020-01-22", periods=days)
+    daily = rng.poisson(5, counties * days).astype("int32")
+    df = pd.DataFrame({
+        "Admin2": np.repeat([f"County {i}" for i in range(counties)], days),
+        "Province_State": np.repeat(states[np.arange(counties) % len(states)], days),
+        "Country_Region": "US",
+        "Date": np.tile(dates, counties),
+        "Cases": daily.reshape(counties, days).cumsum(axis=1).ravel(),
+        "Daily_Cases": daily,
+    })
+    return df
+
+
+def max_rss_mb() -> float:
+    # VmHWM rather than ru_maxrss: the latter is inherited from the parent
+    # across fork/exec and would report the synthetic build's peak.
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    raise RuntimeError("VmHWM not available (Linux only)")
+
+
+def run_mode(mode: str, store: str, concurrency: int) -> None:
+    if mode == "cow":
+        from sandbox import dataset_view
+    df = map_store(Path(store))
+    # Touch every column once so the mapped pages count towards the baseline.
+    exec(SNIPPET, {}, {"df": df.copy(deep=False), "pd": pd})
+    baseline = max_rss_mb()
+    barrier = threading.Barrier(concurrency)
+
+    def worker():
+        frame = df.copy() if mode == "copy" else dataset_view(df)
+        local_env = {"df": frame, "pd": pd}
+        barrier.wait()  # every request holds its frame at the same time
+        exec(SNIPPET, {}, local_env)
+        barrier.wait()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    peak = max_rss_mb()
+    print(f"{mode:>5}  dataset={baseline:8.1f} MB  peak={peak:8.1f} MB  "
+          f"per-request={(peak - baseline) / concurrency:8.1f} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=3_000_000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mode", choices=["copy", "cow"])
+    parser.add_argument("--store")
+    args = parser.parse_args()
+    if args.mode:
+        run_mode(args.mode, args.store, args.concurrency)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        store = write_store(to_arrow_table(synthetic_us_cases(args.rows)), Path(tmp) / "us_cases.arrow")
+        print(f"rows={args.rows} concurrency={args.concurrency}")
+        for mode in ("copy", "cow"):
+            subprocess.run([sys.executable, __file__, "--mode", mode, "--store", str(store),
+                            "--concurrency", str(args.concurrency)], check=True)
+
+
+if __name__ == "__main__":
+    main()
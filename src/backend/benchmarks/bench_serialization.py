@@ -0,0 +1,93 @@
+"""Figure serialization: json round trip + jsonify vs single-pass orjson.
+
+Usage (from src/backend):
+    python benchmarks/bench_serialization.py --points 500000
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from serialization import dumps, figure_json, raw_json
+
+
+def safe_convert(obj):
+    # the pre-orjson converter from app.py
+    if isinstance(obj, (np.ndarray, pd.Series)):
+        return obj.tolist()
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if isinstance(obj, (np.int64, np.float64)):
+        return float(obj)
+    return str(obj)
+
+
+def line_figure(points: int):
+    days = 1143
+    counties = max(points // days, 1)
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "Date": np.tile(pd.date_range("2020-01-22", periods=days), counties),
+        "Admin2": np.repeat([f"County {i}" for i in range(counties)], days),
+        "Daily_Cases": rng.poisson(20, counties * days).astype("int32"),
+    })
+    return px.line(df, x="Date", y="Daily_Cases", color="Admin2")
+
+
+def choropleth_figure(points: int):
+    rng = np.random.default_rng(0)
+    countries = [f"Country {i}" for i in range(200)]
+    frames = max(points // len(countries), 1)
+    df = pd.DataFrame({
+        "Country/Region": countries * frames,
+        "Date": np.repeat(pd.date_range("2020-01-22", periods=frames).strftime("%Y-%m-%d"), len(countries)),
+        "Daily_Deaths": rng.poisson(50, len(countries) * frames),
+    })
+    return px.choropleth(df, locations="Country/Region", locationmode="country names",
+                         color="Daily_Deaths", animation_frame="Date")
+
+
+def old_path(fig) -> bytes:
+    fig_json = json.loads(json.dumps(fig.to_dict(), default=safe_convert))
+    return json.dumps({"code": "...", "visualization": fig_json, "error": None}).encode()
+
+
+def new_path(fig) -> bytes:
+    return dumps({"code": "...", "visualization": raw_json(figure_json(fig)), "error": None})
+
+
+def timed(fn, fig, repeat: int):
+    best, body = float("inf"), b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn(fig)
+        best = min(best, time.perf_counter() - started)
+    return best, body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=500_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    for name, build in (("line", line_figure), ("choropleth", choropleth_figure)):
+        fig = build(args.points)
+        old_s, old_body = timed(old_path, fig, args.repeat)
+        new_s, new_body = timed(new_path, fig, args.repeat)
+        old_data = json.loads(old_body)["visualization"]["data"]
+        new_data = json.loads(new_body)["visualization"]["data"]
+        same = [t.get("y", t.get("z")) for t in old_data] == [t.get("y", t.get("z")) for t in new_data]
+        print(f"{name:>10}  points={args.points}  old={old_s * 1000:8.1f} ms ({len(old_body) / 1e6:.1f} MB)  "
+              f"new={new_s * 1000:8.1f} ms ({len(new_body) / 1e6:.1f} MB)  "
+              f"speedup={old_s / new_s:5.1f}x  same_values={same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Generated pandas (exec'd in the sandbox) vs generated SQL (DuckDB), head to head.
+
+Usage (from src/backend, after `python dataset_store.py`):
+    python benchmarks/bench_sql.py
+    python benchmarks/bench_sql.py --threads 4 --no-rewrite
+
+For every dataset in data/store it runs the same questions written the
+way the LLM writes them for each engine. The pandas snippets are mask
+filters and groupbys on `df`, run through sandbox.run_generated_code
+(with the code_rewrite pass unless --no-rewrite). The SQL queries run
+through SqlEngine. For each question it reports the best time of each
+engine, the first SQL run separately (it registers the dataset's tables
+on a new connection), and whether both engines returned the same values.
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import code_rewrite
+from dataset_prep import primary_location
+from dataset_registry import open_dataset
+from dataset_store import DATASET_FILES, store_path
+from sandbox import run_generated_code
+from sql_engine import SqlEngine
+
+# (name, pandas snippet assigning `result`, SQL); {col} {place} {other} {daily} are filled per dataset.
+WORKLOADS = [
+    ("trend",
+     "rows = df[df['{col}'] == '{place}']\n"
+     "result = rows.groupby('Date')['{daily}'].sum().reset_index()",
+     "SELECT Date, SUM(\"{daily}\") AS \"{daily}\" FROM df WHERE \"{col}\" = '{place}' GROUP BY Date ORDER BY Date"),
+    ("range_total",
+     "rows = df[(df['{col}'] == '{place}') & (df['Date'] >= '2021-03-01') & (df['Date'] <= '2021-06-30')]\n"
+     "result = pd.DataFrame({{'total': [rows['{daily}'].sum()]}})",
+     "SELECT COALESCE(SUM(\"{daily}\"), 0) AS total FROM df WHERE \"{col}\" = '{place}' "
+     "AND Date BETWEEN DATE '2021-03-01' AND DATE '2021-06-30'"),
+    ("top10",
+     "totals = df.groupby('{col}', observed=True)['{daily}'].sum().reset_index()\n"
+     "result = totals.sort_values('{daily}', ascending=False).head(10)",
+     "SELECT \"{col}\", SUM(\"{daily}\") AS \"{daily}\" FROM df GROUP BY \"{col}\" "
+     "ORDER BY \"{daily}\" DESC LIMIT 10"),
+    ("compare",
+     "rows = df[df['{col}'].isin(['{place}', '{other}'])]\n"
+     "result = rows.groupby(['Date', '{col}'], observed=True)['{daily}'].sum().reset_index()",
+     "SELECT Date, \"{col}\", SUM(\"{daily}\") AS \"{daily}\" FROM df WHERE \"{col}\" IN ('{place}', '{other}') "
+     "GROUP BY Date, \"{col}\" ORDER BY Date, \"{col}\""),
+    ("monthly",
+     "result = df.groupby(['Year', 'Month'])['{daily}'].sum().reset_index()",
+     "SELECT Year, Month, SUM(\"{daily}\") AS \"{daily}\" FROM df GROUP BY Year, Month ORDER BY Year, Month"),
+    ("peak_day",
+     "daily = df.groupby('Date')['{daily}'].sum()\n"
+     "result = pd.DataFrame({{'peak_date': [daily.idxmax()], 'max_daily': [daily.max()]}})",
+     "SELECT Date AS peak_date, SUM(\"{daily}\") AS max_daily FROM df GROUP BY Date "
+     "ORDER BY max_daily DESC, Date LIMIT 1"),
+]
+
+
+def placeholders(df: pd.DataFrame) -> dict:
+    col = primary_location(df)
+    daily = "Daily_Deaths" if "Daily_Deaths" in df.columns else "Daily_Cases"
+    # The two places with the most rows, so the filters select something.
+    place, other = df[col].value_counts().index[:2]
+    return {"col": col, "place": place, "other": other, "daily": daily}
+
+
+def same_values(left: pd.DataFrame, right: pd.DataFrame) -> bool:
+    if left.shape != right.shape:
+        return False
+    left, right = left.reset_index(drop=True), right.reset_index(drop=True)
+    for a, b in zip(left.columns, right.columns):
+        x, y = left[a], right[b]
+        if pd.api.types.is_numeric_dtype(x) and pd.api.types.is_numeric_dtype(y):
+            if not np.allclose(x.to_numpy(dtype="float64"), y.to_numpy(dtype="float64"), equal_nan=True):
+                return False
+        elif not (x.astype(str).to_numpy() == y.astype(str).to_numpy()).all():
+            return False
+    return True
+
+
+def best_of(fn, repeat: int):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=0, help="DuckDB threads (0 = one per core)")
+    parser.add_argument("--no-rewrite", action="store_true", help="run the pandas snippets as written")
+    args = parser.parse_args()
+    code_rewrite.REWRITE_CODE = not args.no_rewrite
+    engine = SqlEngine(threads=args.threads)
+    print(f"{'dataset':<14} {'rows':>9} {'workload':<12} {'pandas':>10} {'sql first':>10} {'sql':>10} "
+          f"{'speedup':>8}  same")
+    for key in DATASET_FILES:
+        if not store_path(key).exists():
+            continue
+        dataset = open_dataset(key)
+        values = placeholders(dataset.df)
+        for name, snippet, sql in WORKLOADS:
+            code, query = snippet.format(**values), sql.format(**values)
+
+            def run_pandas():
+                env = run_generated_code(code, dataset.df, dataset.rollups, dataset.index, pd=pd)
+                return env["result"]
+
+            started = time.perf_counter()
+            engine.query(dataset, query)
+            first_s = time.perf_counter() - started
+            pandas_s, pandas_result = best_of(run_pandas, args.repeat)
+            sql_s, sql_result = best_of(lambda: engine.query(dataset, query), args.repeat)
+            print(f"{key:<14} {len(dataset.df):9,d} {name:<12} {pandas_s * 1000:8.1f}ms {first_s * 1000:8.1f}ms "
+                  f"{sql_s * 1000:8.1f}ms {pandas_s / sql_s:7.1f}x  {same_values(pandas_result, sql_result)}")
+
+
+if __name__ == "__main__":
+    main()
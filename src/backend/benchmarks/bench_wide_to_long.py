@@ -0,0 +1,111 @@
+"""Peak memory of the JHU wide-to-long transform: ice10's melt + merge vs chunks.
+
+Usage (from src/backend):
+    python benchmarks/bench_wide_to_long.py --counties 3342 --days 1143
+
+Writes synthetic confirmed/deaths US files with the JHU layout to a
+temporary directory, then runs each mode in its own subprocess (with an
+address-space limit so the merge fails with MemoryError instead of
+taking the machine down) and reports peak RSS and wall time:
+
+- ice10:   the old script: whole files, melt on Province_State, pd.merge
+- whole:   whole files, numpy melt, positional join (no merge)
+- chunked: wide_to_long.iter_joined streamed to CSV
+"""
+import argparse
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from wide_to_long import iter_joined, melt_cumulative, wide_date_columns, write_csv
+
+
+def write_synthetic(directory: Path, counties: int, days: int) -> None:
+    rng = np.random.default_rng(0)
+    dates = [d.strftime("%-m/%-d/%y") for d in pd.date_range("2020-01-22", periods=days)]
+    states = [f"State {i}" for i in range(58)]
+    ids = pd.DataFrame({
+        "UID": 84000000 + np.arange(counties), "iso2": "US", "iso3": "USA", "code3": 840,
+        "FIPS": np.arange(counties, dtype=float), "Admin2": [f"County {i}" for i in range(counties)],
+        "Province_State": [states[i % len(states)] for i in range(counties)], "Country_Region": "US",
+        "Lat": 1.0, "Long_": 2.0, "Combined_Key": [f"County {i}, US" for i in range(counties)],
+    })
+    for name, rate, extra in (("confirmed", 20, {}), ("deaths", 1, {"Population": 100000})):
+        cumulative = rng.poisson(rate, (counties, days)).cumsum(axis=1)
+        wide = pd.concat([ids.assign(**extra), pd.DataFrame(cumulative, columns=dates)], axis=1)
+        wide.to_csv(directory / f"time_series_covid19_{name}_US.csv", index=False)
+
+
+def max_rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    raise RuntimeError("VmHWM not available (Linux only)")
+
+
+def run_mode(mode: str, directory: Path) -> int:
+    confirmed_path = directory / "time_series_covid19_confirmed_US.csv"
+    deaths_path = directory / "time_series_covid19_deaths_US.csv"
+    if mode == "ice10":
+        drop_cols = ['UID', 'iso2', 'iso3', 'code3', 'FIPS', 'Admin2',
+                     'Country_Region', 'Lat', 'Long_', 'Combined_Key']
+        confirmed = pd.read_csv(confirmed_path).drop(columns=drop_cols, errors='ignore')
+        deaths = pd.read_csv(deaths_path).drop(columns=drop_cols + ['Population'], errors='ignore')
+        confirmed_melt = confirmed.melt(id_vars=['Province_State'], var_name='Date', value_name='Confirmed_Cases')
+        deaths_melt = deaths.melt(id_vars=['Province_State'], var_name='Date', value_name='Deaths')
+        confirmed_melt['Date'] = pd.to_datetime(confirmed_melt['Date'], format="%m/%d/%y")
+        deaths_melt['Date'] = pd.to_datetime(deaths_melt['Date'], format="%m/%d/%y")
+        return len(pd.merge(confirmed_melt, deaths_melt, on=['Province_State', 'Date']))
+    ids = ["Admin2", "Province_State"]
+    if mode == "whole":
+        confirmed, deaths = pd.read_csv(confirmed_path), pd.read_csv(deaths_path)
+        dates = wide_date_columns(confirmed.columns)
+        long = melt_cumulative(confirmed[ids], confirmed[list(dates)].to_numpy(), list(dates.values()),
+                               "Cases", "Daily_Cases")
+        deaths_long = melt_cumulative(deaths[ids], deaths[list(dates)].to_numpy(), list(dates.values()),
+                                      "Deaths", "Daily_Deaths")
+        long["Deaths"], long["Daily_Deaths"] = deaths_long["Deaths"], deaths_long["Daily_Deaths"]
+        return write_csv([long], directory / "whole.csv")
+    return write_csv(iter_joined(confirmed_path, deaths_path, ids), directory / "chunked.csv")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--counties", type=int, default=3342)
+    parser.add_argument("--days", type=int, default=1143)
+    parser.add_argument("--limit-mb", type=int, default=4096)
+    parser.add_argument("--mode", choices=["ice10", "whole", "chunked"])
+    parser.add_argument("--dir")
+    args = parser.parse_args()
+    if args.mode:
+        limit = args.limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        started = time.perf_counter()
+        try:
+            rows = run_mode(args.mode, Path(args.dir))
+            print(f"{args.mode:>8}  rows={rows:>11,}  peak_rss={max_rss_mb():8.1f} MB  "
+                  f"time={time.perf_counter() - started:6.1f} s")
+        except MemoryError:
+            print(f"{args.mode:>8}  MemoryError above {args.limit_mb} MB after {time.perf_counter() - started:.1f} s "
+                  f"(peak_rss={max_rss_mb():.1f} MB)")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_synthetic(Path(tmp), args.counties, args.days)
+        print(f"{args.counties} counties x {args.days} days")
+        for mode in ("ice10", "whole", "chunked"):
+            subprocess.run([sys.executable, __file__, "--mode", mode, "--dir", tmp,
+                            "--limit-mb", str(args.limit_mb)], check=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Bytes on the wire and end-to-end time of /query figures, per encoding and coding.
+
+Usage (from src/backend):
+    python benchmarks/bench_wire.py --points 500000 --mbps 20
+
+For representative line (one trace per county), bar (daily totals) and
+animated choropleth figures, and for each figure encoding (plain JSON
+lists vs plotly.js typed arrays) and content coding (identity plus
+whatever compression.CODECS offers here), it reports:
+
+- encode: typed-array conversion + orjson, as in the executor
+- compress: the after_request compression step
+- bytes: the body as sent
+- transfer: bytes at --mbps plus one --rtt
+- decode: decompress + JSON parse + base64 of typed arrays, a stand-in
+  for the browser's work before plotly.js gets arrays
+- total: encode + compress + transfer + decode
+"""
+import argparse
+import base64
+import gzip
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import orjson
+import pandas as pd
+import plotly.express as px
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from compression import CODECS, compress
+from downsample import downsample_figure
+from serialization import dumps, figure_dict, typed_arrays
+
+DAYS = 1143
+
+
+def line_figure(points: int):
+    counties = max(points // DAYS, 1)
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "Date": np.tile(pd.date_range("2020-01-22", periods=DAYS), counties),
+        "Admin2": np.repeat([f"County {i}" for i in range(counties)], DAYS),
+        "Daily_Cases": rng.poisson(20, counties * DAYS).astype("float64"),
+    })
+    return px.line(df, x="Date", y="Daily_Cases", color="Admin2")
+
+
+def bar_figure(points: int):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"Date": pd.date_range("2020-01-22", periods=DAYS),
+                       "Daily_Deaths": rng.poisson(2000, DAYS).astype("float64")})
+    return px.bar(df, x="Date", y="Daily_Deaths")
+
+
+def choropleth_figure(points: int):
+    rng = np.random.default_rng(0)
+    countries = [f"Country {i}" for i in range(200)]
+    frames = max(points // len(countries), 1)
+    df = pd.DataFrame({
+        "Country/Region": countries * frames,
+        "Date": np.repeat(pd.date_range("2020-01-22", periods=frames).strftime("%Y-%m-%d"), len(countries)),
+        "Daily_Deaths": rng.poisson(50, len(countries) * frames).astype("float64"),
+    })
+    return px.choropleth(df, locations="Country/Region", locationmode="country names",
+                         color="Daily_Deaths", animation_frame="Date")
+
+
+def decompressor(coding: str):
+    if coding == "identity":
+        return lambda data: data
+    if coding == "gzip":
+        return gzip.decompress
+    if coding == "br":
+        import brotli
+        return brotli.decompress
+    import zstandard
+    return lambda data: zstandard.ZstdDecompressor().decompress(data)
+
+
+def decode_typed(value):
+    if isinstance(value, dict):
+        if "bdata" in value:
+            return base64.b64decode(value["bdata"])
+        return {key: decode_typed(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode_typed(item) for item in value]
+    return value
+
+
+def timed(fn, repeat: int):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, out
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--points", type=int, default=500_000, help="line and choropleth data points")
+    parser.add_argument("--mbps", type=float, default=20.0, help="client bandwidth, Mbit/s")
+    parser.add_argument("--rtt", type=float, default=0.05, help="round trip, seconds")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    print(f"codings available: {', '.join(CODECS)}")
+    print(f"{'figure':<11} {'encoding':<6} {'coding':<8} {'bytes':>11} {'ratio':>6} {'encode':>9} {'compress':>9} "
+          f"{'transfer':>9} {'decode':>9} {'total':>9}")
+    for name, build in (("line", line_figure), ("bar", bar_figure), ("choropleth", choropleth_figure)):
+        fig_dict, _ = downsample_figure(figure_dict(build(args.points)))
+        baseline = None
+        for encoding in ("json", "typed"):
+            encode_s, body = timed(lambda: dumps(typed_arrays(fig_dict) if encoding == "typed" else fig_dict),
+                                   args.repeat)
+            for coding in ("identity", *CODECS):
+                compress_s, wire = (0.0, body) if coding == "identity" else timed(lambda: compress(body, coding),
+                                                                                  args.repeat)
+                inflate = decompressor(coding)
+                decode_s, _ = timed(lambda: decode_typed(orjson.loads(inflate(wire))), args.repeat)
+                baseline = baseline or len(wire)
+                transfer_s = args.rtt + len(wire) * 8 / (args.mbps * 1e6)
+                total_s = encode_s + compress_s + transfer_s + decode_s
+                print(f"{name:<11} {encoding:<6} {coding:<8} {len(wire):11,d} {baseline / len(wire):5.1f}x "
+                      f"{encode_s * 1000:7.1f}ms {compress_s * 1000:7.1f}ms {transfer_s * 1000:7.1f}ms "
+                      f"{decode_s * 1000:7.1f}ms {total_s * 1000:7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Memoization of generated snippets against immutable dataset versions.
+
+Datasets only change when their store file is rebuilt, so a snippet's
+output is fully determined by (dataset version, code). `compile_code`
+keeps compiled code objects so repeated snippets skip the parser, and
+`ResultCache` keeps the serialized figure / summary values so a repeated
+snippet returns without re-running its groupbys over the full frame.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from types import CodeType
+from typing import Any, Callable, Dict, Optional
+
+
+@lru_cache(maxsize=int(os.getenv("CODE_CACHE_SIZE", "256")))
+def compile_code(code: str) -> CodeType:
+    return compile(code, "<generated>", "exec")
+
+
+def code_hash(code: str) -> str:
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, kind: str, version: str, code: str) -> Optional[Any]:
+        key = (kind, version, code_hash(code))
+        with self._lock:
+            if key not in self._entries:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return self._entries[key]
+
+    def put(self, kind: str, version: str, code: str, result: Any) -> None:
+        key = (kind, version, code_hash(code))
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def memoize(self, kind: str, version: str, code: str, compute: Callable[[], Any],
+                cacheable: Callable[[Any], bool] = lambda result: True) -> Any:
+        """Return the cached result for `code`, or compute and (maybe) store it."""
+        result = self.get(kind, version, code)
+        if result is None:
+            result = compute()
+            if cacheable(result):
+                self.put(kind, version, code, result)
+        return result
+
+    def report(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries)}
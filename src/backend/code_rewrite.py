@@ -0,0 +1,396 @@
+"""AST rewrites of generated snippets before they run.
+
+Generated code keeps using a few patterns that are slow on the full frame
+or that break on this data, whatever the prompt says. `rewrite_code`
+parses a snippet, applies the rewrites below where they are equivalent
+for the dataset's schema, and returns the new source plus the names of
+the rewrites that fired:
+
+- drop_show: `fig.show()` statements, which would try to open a browser.
+- drop_to_datetime: `pd.to_datetime` of a column that is already
+  datetime64, both as `df['Date'] = pd.to_datetime(df['Date'])` and
+  inside expressions.
+- daily_measure: `y='Deaths'` / `y='Cases'` on a frame that only has the
+  daily column.
+- reset_index: a groupby aggregation that is plotted by its group keys
+  gets the `.reset_index()` plotly express needs.
+- slice_location: `df[df[loc] == 'X']`, optionally narrowed by
+  `df['Date'] >= start` / `<= end` / `.between(start, end)`, becomes
+  `slice_location('X', start=..., end=..., column=loc, exact=True)`.
+  That is an indexed slice instead of a mask over every row, matching
+  'X' exactly as `==` does (no case-insensitive fallback). The rows
+  come back sorted by date.
+- rollup: `df.groupby([Date, *dims], observed=True)[counts].sum()`
+  becomes a lookup on the rollup summed over exactly those dims.
+
+The df-based rewrites only fire while the snippet never rebinds or
+mutates `df`, or the names they introduce. Snippets that do not parse
+are returned unchanged, so exec reports the error. Results are cached
+per (code, schema).
+"""
+import ast
+import os
+from functools import lru_cache
+from typing import FrozenSet, List, NamedTuple, Optional, Set, Tuple
+
+import pandas as pd
+
+from dataset_prep import COUNT_COLUMNS, LOCATION_COLUMNS
+from rollups import ROLLUP_DIMENSIONS
+
+REWRITE_CODE = os.getenv("REWRITE_CODE", "1") != "0"
+PLOT_FUNCTIONS = {"line", "bar", "scatter", "area", "histogram", "pie", "choropleth", "scatter_geo", "box"}
+AGGREGATIONS = {"sum", "mean", "median", "max", "min", "count", "size", "nunique"}
+MUTATORS = {"insert", "pop", "update"}
+# Rollup columns that are plain sums of the base rows (not the derived measures).
+SUMMED_COLUMNS = frozenset(COUNT_COLUMNS + ["Population"])
+
+
+class Schema(NamedTuple):
+    columns: FrozenSet[str]
+    datetime_columns: FrozenSet[str]
+    locations: Tuple[str, ...]
+    # (name, dims, summed columns) per rollup frame
+    rollups: Tuple[Tuple[str, Tuple[str, ...], FrozenSet[str]], ...]
+    indexed: bool
+
+
+def snippet_schema(df: pd.DataFrame, frames=None, indexed: bool = False) -> Schema:
+    """What the rewrites need to know about the frames a snippet runs against."""
+    rollups = tuple(
+        (name, tuple(ROLLUP_DIMENSIONS[name]), frozenset(SUMMED_COLUMNS.intersection(frame.columns)))
+        for name, frame in sorted((frames or {}).items()) if name in ROLLUP_DIMENSIONS
+    )
+    return Schema(
+        columns=frozenset(df.columns),
+        datetime_columns=frozenset(col for col in df.columns if pd.api.types.is_datetime64_any_dtype(df[col])),
+        locations=tuple(col for col in LOCATION_COLUMNS if col in df.columns),
+        rollups=rollups,
+        indexed=indexed,
+    )
+
+
+def _string(node: ast.AST) -> Optional[str]:
+    return node.value if isinstance(node, ast.Constant) and isinstance(node.value, str) else None
+
+
+def _strings(node: ast.AST) -> Optional[List[str]]:
+    """['a', 'b'] for 'a', ['a', 'b'] or ('a', 'b'); None for anything else."""
+    if _string(node) is not None:
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple)) and node.elts and all(_string(elt) is not None for elt in node.elts):
+        return [elt.value for elt in node.elts]
+    return None
+
+
+def _is_name(node: ast.AST, name: str) -> bool:
+    return isinstance(node, ast.Name) and node.id == name
+
+
+def _base_name(node: ast.AST) -> Optional[str]:
+    while isinstance(node, (ast.Subscript, ast.Attribute, ast.Call)):
+        node = node.func if isinstance(node, ast.Call) else node.value
+    return node.id if isinstance(node, ast.Name) else None
+
+
+def _keyword(call: ast.Call, name: str) -> Optional[ast.AST]:
+    return next((kw.value for kw in call.keywords if kw.arg == name), None)
+
+
+def _is_pd_call(node: ast.AST, attr: str) -> bool:
+    return (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr == attr
+            and _is_name(node.func.value, "pd"))
+
+
+def _is_plot_call(node: ast.AST) -> bool:
+    return (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and _is_name(node.func.value, "px")
+            and node.func.attr in PLOT_FUNCTIONS)
+
+
+def _call(func: ast.AST, *args: ast.AST, **keywords: ast.AST) -> ast.Call:
+    return ast.Call(func=func, args=list(args), keywords=[ast.keyword(arg=k, value=v) for k, v in keywords.items()])
+
+
+def _method(value: ast.AST, name: str, *args: ast.AST) -> ast.Call:
+    return _call(ast.Attribute(value=value, attr=name, ctx=ast.Load()), *args)
+
+
+def _constant(values: List[str]) -> ast.AST:
+    if len(values) == 1:
+        return ast.Constant(values[0])
+    return ast.List(elts=[ast.Constant(value) for value in values], ctx=ast.Load())
+
+
+class _Stores(ast.NodeVisitor):
+    """Names a snippet rebinds or mutates (`x = ...`, `x[...] = ...`, `x.drop(..., inplace=True)`)."""
+
+    def __init__(self, skip: Set[int]):
+        self.skip = skip
+        self.names: Set[str] = set()
+
+    def visit(self, node: ast.AST):
+        if id(node) not in self.skip:
+            super().visit(node)
+
+    def visit_Name(self, node: ast.Name):
+        if not isinstance(node.ctx, ast.Load):
+            self.names.add(node.id)
+
+    def _visit_target(self, node):
+        if not isinstance(node.ctx, ast.Load):
+            self.names.add(_base_name(node))
+        self.generic_visit(node)
+
+    visit_Subscript = visit_Attribute = _visit_target
+
+    def visit_Call(self, node: ast.Call):
+        inplace = _keyword(node, "inplace")
+        if isinstance(node.func, ast.Attribute) and (
+                node.func.attr in MUTATORS or isinstance(inplace, ast.Constant) and inplace.value):
+            self.names.add(_base_name(node.func.value))
+        self.generic_visit(node)
+
+
+class _Rewriter(ast.NodeTransformer):
+    def __init__(self, schema: Schema, tree: ast.Module):
+        self.schema = schema
+        self.applied: List[str] = []
+        self.redundant = {id(node) for node in ast.walk(tree) if self._redundant_to_datetime(node)}
+        stores = _Stores(self.redundant)
+        stores.visit(tree)
+        self.stored = stores.names
+        self.plotted = self._plotted_aggregations(tree)
+
+    def fired(self, name: str) -> None:
+        if name not in self.applied:
+            self.applied.append(name)
+
+    def pristine(self, name: str) -> bool:
+        return name not in self.stored
+
+    # df['Date'] or df.Date, for a column of the dataset
+    def column(self, node: ast.AST, frame: str = "df") -> Optional[str]:
+        if isinstance(node, ast.Subscript) and _is_name(node.value, frame):
+            col = _string(node.slice)
+        elif isinstance(node, ast.Attribute) and _is_name(node.value, frame):
+            col = node.attr
+        else:
+            return None
+        return col if col in self.schema.columns else None
+
+    def _datetime_column(self, node: ast.AST) -> Optional[str]:
+        """The datetime column `node` reads from a frame that is df or one of the rollups."""
+        frames = ["df", *(name for name, _, _ in self.schema.rollups)]
+        for frame in frames:
+            col = self.column(node, frame)
+            if col in self.schema.datetime_columns:
+                return col
+        return None
+
+    def _to_datetime_column(self, node: ast.AST) -> Optional[str]:
+        """The column of `pd.to_datetime(x['Date'])` when it already is datetime64 (a no-op call)."""
+        if not (_is_pd_call(node, "to_datetime") and len(node.args) == 1
+                and all(kw.arg in ("format", "errors") for kw in node.keywords)):
+            return None
+        return self._datetime_column(node.args[0])
+
+    def _redundant_to_datetime(self, node: ast.AST) -> bool:
+        """`x['Date'] = pd.to_datetime(x['Date'])` on a column that is already datetime64."""
+        if not (isinstance(node, ast.Assign) and len(node.targets) == 1):
+            return False
+        target = node.targets[0]
+        col = self._datetime_column(target)
+        return (col is not None and self._to_datetime_column(node.value) == col
+                and _base_name(target) == _base_name(node.value.args[0]))
+
+    def _plotted_aggregations(self, tree: ast.Module) -> Set[str]:
+        """Names bound to a groupby aggregation that are only used as px data, plotted by a group key."""
+        keys = {}
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+                group_keys = _aggregation_keys(node.value)
+                if group_keys is not None:
+                    keys.setdefault(node.targets[0].id, []).append(set(group_keys))
+        if not keys:
+            return set()
+        data_uses, plotted_by = {}, {}
+        for node in ast.walk(tree):
+            if _is_plot_call(node):
+                data = node.args[0] if node.args else _keyword(node, "data_frame")
+                if isinstance(data, ast.Name):
+                    data_uses[id(data)] = data.id
+                    axes = (_keyword(node, axis) for axis in ("x", "y"))
+                    plotted_by.setdefault(data.id, set()).update(_string(axis) for axis in axes if axis is not None)
+        qualified = set()
+        for name, bindings in keys.items():
+            loads = [node for node in ast.walk(tree) if isinstance(node, ast.Name) and node.id == name
+                     and isinstance(node.ctx, ast.Load)]
+            if (len(bindings) == 1 and loads and all(id(node) in data_uses for node in loads)
+                    and bindings[0] & plotted_by.get(name, set())):
+                qualified.add(name)
+        return qualified
+
+    def visit_Expr(self, node: ast.Expr):
+        call = node.value
+        if (isinstance(call, ast.Call) and isinstance(call.func, ast.Attribute) and call.func.attr == "show"
+                and isinstance(call.func.value, ast.Name) and not call.args):
+            self.fired("drop_show")
+            return None
+        return self.generic_visit(node)
+
+    def visit_Assign(self, node: ast.Assign):
+        if id(node) in self.redundant and self.pristine(_base_name(node.targets[0])):
+            self.fired("drop_to_datetime")
+            return None
+        target = node.targets[0]
+        plotted = (len(node.targets) == 1 and isinstance(target, ast.Name) and target.id in self.plotted
+                   and _aggregation_keys(node.value) is not None)
+        node = self.generic_visit(node)
+        if plotted:
+            node.value = _method(node.value, "reset_index")
+            self.fired("reset_index")
+        return node
+
+    def visit_Call(self, node: ast.Call):
+        node = self.generic_visit(node)
+        if self._to_datetime_column(node) is not None and self.pristine(_base_name(node.args[0])):
+            self.fired("drop_to_datetime")
+            return node.args[0]
+        if _is_plot_call(node):
+            for kw in node.keywords:
+                value = _string(kw.value)
+                if (kw.arg == "y" and value in ("Deaths", "Cases") and value not in self.schema.columns
+                        and f"Daily_{value}" in self.schema.columns):
+                    kw.value = ast.Constant(f"Daily_{value}")
+                    self.fired("daily_measure")
+            return node
+        return self._rollup(node) or node
+
+    def visit_Subscript(self, node: ast.Subscript):
+        node = self.generic_visit(node)
+        if not (self.schema.indexed and self.pristine("df") and self.pristine("slice_location")):
+            return node
+        frame = node.value.value if isinstance(node.value, ast.Attribute) and node.value.attr == "loc" else node.value
+        if not _is_name(frame, "df") or not isinstance(node.ctx, ast.Load):
+            return node
+        bounds = self._mask_bounds(node.slice)
+        if bounds is None:
+            return node
+        self.fired("slice_location")
+        (col, value), start, end = bounds
+        keywords = {key: bound for key, bound in (("start", start), ("end", end)) if bound is not None}
+        return _call(ast.Name(id="slice_location", ctx=ast.Load()), ast.Constant(value), **keywords,
+                     column=ast.Constant(col), exact=ast.Constant(True))
+
+    def _mask_bounds(self, mask: ast.AST):
+        """((location column, value), start, end) for a location-equality mask with optional date bounds."""
+        terms = []
+        while isinstance(mask, ast.BinOp) and isinstance(mask.op, ast.BitAnd):
+            terms.append(mask.right)
+            mask = mask.left
+        terms.append(mask)
+        location, start, end = None, None, None
+        for term in terms:
+            if (isinstance(term, ast.Call) and isinstance(term.func, ast.Attribute) and term.func.attr == "between"
+                    and self.column(term.func.value) == "Date" and len(term.args) == 2 and not term.keywords):
+                if start is not None or end is not None or not all(map(_is_bound, term.args)):
+                    return None
+                start, end = term.args
+                continue
+            if not (isinstance(term, ast.Compare) and len(term.ops) == 1):
+                return None
+            left, op, right = term.left, term.ops[0], term.comparators[0]
+            if self.column(right) is not None:  # 'Texas' == df[...], '2021-01-01' <= df['Date']
+                left, right = right, left
+                op = {ast.GtE: ast.LtE(), ast.LtE: ast.GtE()}.get(type(op), op)
+            col = self.column(left)
+            if isinstance(op, ast.Eq) and col in self.schema.locations and _string(right) is not None:
+                if location is not None:
+                    return None
+                location = (col, right.value)
+            elif col == "Date" and isinstance(op, ast.GtE) and start is None and _is_bound(right):
+                start = right
+            elif col == "Date" and isinstance(op, ast.LtE) and end is None and _is_bound(right):
+                end = right
+            else:
+                return None
+        return (location, start, end) if location is not None else None
+
+    def _rollup(self, node: ast.Call) -> Optional[ast.AST]:
+        """`df.groupby(keys, observed=True)[counts].sum()` -> `<rollup>.set_index(keys)[counts]`."""
+        if not (isinstance(node.func, ast.Attribute) and node.func.attr == "sum" and not node.args
+                and not node.keywords and isinstance(node.func.value, ast.Subscript)):
+            return None
+        selection, grouped = node.func.value.slice, node.func.value.value
+        if not (isinstance(grouped, ast.Call) and isinstance(grouped.func, ast.Attribute)
+                and grouped.func.attr == "groupby" and _is_name(grouped.func.value, "df") and len(grouped.args) == 1):
+            return None
+        keys, columns = _strings(grouped.args[0]), _strings(selection)
+        options = {kw.arg: kw.value.value for kw in grouped.keywords if isinstance(kw.value, ast.Constant)}
+        if (keys is None or columns is None or len(options) != len(grouped.keywords)
+                or not set(options) <= {"observed", "sort", "as_index"} or options.get("sort", True) is not True
+                or not self.pristine("df")):
+            return None
+        if keys != ["Date"] and options.get("observed") is not True:
+            return None  # categorical keys without observed=True also yield the unobserved combinations
+        for name, dims, summed in self.schema.rollups:
+            if (set(keys) == {"Date", *dims} and len(keys) == len(dims) + 1 and set(columns) <= summed
+                    and set(columns) <= self.schema.columns and self.pristine(name)):
+                rows = _method(ast.Name(id=name, ctx=ast.Load()), "set_index", _constant(keys))
+                lookup = ast.Subscript(value=rows, slice=selection, ctx=ast.Load())
+                if keys != ["Date", *dims]:  # rollups are sorted by Date first
+                    lookup = _method(lookup, "sort_index")
+                if options.get("as_index", True) is not True:
+                    lookup = _method(lookup, "reset_index")
+                self.fired("rollup")
+                return lookup
+        return None
+
+
+def _is_bound(node: ast.AST) -> bool:
+    """A date bound slice_location accepts as is: a string or pd.Timestamp/pd.to_datetime of constants."""
+    if _string(node) is not None:
+        return True
+    return ((_is_pd_call(node, "Timestamp") or _is_pd_call(node, "to_datetime"))
+            and len(node.args) == 1 and not node.keywords and _string(node.args[0]) is not None)
+
+
+def _aggregation_keys(node: ast.AST) -> Optional[List[str]]:
+    """Group keys of `<...>.groupby(keys)[...].<agg>()` (grouped by index, not as_index=False)."""
+    if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in AGGREGATIONS):
+        return None
+    grouped = node.func.value
+    if isinstance(grouped, ast.Subscript):
+        grouped = grouped.value
+    if not (isinstance(grouped, ast.Call) and isinstance(grouped.func, ast.Attribute)
+            and grouped.func.attr == "groupby" and len(grouped.args) == 1):
+        return None
+    as_index = _keyword(grouped, "as_index")
+    if isinstance(as_index, ast.Constant) and as_index.value is False:
+        return None
+    return _strings(grouped.args[0])
+
+
+def _fill_empty_bodies(tree: ast.AST) -> None:
+    """Dropped statements can leave `if x: fig.show()` without a body."""
+    for node in ast.walk(tree):
+        body = getattr(node, "body", None)
+        if isinstance(body, list) and not body:
+            body.append(ast.Pass())
+
+
+@lru_cache(maxsize=int(os.getenv("CODE_CACHE_SIZE", "256")))
+def rewrite_code(code: str, schema: Schema) -> Tuple[str, Tuple[str, ...]]:
+    """(rewritten code, names of the rewrites that fired); the code itself when none did."""
+    if not REWRITE_CODE:
+        return code, ()
+    try:
+        tree = ast.parse(code)
+    except SyntaxError:
+        return code, ()
+    rewriter = _Rewriter(schema, tree)
+    tree = rewriter.visit(tree)
+    if not rewriter.applied:
+        return code, ()
+    _fill_empty_bodies(tree)
+    return ast.unparse(ast.fix_missing_locations(tree)), tuple(rewriter.applied)
@@ -0,0 +1,76 @@
+"""Negotiated compression of large JSON responses (br, zstd, gzip).
+
+Figure payloads are mostly long numeric arrays and compress several-fold.
+`init_app(app)` compresses JSON responses of at least COMPRESS_MIN_BYTES
+with the best coding the client accepts: Accept-Encoding q-values decide,
+and br > zstd > gzip breaks ties. Only codings available here are
+offered: gzip always, br when the `brotli` package is installed and zstd
+with `zstandard`. Levels suit compressing on the fly
+(COMPRESS_BR_QUALITY=5, COMPRESS_ZSTD_LEVEL=3, COMPRESS_GZIP_LEVEL=6).
+Smaller bodies go out as they are, because compressing them saves less
+than it costs.
+
+Compressed responses carry `Vary: Accept-Encoding` and a weak ETag: the
+bytes differ per coding but the content is the same, and If-None-Match
+compares weakly, so figure revalidation still gets a 304.
+"""
+import gzip
+import os
+from typing import Callable, Dict
+
+from flask import Flask, Response, request
+
+from tracing import current_trace
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+BR_QUALITY = int(os.getenv("COMPRESS_BR_QUALITY", "5"))
+ZSTD_LEVEL = int(os.getenv("COMPRESS_ZSTD_LEVEL", "3"))
+GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+
+
+def _codecs() -> Dict[str, Callable[[bytes], bytes]]:
+    """Available codings in order of preference."""
+    codecs: Dict[str, Callable[[bytes], bytes]] = {}
+    try:
+        import brotli
+        codecs["br"] = lambda data: brotli.compress(data, quality=BR_QUALITY)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        codecs["zstd"] = lambda data: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    except ImportError:
+        pass
+    codecs["gzip"] = lambda data: gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    return codecs
+
+
+CODECS = _codecs()
+
+
+def compress(data: bytes, coding: str) -> bytes:
+    return CODECS[coding](data)
+
+
+def init_app(app: Flask) -> None:
+    """Compress JSON responses; register after tracing so the trace sees the wire size."""
+
+    @app.after_request
+    def compress_response(response: Response) -> Response:
+        if (response.direct_passthrough or response.mimetype != "application/json"
+                or response.status_code in (204, 206, 304) or "Content-Encoding" in response.headers):
+            return response
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_BYTES:
+            return response
+        response.vary.add("Accept-Encoding")
+        coding = request.accept_encodings.best_match(list(CODECS))
+        if coding is None:
+            return response
+        with current_trace().span("compress"):
+            response.set_data(compress(data, coding))
+        response.headers["Content-Encoding"] = coding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,120 @@
+"""Dataset preparation: typing, ordering and derived columns, done once.
+
+Every frame in DATASETS goes through `prepare_dataset` when the columnar
+store is built and through `freeze_dataset` when it is loaded. After that
+the frames are read-only: `Date` is already datetime64, rows are sorted by
+primary location and then by date (see location_index), and
+`Year`/`Month`/`Week` are precomputed, so request handlers never need to
+(and must not) re-type columns. The frames keep a plain RangeIndex: with
+rows in location order a DatetimeIndex would not be monotonic, so date
+ranges are selected on `Date` (or through `slice_location`), not with
+`df.loc['2021-01':'2021-03']`.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# Coarsest first: a name that is both a state and a county resolves to the state.
+LOCATION_COLUMNS = ["Country/Region", "Province_State", "Province/State", "Admin2"]
+CATEGORY_COLUMNS = ["Admin2", "Province_State", "Country_Region", "Country/Region", "Province/State"]
+COUNT_COLUMNS = ["Cases", "Daily_Cases", "Deaths", "Daily_Deaths"]
+DERIVED_DATE_COLUMNS = ["Year", "Month", "Week"]
+
+
+def prepare_dataset(df: pd.DataFrame) -> pd.DataFrame:
+    """Return a typed, (location, date)-sorted copy of a raw daily frame with date parts."""
+    df = df.copy()
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    for col in COUNT_COLUMNS:
+        if col in df.columns:
+            # Missing counts (e.g. the first day's delta) become 0 so the
+            # column stays a plain int32 that can be mapped without a copy.
+            df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0).astype("int32")
+    if "Date" in df.columns:
+        df["Date"] = pd.to_datetime(df["Date"], errors="coerce")
+        df = df.dropna(subset=["Date"])
+        # Stable sort keeps the original row order within each (location, day).
+        df = add_date_parts(df.sort_values(sort_keys(df), kind="mergesort").reset_index(drop=True))
+    return df
+
+
+def primary_location(df: pd.DataFrame) -> Optional[str]:
+    """The location column a dataset is sorted and indexed by."""
+    return next((col for col in LOCATION_COLUMNS if col in df.columns), None)
+
+
+def sort_keys(df: pd.DataFrame) -> List[str]:
+    return [col for col in (primary_location(df), "Date") if col is not None]
+
+
+def append_prepared(df: pd.DataFrame, rows: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    """Merge prepared `rows` into prepared `df`, keeping dtypes and `keys` order."""
+    df = df.reset_index(drop=True)
+    rows = rows.reset_index(drop=True)
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and col in rows.columns:
+            # Same categories on both sides so concat keeps the categorical dtype.
+            categories = df[col].cat.categories.union(rows[col].cat.categories)
+            df[col] = df[col].cat.set_categories(categories)
+            rows[col] = rows[col].cat.set_categories(categories)
+    combined = pd.concat([df, rows], ignore_index=True)
+    return combined.sort_values(keys, kind="mergesort").reset_index(drop=True)
+
+
+def add_date_parts(df: pd.DataFrame) -> pd.DataFrame:
+    df["Year"] = df["Date"].dt.year.astype("int16")
+    df["Month"] = df["Date"].dt.month.astype("int8")
+    df["Week"] = df["Date"].dt.isocalendar().week.astype("int8")
+    return df
+
+
+def freeze_dataset(df: pd.DataFrame) -> pd.DataFrame:
+    """Make every column buffer read-only."""
+    for arr in df._mgr.arrays:
+        # Categorical/datetime arrays wrap their buffer in `_ndarray`.
+        values = getattr(arr, "_ndarray", arr)
+        if hasattr(values, "flags"):
+            values.flags.writeable = False
+    return df
+
+
+def is_prepared(df: pd.DataFrame) -> bool:
+    if "Date" not in df.columns:
+        return True
+    return (
+        pd.api.types.is_datetime64_dtype(df["Date"])
+        and all(col in df.columns for col in DERIVED_DATE_COLUMNS)
+        and is_location_sorted(df)
+    )
+
+
+def is_location_sorted(df: pd.DataFrame) -> bool:
+    """Whether rows are in `sort_keys` order: by primary location (missing last), then by date."""
+    dates = df["Date"].to_numpy()
+    date_steps = dates[1:] >= dates[:-1]
+    column = primary_location(df)
+    if column is None:
+        return bool(date_steps.all())
+    codes = df[column].cat.codes.to_numpy().astype("int64")
+    codes[codes < 0] = len(df[column].cat.categories)
+    location_steps = codes[1:] - codes[:-1]
+    return bool((location_steps >= 0).all() and (date_steps | (location_steps > 0)).all())
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case, drop punctuation and collapse whitespace (queries and names)."""
+    text = re.sub(r"[^\w\s/-]", " ", text.lower().replace("’", "'"))
+    return " ".join(text.split())
+
+
+def location_vocabulary(df: pd.DataFrame) -> Dict[str, Tuple[str, str]]:
+    """Normalized location names in a dataset mapped to (column, value)."""
+    vocabulary = {}
+    for col in LOCATION_COLUMNS:
+        if col in df.columns:
+            for name in df[col].dropna().unique():
+                vocabulary.setdefault(normalize_text(str(name)), (col, name))
+    return vocabulary
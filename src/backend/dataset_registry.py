@@ -0,0 +1,86 @@
+"""The datasets a running app serves, hot-swapped when their store changes.
+
+Everything a request needs about one dataset (the mapped frame, its
+rollups, location index, vocabulary and store version) lives in a single
+immutable `Dataset`. Handlers fetch it once with `REGISTRY.get(key)`, so a
+reload in the middle of a request can never mix an old frame with a new
+version. `watch()` polls the store files' versions in a daemon thread;
+when `python ingest.py` (or `python dataset_store.py`) replaces a store,
+every worker remaps it within one interval, without a restart or a CSV
+parse.
+"""
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from dataset_prep import location_vocabulary
+from dataset_store import dataset_version, load_datasets, load_rollups, load_store
+from location_index import LocationIndex
+
+
+@dataclass(frozen=True)
+class Dataset:
+    key: str
+    df: pd.DataFrame
+    version: str
+    rollups: Dict[str, pd.DataFrame]
+    index: LocationIndex
+    vocabulary: Dict[str, Tuple[str, str]]
+
+
+def open_dataset(key: str, df: Optional[pd.DataFrame] = None) -> Dataset:
+    # Version first: if the store is replaced while mapping, the next poll sees it.
+    version = dataset_version(key)
+    df = load_store(key) if df is None else df
+    return Dataset(key, df, version, load_rollups(key), LocationIndex(df), location_vocabulary(df))
+
+
+class DatasetRegistry:
+    def __init__(self, datasets: Dict[str, Dataset]):
+        self._datasets = dict(datasets)
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    @classmethod
+    def load(cls) -> "DatasetRegistry":
+        return cls({key: open_dataset(key, df) for key, df in load_datasets().items()})
+
+    def get(self, key: str) -> Optional[Dataset]:
+        return self._datasets.get(key)
+
+    def keys(self) -> List[str]:
+        return list(self._datasets)
+
+    def refresh(self) -> List[str]:
+        """Reopen every dataset whose store changed; return their keys."""
+        reloaded = []
+        with self._lock:
+            for key, current in list(self._datasets.items()):
+                if dataset_version(key) == current.version:
+                    continue
+                started = time.perf_counter()
+                self._datasets[key] = open_dataset(key)
+                self.reloads += 1
+                reloaded.append(key)
+                print(f"🔄 Reloaded '{key}' in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return reloaded
+
+    def watch(self, interval: float) -> Optional[threading.Thread]:
+        """Poll for changed stores every `interval` seconds (0 disables)."""
+        if interval <= 0:
+            return None
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"❌ Dataset reload failed: {e}")
+
+        thread = threading.Thread(target=loop, name="dataset-watcher", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,196 @@
+"""Columnar on-disk store for the daily COVID-19 datasets.
+
+`python dataset_store.py` converts every CSV in DATASET_FILES into a
+prepared (see dataset_prep) Arrow IPC file under data/store/.
+`load_datasets()` memory-maps those files so worker boot is a few
+milliseconds and the numeric columns are shared between gunicorn workers
+through the OS page cache instead of being parsed per process.
+Derived measures (see derived) are computed here too, once per build, and
+stored in the same files.
+"""
+import os
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+from dataset_prep import LOCATION_COLUMNS, freeze_dataset, prepare_dataset
+from derived import COMPANIONS, add_measures, add_population, join_companion, read_populations
+from rollups import ROLLUP_DIMENSIONS, build_rollups
+
+DATA_DIR = Path("data")
+STORE_DIR = DATA_DIR / "store"
+DATASET_FILES = {
+    "us_cases": "covid19_us_daily_cases.csv",
+    "us_deaths": "covid19_us_daily_deaths.csv",
+    "global_cases": "covid19_global_daily_cases.csv",
+    "global_deaths": "covid19_global_daily_deaths.csv",
+}
+# Where `Population` comes from: the raw US deaths file and JHU's lookup table.
+POPULATION_FILES = {
+    "us": "time_series_covid19_deaths_US.csv",
+    "global": "UID_ISO_FIPS_LookUp_Table.csv",
+}
+
+# Bumped whenever the stored layout changes so older files get rebuilt.
+STORE_FORMAT = b"5"
+
+
+def csv_path(key: str) -> Path:
+    return DATA_DIR / DATASET_FILES[key]
+
+
+def store_path(key: str) -> Path:
+    return STORE_DIR / f"{key}.arrow"
+
+
+def rollup_path(key: str, name: str) -> Path:
+    return STORE_DIR / f"{key}.{name}.arrow"
+
+
+def population_path(key: str) -> Path:
+    return DATA_DIR / POPULATION_FILES[key.split("_")[0]]
+
+
+def location_keys(df: pd.DataFrame) -> List[str]:
+    """The columns that identify one location's series."""
+    return [col for col in LOCATION_COLUMNS if col in df.columns]
+
+
+def frame_table(df: pd.DataFrame) -> pa.Table:
+    """Convert an already prepared frame to an Arrow table tagged with the format."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    return table.replace_schema_metadata({**table.schema.metadata, b"store_format": STORE_FORMAT})
+
+
+def to_arrow_table(df: pd.DataFrame) -> pa.Table:
+    """Prepare a raw daily frame and convert it to Arrow."""
+    return frame_table(prepare_dataset(df))
+
+
+def write_store(table: pa.Table, out: Path) -> Path:
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_suffix(f".arrow.{os.getpid()}.tmp")
+    # Uncompressed IPC so the file can be memory-mapped zero-copy.
+    with pa.OSFile(str(tmp), "wb") as sink:
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    tmp.replace(out)
+    return out
+
+
+def derive_base(key: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Prepared rows with `Population` and the per-location derived measures."""
+    df = add_population(df, read_populations(population_path(key), key))
+    return add_measures(df, location_keys(df))
+
+
+def derive_rollups(key: str, rollups: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """Join the companion dataset's current rollups (if built) and (re)compute the derived measures."""
+    companion = COMPANIONS.get(key)
+    companion_rollups = load_rollups(companion) if companion and not is_stale(companion) else {}
+    derived = {}
+    for name, rollup in rollups.items():
+        dims = ROLLUP_DIMENSIONS[name]
+        if name in companion_rollups:
+            rollup = join_companion(rollup, companion_rollups[name], companion, dims)
+        derived[name] = add_measures(rollup, dims)
+    return derived
+
+
+def build_store(key: str) -> Path:
+    """Convert one dataset CSV into its Arrow IPC file plus its rollups."""
+    df = derive_base(key, prepare_dataset(pd.read_csv(csv_path(key))))
+    for name, rollup in derive_rollups(key, build_rollups(df)).items():
+        write_store(frame_table(rollup), rollup_path(key, name))
+    # Base file last: its mtime is what marks the whole set as up to date.
+    return write_store(frame_table(df), store_path(key))
+
+
+def rejoin_companion(key: str) -> None:
+    """Refresh a dataset's companion counts and CFR after the companion was rebuilt or ingested."""
+    if not store_path(key).exists():
+        return
+    for name, rollup in derive_rollups(key, load_rollups(key)).items():
+        write_store(frame_table(rollup), rollup_path(key, name))
+    # A new base mtime is a new version, so running apps remap the rollups.
+    os.utime(store_path(key))
+
+
+def build_all() -> Dict[str, Path]:
+    built = {}
+    for key in DATASET_FILES:
+        if not csv_path(key).exists():
+            print(f"⚠️ Skipping '{key}': {csv_path(key)} not found")
+            continue
+        built[key] = build_store(key)
+        print(f"✅ Built '{key}' -> {built[key]}")
+    # A dataset built before its companion has no companion counts yet.
+    for key in built:
+        if COMPANIONS.get(key) in built:
+            rejoin_companion(key)
+    return built
+
+
+def is_stale(key: str) -> bool:
+    """True when the store file is missing, outdated or older than its CSV."""
+    out = store_path(key)
+    if not out.exists():
+        return True
+    with pa.memory_map(str(out), "r") as source:
+        metadata = ipc.open_file(source).schema.metadata or {}
+    if metadata.get(b"store_format") != STORE_FORMAT:
+        return True
+    src = csv_path(key)
+    return src.exists() and src.stat().st_mtime > out.stat().st_mtime
+
+
+def dataset_version(key: str) -> str:
+    """Identifies the current contents of a dataset's store file."""
+    stat = store_path(key).stat()
+    return f"{key}:{stat.st_mtime_ns:x}:{stat.st_size:x}"
+
+
+def map_store(path: Path) -> pd.DataFrame:
+    """Memory-map an Arrow store file and expose it as a frozen DataFrame."""
+    source = pa.memory_map(str(path), "r")
+    table = ipc.open_file(source).read_all()
+    # split_blocks keeps each column in its own block so numeric columns stay
+    # views over the mapped pages instead of being consolidated into copies.
+    return freeze_dataset(table.to_pandas(split_blocks=True))
+
+
+def load_store(key: str) -> pd.DataFrame:
+    return map_store(store_path(key))
+
+
+def load_rollups(key: str) -> Dict[str, pd.DataFrame]:
+    """Map every rollup stored for a dataset, keyed by rollup name."""
+    prefix = f"{key}."
+    return {
+        path.name[len(prefix):-len(".arrow")]: map_store(path)
+        for path in sorted(STORE_DIR.glob(f"{key}.*.arrow"))
+    }
+
+
+def load_datasets() -> Dict[str, pd.DataFrame]:
+    """Load every dataset, preferring the mapped store and falling back to CSV."""
+    datasets = {}
+    for key in DATASET_FILES:
+        try:
+            if is_stale(key):
+                if not csv_path(key).exists():
+                    raise FileNotFoundError(f"Dataset file not found: {csv_path(key)}")
+                print(f"Building columnar store for '{key}'...")
+                build_store(key)
+            datasets[key] = load_store(key)
+            print(f"✅ Loaded '{key}'")
+        except Exception as e:
+            print(f"❌ Error loading '{key}': {e}")
+    return datasets
+
+
+if __name__ == "__main__":
+    build_all()
@@ -0,0 +1,148 @@
+"""Derived measures, computed once per dataset version and stored with it.
+
+Users keep asking for 7-day averages, per-100k rates and deaths-vs-cases
+comparisons. Generated code used to compute these with groupby/rolling
+over millions of rows on every request, and ice10.py used to melt and
+merge both raw files. Instead, the store build (dataset_store) and
+ingest.py add them as vectorized columns:
+
+- `Daily_Cases_7d` / `Daily_Deaths_7d`: the trailing 7-day mean of the
+  daily measure for each location (the base rows) or each rollup group.
+  It is averaged over fewer days at the start of a series.
+- `Population`, `Cases_per_100k` and `Daily_Cases_7d_per_100k` (or their
+  Deaths variants), where populations are known. US populations come from
+  the raw deaths file's `Population` column. Global ones come from JHU's
+  UID_ISO_FIPS_LookUp_Table.csv when it is in data/. Rollups sum
+  `Population` like the counts.
+- In rollups only: the companion dataset's counts (`Deaths`/`Daily_Deaths`
+  in a cases dataset and vice versa) and `CFR`, cumulative deaths per 100
+  cumulative cases (NaN before the first case and for days the companion
+  has not been ingested for yet, whose companion counts read 0).
+
+Rows need not be in any order. Each location (or group) is expected to
+have one row per day, as the JHU series do, so a 7-row window is 7 days.
+"""
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+ROLLING_DAYS = 7
+PER_CAPITA = 100_000
+COMPANIONS = {"us_cases": "us_deaths", "us_deaths": "us_cases",
+              "global_cases": "global_deaths", "global_deaths": "global_cases"}
+MEASURES = {"Cases": "Daily_Cases", "Deaths": "Daily_Deaths"}
+
+
+def measure_names(key: str) -> Tuple[str, str]:
+    """(cumulative, daily) column names for a dataset."""
+    return ("Deaths", "Daily_Deaths") if key.endswith("deaths") else ("Cases", "Daily_Cases")
+
+
+def rolling_column(daily: str) -> str:
+    return f"{daily}_{ROLLING_DAYS}d"
+
+
+def per_capita_column(column: str) -> str:
+    return f"{column}_per_100k"
+
+
+def rolling_mean(values: np.ndarray, groups: np.ndarray, order: np.ndarray, window: int = ROLLING_DAYS) -> np.ndarray:
+    """Trailing mean of `values` over `window` rows of the same group, rows taken in `order`."""
+    n = len(values)
+    ordered_groups = groups[order]
+    sums = np.zeros(n + 1)
+    np.cumsum(values[order], dtype="float64", out=sums[1:])
+    starts = np.flatnonzero(np.r_[True, ordered_groups[1:] != ordered_groups[:-1]])
+    run_start = np.repeat(starts, np.diff(np.r_[starts, n]))
+    position = np.arange(n)
+    first = np.maximum(position - window + 1, run_start)
+    means = np.empty(n, dtype="float32")
+    means[order] = (sums[position + 1] - sums[first]) / (position + 1 - first)
+    return means
+
+
+def group_codes(df: pd.DataFrame, keys: Sequence[str]) -> np.ndarray:
+    if not keys:
+        return np.zeros(len(df), dtype="int64")
+    return df.groupby(list(keys), observed=True, sort=False, dropna=False).ngroup().to_numpy()
+
+
+def add_measures(df: pd.DataFrame, keys: Sequence[str]) -> pd.DataFrame:
+    """Add (or recompute) the rolling and per-capita columns of a frame with one row per (`keys`, Date)."""
+    codes = group_codes(df, keys)
+    order = np.lexsort((df["Date"].to_numpy(), codes))
+    population = df["Population"].to_numpy(dtype="float64") if "Population" in df.columns else None
+    if population is not None:
+        population = np.where(population > 0, population, np.nan)
+    for cumulative, daily in MEASURES.items():
+        if daily not in df.columns:
+            continue
+        average = rolling_column(daily)
+        df[average] = rolling_mean(df[daily].to_numpy(), codes, order)
+        if population is not None:
+            for column in (cumulative, average):
+                if column in df.columns:
+                    df[per_capita_column(column)] = (df[column].to_numpy() * PER_CAPITA / population).astype("float32")
+    return df
+
+
+def read_populations(path: Path, key: str) -> Optional[pd.DataFrame]:
+    """Location columns of a dataset's rows + `Population`, or None when no source file exists."""
+    if not path.exists():
+        return None
+    if key.startswith("us_"):
+        populations = pd.read_csv(path, usecols=["Province_State", "Admin2", "Population"])
+        return populations.dropna(subset=["Population"]).drop_duplicates(["Province_State", "Admin2"])
+    lookup = pd.read_csv(path, usecols=["Country_Region", "Province_State", "Admin2", "Population"])
+    lookup = lookup[lookup["Admin2"].isna()].dropna(subset=["Population"])
+    return (lookup.rename(columns={"Country_Region": "Country/Region", "Province_State": "Province/State"})
+            [["Country/Region", "Province/State", "Population"]].drop_duplicates(["Country/Region", "Province/State"]))
+
+
+def add_population(df: pd.DataFrame, populations: Optional[pd.DataFrame]) -> pd.DataFrame:
+    """Add `Population` (int32, 0 where unknown) to prepared rows, matched on their location columns."""
+    if populations is None:
+        return df
+    keys = [col for col in populations.columns if col != "Population"]
+    if not all(col in df.columns for col in keys):
+        return df
+    lookup = populations.set_index(keys)["Population"]
+    rows = pd.MultiIndex.from_arrays([df[col].astype(object).where(df[col].notna(), np.nan) for col in keys])
+    df["Population"] = lookup.reindex(rows).fillna(0).to_numpy().astype("int32")
+    return df
+
+
+def join_companion(rollup: pd.DataFrame, companion: pd.DataFrame, companion_key: str,
+                   dims: Sequence[str]) -> pd.DataFrame:
+    """Rollup with the companion dataset's counts (replacing earlier ones) and `CFR`."""
+    keys = ["Date", *dims]
+    counts = [col for col in measure_names(companion_key) if col in companion.columns]
+    if not counts:
+        return rollup
+    rollup = rollup.drop(columns=[col for col in counts + ["CFR"] if col in rollup.columns])
+    joined = rollup.merge(companion[keys + counts], on=keys, how="left", sort=False)
+    for col in counts:
+        joined[col] = joined[col].fillna(0).astype("int64")
+    cases = joined["Cases"].to_numpy(dtype="float64")
+    # Days the companion has no data for yet (it is ingested separately) get no ratio.
+    known = cases > 0
+    if len(companion):
+        known &= joined["Date"].to_numpy() <= companion["Date"].max().to_datetime64()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        joined["CFR"] = np.where(known, joined["Deaths"].to_numpy() * 100 / cases, np.nan).astype("float32")
+    return joined
+
+
+def describe_measures(columns: Sequence[str]) -> List[str]:
+    """Prompt lines for the derived columns a frame carries."""
+    notes = []
+    for cumulative, daily in MEASURES.items():
+        average = rolling_column(daily)
+        if average in columns:
+            note = f"- `{average}`: {ROLLING_DAYS}-day average of `{daily}` per location (use it for smoothed trends)"
+            if per_capita_column(cumulative) in columns:
+                note += f"; `{per_capita_column(cumulative)}`, `{per_capita_column(average)}`: per 100k people"
+            notes.append(note)
+    return notes
@@ -0,0 +1,124 @@
+"""Shape-preserving downsampling of line traces before they are serialized.
+
+Generated charts such as `px.line(..., color='Admin2')` can carry hundreds
+of thousands of points. Each scatter/line trace whose x values are sorted
+and longer than its budget is reduced with Largest-Triangle-Three-Buckets,
+and the global max and min of y are always kept so peaks (and their dates)
+read the same as on the full series.
+
+A trace's budget is at most MAX_POINTS_PER_TRACE. When the line traces
+together have more than MAX_POINTS_PER_FIGURE points, that figure budget
+is split across them by length, with at least MIN_POINTS_PER_TRACE each,
+so one line per county is cut as well as one long line.
+"""
+import os
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+MAX_POINTS_PER_TRACE = int(os.getenv("MAX_POINTS_PER_TRACE", "5000"))
+MAX_POINTS_PER_FIGURE = int(os.getenv("MAX_POINTS_PER_FIGURE", "50000"))
+MIN_POINTS_PER_TRACE = int(os.getenv("MIN_POINTS_PER_TRACE", "20"))
+LINE_TRACE_TYPES = {"scatter", "scattergl"}
+# Per-point attributes that must be subset together with x and y.
+POINT_ATTRIBUTES = ["x", "y", "text", "hovertext", "customdata", "ids"]
+NESTED_POINT_ATTRIBUTES = {"marker": ["color", "size", "symbol", "opacity"]}
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the points Largest-Triangle-Three-Buckets keeps."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    every = (n - 2) / (threshold - 2)
+    edges = (np.floor(np.arange(threshold - 1) * every) + 1).astype(np.int64)
+    edges[-1] = n - 1
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        bucket_x, bucket_y = x[start:end], y[start:end]
+        area = np.abs((x[a] - avg_x) * (bucket_y - y[a]) - (x[a] - bucket_x) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        indices[i + 1] = a
+    return indices
+
+
+def _numeric_x(x) -> np.ndarray:
+    values = np.asarray(x)
+    if values.dtype.kind in "iuf":
+        return values.astype("float64")
+    # datetime64 arrays and object arrays of Timestamps / ISO strings
+    return pd.to_datetime(values).asi8.astype("float64")
+
+
+def downsample_trace(trace: dict, budget: int) -> Tuple[dict, int, int]:
+    """Return (trace, original points, emitted points) for one trace."""
+    x, y = trace.get("x"), trace.get("y")
+    if trace.get("type", "scatter") not in LINE_TRACE_TYPES or x is None or y is None:
+        return trace, 0, 0
+    n = len(y)
+    if n <= budget or len(x) != n:
+        return trace, n, n
+    try:
+        x_num = _numeric_x(x)
+        y_num = np.asarray(y, dtype="float64")
+    except (TypeError, ValueError):
+        return trace, n, n
+    if not np.all(np.diff(x_num) >= 0):
+        # LTTB assumes sorted x; reordering would redraw the line differently.
+        return trace, n, n
+    y_filled = np.nan_to_num(y_num, nan=np.nanmean(y_num) if np.isfinite(y_num).any() else 0.0)
+    keep = lttb_indices(x_num, y_filled, budget)
+    if np.isfinite(y_num).any():
+        keep = np.union1d(keep, [np.nanargmax(y_num), np.nanargmin(y_num)])
+
+    trace = dict(trace)
+    for attr in POINT_ATTRIBUTES:
+        if attr in trace and trace[attr] is not None and len(trace[attr]) == n:
+            trace[attr] = np.asarray(trace[attr])[keep]
+    for parent, attrs in NESTED_POINT_ATTRIBUTES.items():
+        if isinstance(trace.get(parent), dict):
+            nested = dict(trace[parent])
+            for attr in attrs:
+                value = nested.get(attr)
+                if value is not None and not isinstance(value, (str, int, float)) and len(value) == n:
+                    nested[attr] = np.asarray(value)[keep]
+            trace[parent] = nested
+    return trace, n, len(keep)
+
+
+def _is_line(trace: dict) -> bool:
+    return (trace.get("type", "scatter") in LINE_TRACE_TYPES
+            and trace.get("x") is not None and trace.get("y") is not None)
+
+
+def trace_budgets(lengths: List[int], budget: int = MAX_POINTS_PER_TRACE,
+                  figure_budget: int = MAX_POINTS_PER_FIGURE,
+                  minimum: int = MIN_POINTS_PER_TRACE) -> List[int]:
+    """Point budget per line trace: the figure budget split by length, within [minimum, budget]."""
+    total = sum(lengths)
+    if total <= figure_budget:
+        return [budget] * len(lengths)
+    return [min(budget, max(minimum, figure_budget * n // total)) for n in lengths]
+
+
+def downsample_figure(fig_dict: dict, budget: int = MAX_POINTS_PER_TRACE,
+                      figure_budget: int = MAX_POINTS_PER_FIGURE) -> Tuple[dict, Dict[str, int]]:
+    """Downsample every eligible trace; report original vs emitted points."""
+    traces = fig_dict.get("data", [])
+    lines = [i for i, trace in enumerate(traces) if _is_line(trace)]
+    budgets = dict(zip(lines, trace_budgets([len(traces[i]["y"]) for i in lines], budget, figure_budget)))
+    data: List[dict] = []
+    original = emitted = 0
+    for i, trace in enumerate(traces):
+        trace, before, after = downsample_trace(trace, budgets.get(i, budget))
+        data.append(trace)
+        original += before
+        emitted += after
+    return {**fig_dict, "data": data}, {"original": original, "emitted": emitted}
@@ -0,0 +1,246 @@
+"""Pre-forked processes that run LLM-generated code outside the web workers.
+
+`exec` inside a Flask thread lets one runaway snippet (a cartesian merge, a
+huge pivot) block the worker or OOM the whole process. `ExecutorPool`
+forks a zygote right after the datasets are loaded, before the web tier
+starts any thread, and the zygote forks every executor, including the
+replacements of killed ones. Executors thus start with the same
+memory-mapped frames (shared pages, no reload) and never inherit a lock
+held by a thread of the web process (registry, logging, malloc). A request
+sends (task, dataset key, version, args) to an idle executor and waits at
+most `timeout` seconds; a late executor is killed and replaced. Inside each
+executor the address space is capped (RLIMIT_AS) and a watchdog thread
+exits the process once its anonymous RSS grows `memory_mb` past what it
+started with, so a heavy snippet costs one executor, never the web tier.
+
+Tasks are plain functions `task(dataset, *args)` registered by name, so
+the app decides what runs there (building and serializing a figure, or
+computing summary values) and only picklable results travel back.
+With EXEC_WORKERS=0 (or without fork) tasks run in-process as before.
+"""
+import multiprocessing
+import os
+import queue
+import resource
+import signal
+import socket
+import threading
+import time
+from multiprocessing import reduction
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from dataset_registry import Dataset, DatasetRegistry
+
+MEMORY_EXIT = 86  # executor exit status when the RSS watchdog fires
+WATCHDOG_INTERVAL = 0.05
+
+
+class ExecutionError(Exception):
+    pass
+
+
+def _status_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def _limit_memory(memory_mb: int) -> None:
+    budget_kb = memory_mb * 1024
+    # Hard backstop for allocations faster than the watchdog can sample.
+    address_space = (_status_kb("VmSize") + 2 * budget_kb) * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (address_space, address_space))
+    # Anonymous pages only: touching the mapped datasets is not a leak.
+    limit_kb = _status_kb("RssAnon") + budget_kb
+
+    def watchdog():
+        while True:
+            if _status_kb("RssAnon") > limit_kb:
+                os._exit(MEMORY_EXIT)
+            time.sleep(WATCHDOG_INTERVAL)
+
+    threading.Thread(target=watchdog, name="rss-watchdog", daemon=True).start()
+
+
+def _executor_main(conn, registry: DatasetRegistry, tasks: Dict[str, Callable[..., Any]], memory_mb: int) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C is the parent's to handle
+    if memory_mb > 0:
+        _limit_memory(memory_mb)
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            os._exit(0)
+        task, key, version, args = message
+        dataset = registry.get(key)
+        if dataset is None or dataset.version != version:
+            registry.refresh()  # the store changed after this executor was forked
+            dataset = registry.get(key)
+        try:
+            conn.send(("ok", tasks[task](dataset, *args)))
+        except MemoryError:
+            conn.send(("memory", None))
+            os._exit(MEMORY_EXIT)
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+def _zygote_main(conn, parent_conn, registry: DatasetRegistry, tasks: Dict[str, Callable[..., Any]],
+                 memory_mb: int) -> None:
+    """Fork an executor per "spawn" request and reap executors on "reap"; single-threaded throughout."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    parent_conn.close()  # inherited by the fork: without closing it, the zygote never sees EOF
+    while True:
+        try:
+            command, pid = conn.recv()
+        except (EOFError, OSError):
+            os._exit(0)
+        if command == "spawn":
+            parent_end, child_end = socket.socketpair()
+            pid = os.fork()
+            if pid == 0:
+                conn.close()
+                parent_end.close()
+                try:
+                    _executor_main(Connection(child_end.detach()), registry, tasks, memory_mb)
+                finally:
+                    os._exit(1)
+            child_end.close()
+            conn.send(pid)
+            reduction.send_handle(conn, parent_end.fileno(), pid)
+            parent_end.close()
+        elif command == "reap":
+            try:
+                _, status = os.waitpid(pid, 0)
+                conn.send(os.waitstatus_to_exitcode(status))
+            except ChildProcessError:
+                conn.send(None)
+
+
+class _Zygote:
+    """The process executors are forked from; forked itself while the web process has one thread."""
+
+    def __init__(self, context, registry: DatasetRegistry, tasks: Dict[str, Callable[..., Any]], memory_mb: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_zygote_main, args=(child_conn, self.conn, registry, tasks, memory_mb),
+                                       name="executor-zygote", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self._lock = threading.Lock()
+
+    def spawn(self) -> "_Executor":
+        with self._lock:
+            self.conn.send(("spawn", None))
+            pid = self.conn.recv()
+            fd = reduction.recv_handle(self.conn)
+        return _Executor(self, pid, Connection(fd))
+
+    def reap(self, pid: int) -> Optional[int]:
+        """Wait for an executor to exit and return its exit status."""
+        with self._lock:
+            self.conn.send(("reap", pid))
+            return self.conn.recv()
+
+    def close(self) -> None:
+        self.conn.close()
+        self.process.join()
+
+
+class _Executor:
+    def __init__(self, zygote: _Zygote, pid: int, conn: Connection):
+        self.zygote = zygote
+        self.pid = pid
+        self.conn = conn
+
+    def kill(self) -> Optional[int]:
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.conn.close()
+        return self.zygote.reap(self.pid)
+
+
+class ExecutorPool:
+    def __init__(self, registry: DatasetRegistry, tasks: Dict[str, Callable[..., Any]], workers: int = 2,
+                 timeout: float = 30.0, memory_mb: int = 1024):
+        self.registry = registry
+        self.tasks = tasks
+        self.workers = workers if "fork" in multiprocessing.get_all_start_methods() else 0
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.stats = {"tasks": 0, "errors": 0, "timeouts": 0, "memory_kills": 0, "crashes": 0, "restarts": 0}
+        self._stats_lock = threading.Lock()
+        self._idle: "queue.Queue[_Executor]" = queue.Queue()
+        self._zygote = None
+        if self.workers:
+            self._zygote = _Zygote(multiprocessing.get_context("fork"), registry, tasks, memory_mb)
+        for _ in range(self.workers):
+            self._idle.put(self._zygote.spawn())
+
+    @classmethod
+    def from_env(cls, registry: DatasetRegistry, tasks: Dict[str, Callable[..., Any]]) -> "ExecutorPool":
+        return cls(
+            registry, tasks,
+            workers=int(os.getenv("EXEC_WORKERS", "2")),
+            timeout=float(os.getenv("EXEC_TIMEOUT", "30")),
+            memory_mb=int(os.getenv("EXEC_MEMORY_MB", "1024")),
+        )
+
+    def run(self, task: str, dataset: Dataset, *args: Any) -> Any:
+        """Run `tasks[task](dataset, *args)` in an executor and return its result."""
+        self._count("tasks")
+        if not self.workers:
+            return self.tasks[task](dataset, *args)
+        try:
+            executor = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            self._count("timeouts")
+            raise ExecutionError(f"No code executor became free within {self.timeout:.0f}s")
+        try:
+            try:
+                executor.conn.send((task, dataset.key, dataset.version, args))
+                if not executor.conn.poll(self.timeout):
+                    executor, _ = self._replace(executor)
+                    self._count("timeouts")
+                    raise ExecutionError(f"Generated code ran longer than {self.timeout:.0f}s and was stopped")
+                status, payload = executor.conn.recv()
+            except (EOFError, OSError):
+                status, payload = "died", None
+            if status == "ok":
+                return payload
+            if status == "error":
+                self._count("errors")
+                raise ExecutionError(payload)
+            executor, exitcode = self._replace(executor)
+            if status == "memory" or exitcode == MEMORY_EXIT:
+                self._count("memory_kills")
+                raise ExecutionError(f"Generated code used more than {self.memory_mb} MB and was stopped")
+            self._count("crashes")
+            raise ExecutionError(f"Code executor exited unexpectedly (status {exitcode})")
+        finally:
+            self._idle.put(executor)
+
+    def report(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {"workers": self.workers, **self.stats}
+
+    def close(self) -> None:
+        for _ in range(self.workers):
+            self._idle.get().kill()
+        if self._zygote is not None:
+            self._zygote.close()
+
+    # ----- internals -----
+    def _replace(self, executor: _Executor) -> Tuple[_Executor, Optional[int]]:
+        """Kill an executor and have the zygote fork a fresh one; return it and the old exit status."""
+        exitcode = executor.kill()
+        self._count("restarts")
+        return self._zygote.spawn(), exitcode
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            self.stats[name] += 1
@@ -0,0 +1,314 @@
+"""Content-addressed cache of /query figures, in memory and on disk, with ETags.
+
+A figure is fully determined by (dataset version, engine, code): the same
+text run as a pandas snippet and as a DuckDB query is two figures. The
+cache keeps:
+
+- blobs: encoded figure JSON stored once per content digest (sha256), so
+  the same chart reached through different snippets is stored once;
+- entries: (version, code hash, engine, encoding) -> digest, the downsampling
+  `points` and the ETag. The encoding is "json" or "typed" (plotly.js typed
+  arrays, see serialization.typed_arrays).
+
+The memory tier is an LRU bounded by FIGURE_CACHE_MEMORY_MB. The disk tier
+lives under FIGURE_CACHE_DIR, with blob files and a SQLite index. It is
+bounded by FIGURE_CACHE_DISK_MB and evicts the least recently used blobs,
+and it survives restarts. When a dataset gets a new version, its older
+entries are dropped.
+
+The memory tier has its own lock, so hits never wait on the disk tier.
+Blob files are written outside any lock; the SQLite index has a lock of
+its own. Its total size is kept as a running counter, and disk hits
+record their last-used times in memory, written in batches. Several
+gunicorn workers can share the directory, so the counter only sees this
+process's writes: eviction (and every DISK_SYNC_EVERY-th put) recomputes
+the total from the index first.
+
+The ETag hashes what the /query body is made of (code, engine, encoding,
+figure digest, points). It can be looked up without reading the blob, so a matching
+If-None-Match is answered with a bodiless 304. The comparison is weak,
+because compressed responses carry the ETag as weak. Responses carry
+`Cache-Control: private, no-cache`, which lets browsers keep the body
+but makes them revalidate every time, because a new dataset version can
+change the figure.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import Response
+from werkzeug.datastructures import ETags
+
+from code_cache import code_hash
+
+CACHE_CONTROL = "private, no-cache"
+MAX_ENTRIES = 4096
+USED_FLUSH_EVERY = 256  # disk hits whose last-used times are written together
+DISK_SYNC_EVERY = 64  # puts between recounts of the shared disk total
+ENCODINGS = ("json", "typed")
+
+
+def dataset_of(version: str) -> str:
+    """Dataset key of a store version ("us_cases:<mtime>:<size>")."""
+    return version.split(":", 1)[0]
+
+
+class FigureCache:
+    def __init__(self, path: Optional[str], memory_bytes: int = 256 << 20, disk_bytes: int = 2 << 30):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, Any, str]]" = OrderedDict()
+        self._blobs: "OrderedDict[str, bytes]" = OrderedDict()
+        self._blob_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "not_modified": 0, "evicted": 0}
+        self._versions: Dict[str, str] = {}  # dataset -> latest version stored
+        self._used: Dict[str, float] = {}  # digest -> last disk hit, not yet written
+        self._dir: Optional[Path] = None
+        self._db = None
+        self._db_lock = threading.Lock()
+        self._disk_total = 0
+        self._puts = 0
+        if path:
+            self._dir = Path(path)
+            self._dir.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(self._dir / "index.sqlite3"), check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS entries (version TEXT, code_hash TEXT, digest TEXT, "
+                             "points TEXT, etag TEXT, PRIMARY KEY (version, code_hash))")
+            self._db.execute("CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER, used REAL)")
+            self._db.commit()
+            self._disk_total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    @classmethod
+    def from_env(cls) -> "FigureCache":
+        return cls(
+            path=os.getenv("FIGURE_CACHE_DIR", "data/figure_cache") or None,
+            memory_bytes=int(float(os.getenv("FIGURE_CACHE_MEMORY_MB", "256")) * (1 << 20)),
+            disk_bytes=int(float(os.getenv("FIGURE_CACHE_DISK_MB", "2048")) * (1 << 20)),
+        )
+
+    # ----- public API -----
+    def etag(self, version: str, code: str, encoding: str = "json", engine: str = "pandas") -> Optional[str]:
+        entry = self._entry(version, code, encoding, engine)
+        return entry[2] if entry else None
+
+    def revalidate(self, version: str, code: str, if_none_match: ETags, encoding: str = "json",
+                   engine: str = "pandas") -> Optional[str]:
+        """The ETag when the client's copy (If-None-Match) is still current, else None."""
+        if not if_none_match:
+            return None
+        etag = self.etag(version, code, encoding, engine)
+        if etag is None or not if_none_match.contains_weak(etag):
+            return None
+        with self._lock:
+            self.stats["not_modified"] += 1
+        return etag
+
+    def get(self, version: str, code: str, encoding: str = "json",
+            engine: str = "pandas") -> Optional[Dict[str, Any]]:
+        entry = self._entry(version, code, encoding, engine)
+        if entry is not None:
+            digest, points, etag = entry
+            plot, tier = self._blob(digest)
+            if plot is not None:
+                with self._lock:
+                    self.stats[tier] += 1
+                return {"plot": plot, "points": points, "error": None, "etag": etag}
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, version: str, code: str, result: Dict[str, Any], encoding: str = "json",
+            engine: str = "pandas") -> Dict[str, Any]:
+        """Store a successful plot result; return it with its ETag."""
+        plot, points = result["plot"], result.get("points")
+        digest = hashlib.sha256(plot).hexdigest()
+        snippet = self._snippet(code, encoding, engine)
+        etag = hashlib.sha256(f"{snippet}:{digest}:{json.dumps(points, sort_keys=True)}".encode()).hexdigest()[:32]
+        dataset = dataset_of(version)
+        with self._lock:
+            new_version = self._versions.get(dataset) != version
+            if new_version:
+                self._versions[dataset] = version
+                self._drop_stale_entries(version)
+            self._remember((version, snippet), (digest, points, etag))
+            self._keep_blob(digest, plot)
+            used = self._take_used()
+        if self._db is not None:
+            self._write_blob_file(digest, plot)
+            with self._db_lock:
+                if new_version:
+                    self._drop_stale_rows(version)
+                self._index_blob(digest, len(plot))
+                self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                                 (version, snippet, digest, json.dumps(points), etag))
+                self._write_used(used)
+                self._puts += 1
+                if self._disk_total > self.disk_bytes or self._puts % DISK_SYNC_EVERY == 0:
+                    self._evict_disk()
+                self._db.commit()
+        return {**result, "etag": etag}
+
+    def memoize(self, version: str, code: str, compute: Callable[[], Dict[str, Any]],
+                encoding: str = "json", engine: str = "pandas") -> Dict[str, Any]:
+        """The cached plot result for `code`, or compute it (only successful plots are stored)."""
+        result = self.get(version, code, encoding, engine)
+        if result is None:
+            result = compute()
+            if result.get("error") is None and result.get("plot") is not None:
+                result = self.put(version, code, result, encoding, engine)
+        return result
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            report = {**self.stats, "entries": len(self._entries), "memory_bytes": self._blob_bytes}
+        if self._db is not None:
+            report["disk_bytes"] = self._disk_total
+        return report
+
+    # ----- internals -----
+    @staticmethod
+    def _snippet(code: str, encoding: str, engine: str) -> str:
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Unknown figure encoding: {encoding}")
+        # pandas/json keys are the bare code hash, as before engines and encodings existed
+        suffixes = [part for part, default in ((engine, "pandas"), (encoding, "json")) if part != default]
+        return ".".join([code_hash(code), *suffixes])
+
+    def _entry(self, version: str, code: str, encoding: str, engine: str) -> Optional[Tuple[str, Any, str]]:
+        key = (version, self._snippet(code, encoding, engine))
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute("SELECT digest, points, etag FROM entries WHERE version = ? AND code_hash = ?",
+                                   key).fetchone()
+        if row is None:
+            return None
+        entry = (row[0], json.loads(row[1]), row[2])
+        with self._lock:
+            self._remember(key, entry)
+        return entry
+
+    def _blob(self, digest: str) -> Tuple[Optional[bytes], str]:
+        with self._lock:
+            if digest in self._blobs:
+                self._blobs.move_to_end(digest)
+                return self._blobs[digest], "memory_hits"
+            if self._db is None:
+                return None, "misses"
+        try:
+            plot = self._blob_path(digest).read_bytes()
+        except FileNotFoundError:
+            return None, "misses"
+        with self._lock:
+            self._keep_blob(digest, plot)
+            self._used[digest] = time.time()
+            used = self._take_used() if len(self._used) >= USED_FLUSH_EVERY else {}
+        if used:
+            with self._db_lock:
+                self._write_used(used)
+                self._db.commit()
+        return plot, "disk_hits"
+
+    def _remember(self, key: Tuple[str, str], entry: Tuple[str, Any, str]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > MAX_ENTRIES:
+            self._entries.popitem(last=False)
+
+    def _keep_blob(self, digest: str, plot: bytes) -> None:
+        if digest not in self._blobs:
+            self._blobs[digest] = plot
+            self._blob_bytes += len(plot)
+        self._blobs.move_to_end(digest)
+        while self._blob_bytes > self.memory_bytes and len(self._blobs) > 1:
+            _, dropped = self._blobs.popitem(last=False)
+            self._blob_bytes -= len(dropped)
+
+    def _blob_path(self, digest: str) -> Path:
+        return self._dir / digest[:2] / f"{digest}.json"
+
+    def _take_used(self) -> Dict[str, float]:
+        used, self._used = self._used, {}
+        return used
+
+    def _write_blob_file(self, digest: str, plot: bytes) -> None:
+        path = self._blob_path(digest)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(plot)
+            tmp.replace(path)
+
+    def _index_blob(self, digest: str, size: int) -> None:
+        if self._db.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?)", (digest, size, time.time())).rowcount:
+            self._disk_total += size
+        else:
+            self._db.execute("UPDATE blobs SET used = ? WHERE digest = ?", (time.time(), digest))
+
+    def _write_used(self, used: Dict[str, float]) -> None:
+        self._db.executemany("UPDATE blobs SET used = MAX(used, ?) WHERE digest = ?",
+                             [(when, digest) for digest, when in used.items()])
+
+    def _drop_stale_entries(self, version: str) -> None:
+        """Forget in-memory entries of this dataset's older versions."""
+        key = dataset_of(version)
+        for stale in [k for k in self._entries if dataset_of(k[0]) == key and k[0] != version]:
+            del self._entries[stale]
+
+    def _drop_stale_rows(self, version: str) -> None:
+        """Delete this dataset's older versions from the index, and the blobs no entry uses any more."""
+        prefix = dataset_of(version) + ":"
+        # a prefix comparison: LIKE would treat the "_" in "us_cases" as a wildcard
+        if self._db.execute("DELETE FROM entries WHERE substr(version, 1, ?) = ? AND version != ?",
+                            (len(prefix), prefix, version)).rowcount:
+            orphans = self._db.execute(
+                "SELECT digest, size FROM blobs WHERE digest NOT IN (SELECT digest FROM entries)").fetchall()
+            self._delete_blobs(orphans)
+
+    def _evict_disk(self) -> None:
+        """Recount the disk total from the index (other workers write to it too), then evict down to budget."""
+        total = self._disk_total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        victims = []
+        for digest, size in self._db.execute("SELECT digest, size FROM blobs ORDER BY used"):
+            if total <= self.disk_bytes:
+                break
+            victims.append((digest, size))
+            total -= size
+        if victims:
+            placeholders = ",".join("?" * len(victims))
+            self._db.execute(f"DELETE FROM entries WHERE digest IN ({placeholders})", [d for d, _ in victims])
+            self._delete_blobs(victims)
+
+    def _delete_blobs(self, blobs) -> None:
+        """Delete (digest, size) blobs from disk and the index (holding the index lock)."""
+        for digest, size in blobs:
+            self._blob_path(digest).unlink(missing_ok=True)
+            if self._db.execute("DELETE FROM blobs WHERE digest = ?", (digest,)).rowcount:
+                self._disk_total -= size
+        with self._lock:
+            self.stats["evicted"] += len(blobs)
+
+
+def not_modified(etag: str) -> Response:
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
+
+
+def add_validators(response: Response, etag: Optional[str]) -> Response:
+    if etag:
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
@@ -1,32 +1,22 @@
-import pandas as pd
+from pathlib import Path
+
 import matplotlib.pyplot as plt
 import mplcursors
 
-# Load datasets
-confirmed = pd.read_csv('src/backend/data/time_series_covid19_confirmed_US.csv')
-deaths = pd.read_csv('src/backend/data/time_series_covid19_deaths_US.csv')
-    
-# Drop unnecessary columns
-drop_cols = ['UID', 'iso2', 'iso3', 'code3', 'FIPS', 'Admin2', 
-             'Country_Region', 'Lat', 'Long_', 'Combined_Key']
-
-confirmed_clean = confirmed.drop(columns=drop_cols, errors='ignore')
-deaths_clean = deaths.drop(columns=drop_cols + ['Population'], errors='ignore')
-
-# Melt wide to long format
-confirmed_melt = confirmed_clean.melt(id_vars=['Province_State'], var_name='Date', value_name='Confirmed_Cases')
-deaths_melt = deaths_clean.melt(id_vars=['Province_State'], var_name='Date', value_name='Deaths')
-
-# Convert Date column
-confirmed_melt['Date'] = pd.to_datetime(confirmed_melt['Date'])
-deaths_melt['Date'] = pd.to_datetime(deaths_melt['Date'])
-
-# Merge datasets on State and Date
-merged_df = pd.merge(confirmed_melt, deaths_melt, on=['Province_State', 'Date'])
+from dataset_store import map_store
 
 # Filter for selected states
 states = ['California', 'Florida', 'New York', 'Texas']
-plot_df = merged_df[merged_df['Province_State'].isin(states)]
+
+# The state rollup of US cases already carries the joined Deaths (built by
+# `python dataset_store.py`), so there is nothing to melt or merge here.
+# Each point is one state's daily total. The original script merged county
+# rows on (Province_State, Date), which paired every county's confirmed count
+# with every county's deaths in the same state; for county-level points, join
+# the raw files with `python wide_to_long.py` instead
+rollup = map_store(Path('src/backend/data/store/us_cases.state_daily.arrow'))
+plot_df = rollup[rollup['Province_State'].isin(states)]
+plot_df = plot_df.rename(columns={'Cases': 'Confirmed_Cases'})
 
 # Plot Scatter Plot
 fig, ax = plt.subplots(figsize=(12, 7))
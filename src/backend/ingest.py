@@ -0,0 +1,109 @@
+"""Incremental ingestion of new days from the JHU time-series files.
+
+The JHU files are wide: one row per location and one cumulative column per
+date, with each new day appended as a new column. `ingest(key)` reads only
+the header to find date columns newer than the dataset's store, loads just
+those columns (plus the day before, for the first difference) and melts
+them into daily rows, with `Daily_*` being the cumulative value minus the
+previous day's. Then it:
+
+- appends the rows to the served daily CSV,
+- appends their aggregates to the stored rollups,
+- merges them into the Arrow store, swapped in atomically,
+- recomputes the derived measures (see derived), whose 7-day windows
+  reach back into the stored days, and rejoins the companion datasets'
+  counts.
+
+Running apps remap the new store through DatasetRegistry's watcher.
+Usage (from src/backend): `python ingest.py [dataset ...]`.
+"""
+import sys
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from dataset_prep import append_prepared, prepare_dataset, sort_keys
+from dataset_store import (DATA_DIR, DATASET_FILES, build_store, csv_path, derive_rollups, frame_table, is_stale,
+                           load_store, location_keys, map_store, population_path, rejoin_companion, rollup_path,
+                           store_path, write_store)
+from derived import COMPANIONS, add_measures, add_population, measure_names, read_populations
+from rollups import ROLLUP_DIMENSIONS, build_rollups
+from wide_to_long import melt_cumulative, wide_date_columns
+
+RAW_FILES = {
+    "us_cases": "time_series_covid19_confirmed_US.csv",
+    "us_deaths": "time_series_covid19_deaths_US.csv",
+    "global_cases": "time_series_covid19_confirmed_global.csv",
+    "global_deaths": "time_series_covid19_deaths_global.csv",
+}
+
+
+def raw_path(key: str):
+    return DATA_DIR / RAW_FILES[key]
+
+
+def new_daily_rows(key: str, since: Optional[pd.Timestamp], columns: List[str]) -> pd.DataFrame:
+    """Daily rows (with the served CSV's `columns`) for raw dates after `since`."""
+    header = list(pd.read_csv(raw_path(key), nrows=0).columns)
+    dates = wide_date_columns(header)
+    new = [col for col, date in dates.items() if since is None or date > since]
+    if not new:
+        return pd.DataFrame(columns=columns)
+    ordered = list(dates)
+    first = ordered.index(new[0])
+    previous = ordered[first - 1] if first > 0 else None
+    cumulative_name, daily_name = measure_names(key)
+    ids = [col for col in columns if col in header]
+
+    wide = pd.read_csv(raw_path(key), usecols=ids + ([previous] if previous else []) + new)
+    cumulative = wide[new].fillna(0).to_numpy(dtype="int64")
+    before = wide[previous].fillna(0).to_numpy(dtype="int64") if previous else None
+    rows = melt_cumulative(wide[ids], cumulative, [dates[col] for col in new], cumulative_name, daily_name, before)
+    return rows[[col for col in columns if col in rows.columns]]
+
+
+def ingest(key: str) -> int:
+    """Append raw days newer than the store to one dataset; return rows added."""
+    if is_stale(key):
+        build_store(key)
+    current = load_store(key)
+    since = current["Date"].max() if len(current) else None
+    columns = list(pd.read_csv(csv_path(key), nrows=0).columns)
+    rows = new_daily_rows(key, since, columns)
+    if rows.empty:
+        return 0
+
+    # CSV first: the store written after it stays newer, so is_stale() stays False.
+    rows.to_csv(csv_path(key), mode="a", header=False, index=False, date_format="%Y-%m-%d")
+    prepared = add_population(prepare_dataset(rows), read_populations(population_path(key), key))
+    rollups = {}
+    for name, rollup in build_rollups(prepared).items():
+        path = rollup_path(key, name)
+        if path.exists():
+            rollup = append_prepared(map_store(path), rollup, ["Date", *ROLLUP_DIMENSIONS[name]])
+        rollups[name] = rollup
+    for name, rollup in derive_rollups(key, rollups).items():
+        write_store(frame_table(rollup), rollup_path(key, name))
+    # Base file last: its new version is what the running apps react to.
+    merged = append_prepared(current, prepared, sort_keys(current))
+    write_store(frame_table(add_measures(merged, location_keys(merged))), store_path(key))
+    return len(rows)
+
+
+def ingest_all(keys: Optional[List[str]] = None) -> Dict[str, int]:
+    added = {}
+    for key in keys or DATASET_FILES:
+        if not raw_path(key).exists():
+            print(f"⚠️ Skipping '{key}': {raw_path(key)} not found")
+            continue
+        added[key] = ingest(key)
+        print(f"✅ '{key}': {added[key]} new rows")
+    # Companions of updated datasets: their CFR needs the new days too.
+    for key in {COMPANIONS.get(key) for key, rows in added.items() if rows}:
+        if key in DATASET_FILES:
+            rejoin_companion(key)
+    return added
+
+
+if __name__ == "__main__":
+    ingest_all(sys.argv[1:])
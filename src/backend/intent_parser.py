@@ -0,0 +1,208 @@
+"""Deterministic fast path for simple /summary questions.
+
+Most summary questions are "total / max daily / peak date of <cases|deaths>
+in <location> [between A and B]". `parse_summary_intent` recognizes exactly
+that shape against the dataset's location vocabulary and `answer_intent`
+computes the values from per-location series built from the precomputed
+rollups, so the handler can skip
+the LLM round-trip and the exec. Anything it does not fully understand
+(unknown words, unparsed dates, the wrong measure for the dataset) returns
+None and the request falls back to the LLM.
+"""
+import re
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dataset_prep import normalize_text
+
+METRIC_PATTERNS = [
+    ("peak_date", r"\bpeak(?: date| day)?\b|\b(?:on )?which (?:date|day)\b|\bwhen\b"),
+    ("max_daily", r"\b(?:max|maximum|highest|most|largest|biggest)\b(?: single)?(?: daily| day| one day| in a (?:single )?day| on a (?:single )?day| per day)?"),
+    ("total", r"\btotal\b|\bsum\b|\bhow many\b|\boverall\b|\bcumulative\b"),
+]
+MEASURE_PATTERNS = {
+    "Daily_Cases": r"\b(?:new )?(?:daily )?(?:confirmed )?(?:cases|infections)\b",
+    "Daily_Deaths": r"\b(?:daily )?(?:deaths|fatalities|died)\b",
+}
+MONTHS = ("january|february|march|april|may|june|july|august|september|october|november|december|"
+          "jan|feb|mar|apr|jun|jul|aug|sep|sept|oct|nov|dec")
+DATE = rf"(?:\d{{4}}-\d{{1,2}}-\d{{1,2}}|\d{{1,2}}/\d{{1,2}}/\d{{2,4}}|(?:{MONTHS})(?: \d{{1,2}})?(?: \d{{4}})|\d{{1,2}} (?:{MONTHS}) \d{{4}}|\d{{4}})"
+COUNTRY_ALIASES = {"usa": "us", "united states": "us", "america": "us", "uk": "united kingdom"}
+FILLER = set("""
+what was were is are the of in for a an give me show tell find get covid covid-19 19 coronavirus
+reported recorded daily new on and did have has there during all time so far to date please
+number count with at by day single
+""".split())
+
+
+def _parse_date(text: str, end: bool) -> Optional[pd.Timestamp]:
+    try:
+        ts = pd.Timestamp(pd.to_datetime(text))
+    except (ValueError, OverflowError):
+        return None
+    if not end:
+        return ts
+    # Round the end of a period up: "2021" -> Dec 31, "april 2021" -> Apr 30.
+    if re.fullmatch(r"\d{4}", text):
+        return ts + pd.offsets.YearEnd(0)
+    if re.fullmatch(rf"(?:{MONTHS}) \d{{4}}", text):
+        return ts + pd.offsets.MonthEnd(0)
+    return ts
+
+
+def _take(pattern: str, text: str) -> Tuple[Optional[re.Match], str]:
+    """First match of `pattern`, and `text` with every match removed."""
+    match = re.search(pattern, text)
+    if match is None:
+        return None, text
+    return match, re.sub(pattern, " ", text)
+
+
+def parse_summary_intent(query: str, dataset_key: str,
+                         vocabulary: Dict[str, Tuple[str, str]]) -> Optional[dict]:
+    """Parse a summary query into metrics, measure, location and date bounds."""
+    text = re.sub(r"\bcovid(?:-| )?19\b", " ", normalize_text(query))
+    intent = {"metrics": [], "measure": None, "location": None, "start": None, "end": None}
+
+    # Dates first, so month names and years are not mistaken for anything else.
+    match, text = _take(rf"\b(?:between|from) ({DATE}) (?:and|to|until|through) ({DATE})\b", text)
+    if match:
+        intent["start"], intent["end"] = _parse_date(match.group(1), False), _parse_date(match.group(2), True)
+        if intent["start"] is None or intent["end"] is None:
+            return None
+    else:
+        for prefix, bound in (("on", "day"), ("in", "period"), ("since", "start"),
+                              ("until|through|before", "end")):
+            match, text = _take(rf"\b(?:{prefix}) ({DATE})\b", text)
+            if match:
+                start, end = _parse_date(match.group(1), False), _parse_date(match.group(1), True)
+                if start is None:
+                    return None
+                intent["start"] = None if bound == "end" else start
+                intent["end"] = {"day": start, "period": end, "end": end}.get(bound)
+                break
+    if re.search(r"\d", text):
+        return None  # a date (or number) we could not place
+
+    for metric, pattern in METRIC_PATTERNS:
+        match, text = _take(pattern, text)
+        if match:
+            intent["metrics"].append(metric)
+    if not intent["metrics"]:
+        return None
+
+    for measure, pattern in MEASURE_PATTERNS.items():
+        match, text = _take(pattern, text)
+        if match:
+            if intent["measure"] is not None:
+                return None  # both cases and deaths: leave it to the LLM
+            intent["measure"] = measure
+    expected = "Daily_Deaths" if dataset_key.endswith("deaths") else "Daily_Cases"
+    if intent["measure"] not in (None, expected):
+        return None
+    intent["measure"] = expected
+
+    words = text.split()
+    # Longest location name mentioned wins ("new york" over "york").
+    for size in range(min(len(words), 6), 0, -1):
+        for i in range(len(words) - size + 1):
+            name = " ".join(words[i:i + size])
+            name = COUNTRY_ALIASES.get(name, name) if dataset_key.startswith("global") else name
+            if name in vocabulary:
+                intent["location"] = vocabulary[name]
+                words = words[:i] + words[i + size:]
+                break
+            if dataset_key.startswith("us") and name in ("us", "usa", "united states", "america"):
+                words = words[:i] + words[i + size:]
+                break
+        else:
+            continue
+        break
+
+    if any(word not in FILLER for word in words):
+        return None
+    return intent
+
+
+ROLLUP_FOR_COLUMN = {"Province_State": "state_daily", "Country/Region": "country_daily"}
+Series = Tuple[np.ndarray, np.ndarray]
+
+
+def build_series_index(frame: pd.DataFrame, column: Optional[str], measure: str) -> Dict[Any, Series]:
+    """Per-location (dates, daily totals) arrays, sorted by date."""
+    if column is None:
+        daily = frame.groupby("Date")[measure].sum()
+        return {None: (daily.index.to_numpy(), daily.to_numpy())}
+    daily = frame.groupby([column, "Date"], observed=True)[measure].sum()
+    return {
+        value: (group.index.get_level_values("Date").to_numpy(), group.to_numpy())
+        for value, group in daily.groupby(level=0, observed=True)
+    }
+
+
+def answer_intent(intent: dict, series: Optional[Series]) -> dict:
+    """Compute the requested summary values (same names the LLM code assigns)."""
+    dates, values = series if series is not None else (np.array([], "datetime64[ns]"), np.array([]))
+    lo = 0 if intent["start"] is None else np.searchsorted(dates, intent["start"].to_datetime64(), "left")
+    hi = len(dates) if intent["end"] is None else np.searchsorted(dates, intent["end"].to_datetime64(), "right")
+    dates, values = dates[lo:hi], values[lo:hi]
+    if len(values) == 0:
+        return {metric: "Data not available" for metric in intent["metrics"]}
+    answer = {}
+    if "total" in intent["metrics"]:
+        answer["total"] = values.sum()
+    if "max_daily" in intent["metrics"]:
+        answer["max_daily"] = values.max()
+    if "peak_date" in intent["metrics"]:
+        answer["peak_date"] = pd.Timestamp(dates[values.argmax()])
+    return answer
+
+
+class SummaryFastPath:
+    """Answers recognized intents directly and counts the hit ratio.
+
+    Per-location daily series are built lazily, once per dataset version,
+    so an answer is a dict lookup plus two binary searches.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes: Dict[tuple, Dict[Any, Series]] = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    def answer(self, query: str, dataset_key: str, version: str, df: pd.DataFrame,
+               rollups: Dict[str, pd.DataFrame], vocabulary: Dict[str, Tuple[str, str]]) -> Optional[dict]:
+        intent = parse_summary_intent(query, dataset_key, vocabulary) if "daily_totals" in rollups else None
+        values = None
+        if intent is not None:
+            column, value = intent["location"] or (None, None)
+            index = self._index(dataset_key, version, column, intent["measure"], df, rollups)
+            values = answer_intent(intent, index.get(value))
+        with self._lock:
+            self.stats["hits" if values is not None else "misses"] += 1
+        return values
+
+    def report(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {**self.stats, "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0}
+
+    def _index(self, dataset_key: str, version: str, column: Optional[str], measure: str,
+               df: pd.DataFrame, rollups: Dict[str, pd.DataFrame]) -> Dict[Any, Series]:
+        key = (dataset_key, version, column, measure)
+        index = self._indexes.get(key)
+        if index is None:
+            if column is None:
+                frame = rollups["daily_totals"]
+            else:
+                frame = rollups.get(ROLLUP_FOR_COLUMN.get(column), df)
+            index = build_series_index(frame, column, measure)
+            with self._lock:
+                # Drop indexes built for older versions of this dataset.
+                for stale in [k for k in self._indexes if k[0] == dataset_key and k[1] != version]:
+                    del self._indexes[stale]
+                self._indexes[key] = index
+        return index
@@ -0,0 +1,145 @@
+"""Shared OpenRouter chat-completions client.
+
+One pooled `requests.Session` per process (keep-alive, no TLS handshake per
+call), a connect/read timeout on every attempt plus an overall deadline,
+and retries with exponential backoff on 429/5xx and connection errors
+(honouring Retry-After). Each attempt's timeouts are capped by the time
+left before the deadline, a completion body is read in chunks so a slow
+trickle cannot outlive it, and no retry starts with less than
+`min_attempt` seconds left. `stream` yields content deltas from the SSE
+stream, and `acomplete` runs a completion off the event loop for async
+callers. OPENROUTER_BASE_URL points the client at a local stub for tests
+and benchmarks.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LLMClient:
+    def __init__(self, api_key: Optional[str], base_url: str = "https://openrouter.ai/api/v1",
+                 connect_timeout: float = 5.0, read_timeout: float = 60.0, deadline: float = 90.0,
+                 max_retries: int = 3, backoff: float = 0.5, pool_size: int = 16, min_attempt: float = 1.0):
+        self.api_key = api_key
+        self.url = base_url.rstrip("/") + "/chat/completions"
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.min_attempt = min_attempt
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    @classmethod
+    def from_env(cls) -> "LLMClient":
+        return cls(
+            api_key=os.getenv("OPENROUTER_API_KEY"),
+            base_url=os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
+            connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT", "5")),
+            read_timeout=float(os.getenv("LLM_READ_TIMEOUT", "60")),
+            deadline=float(os.getenv("LLM_DEADLINE", "90")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+            pool_size=int(os.getenv("LLM_POOL_SIZE", "16")),
+            min_attempt=float(os.getenv("LLM_MIN_ATTEMPT", "1")),
+        )
+
+    # ----- public API -----
+    def complete(self, messages: List[Dict[str, str]], model: str, **params: Any) -> str:
+        """Return the first choice's message content."""
+        response = self._post({"model": model, "messages": messages, **params}, stream=False)
+        try:
+            return response.json()["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError) as e:
+            raise LLMError(f"Malformed completion: {response.text[:500]}") from e
+
+    def stream(self, messages: List[Dict[str, str]], model: str, **params: Any) -> Iterator[str]:
+        """Yield content deltas as the model produces them."""
+        response = self._post({"model": model, "messages": messages, "stream": True, **params}, stream=True)
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                # SSE: "data: {...}" events, ": comment" keep-alives, "data: [DONE]"
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    return
+                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+
+    async def acomplete(self, messages: List[Dict[str, str]], model: str, **params: Any) -> str:
+        return await asyncio.to_thread(self.complete, messages, model, **params)
+
+    # ----- internals -----
+    def _post(self, payload: dict, stream: bool) -> requests.Response:
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        give_up_at = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            remaining = give_up_at - time.monotonic()
+            if remaining <= 0:
+                raise LLMError(f"LLM deadline of {self.deadline}s exceeded")
+            retry_after = None
+            try:
+                # the read timeout bounds each socket read, not the whole body: see _read_body
+                response = self.session.post(
+                    self.url, headers=headers, json=payload, stream=True,
+                    timeout=(min(self.connect_timeout, remaining), min(self.read_timeout, remaining)),
+                )
+                if response.status_code == 200:
+                    if not stream:
+                        self._read_body(response, give_up_at)
+                    return response
+                error = LLMError(response.text, response.status_code)
+                if response.status_code not in RETRY_STATUSES:
+                    raise error
+                retry_after = response.headers.get("Retry-After")
+                response.close()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = LLMError(f"{type(e).__name__}: {e}")
+            attempt += 1
+            if attempt > self.max_retries:
+                raise error
+            delay = self.backoff * 2 ** (attempt - 1) * (1 + random.random())
+            if retry_after and retry_after.isdigit():
+                delay = max(delay, float(retry_after))
+            # not enough time left for another attempt after the backoff
+            if time.monotonic() + delay + self.min_attempt > give_up_at:
+                raise error
+            time.sleep(delay)
+
+    def _read_body(self, response: requests.Response, give_up_at: float) -> None:
+        """Load the body into `response`, giving up at the deadline (checked after every read)."""
+        chunks = []
+        try:
+            while True:
+                # read1 returns whatever has arrived instead of waiting for a full chunk
+                chunk = response.raw.read1(16 << 10, decode_content=True)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                if time.monotonic() > give_up_at:
+                    response.close()
+                    raise LLMError(f"LLM deadline of {self.deadline}s exceeded")
+        except urllib3.exceptions.HTTPError as e:
+            # read timeouts and dropped connections: retried like the request itself
+            raise requests.ConnectionError(e) from e
+        response._content = b"".join(chunks)
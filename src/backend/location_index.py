@@ -0,0 +1,103 @@
+"""Group-offset index over (location, Date) for the loaded datasets.
+
+Stores are sorted by their primary location column (Province_State for the
+US files, Country/Region for the global ones) and then by date, so every
+state or country is one contiguous, date-sorted run of rows.
+`LocationIndex.slice` finds that run with a dict lookup and narrows it to a
+date range with two binary searches, returning an `iloc` view that shares
+the dataset's buffers instead of a boolean-mask scan over every row.
+Finer locations (counties, global provinces) are looked up inside the
+primary runs that contain them.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from dataset_prep import LOCATION_COLUMNS, normalize_text, primary_location
+
+DateBound = Optional[object]  # anything pd.Timestamp accepts
+
+
+class LocationIndex:
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.column = primary_location(df)
+        self.dates = df["Date"].to_numpy()
+        self.offsets: Dict[str, Tuple[int, int]] = {}
+        # finer column -> value -> primary values whose runs contain it
+        self.parents: Dict[str, Dict[str, List[str]]] = {}
+        self.codes: Dict[str, np.ndarray] = {}
+        self.names: Dict[str, Tuple[str, str]] = {}
+        if self.column is None:
+            return
+        primary = df[self.column]
+        codes = primary.cat.codes.to_numpy()
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        stops = np.r_[starts[1:], len(codes)]
+        categories = primary.cat.categories
+        for start, stop in zip(starts, stops):
+            if codes[start] >= 0:
+                self.offsets[categories[codes[start]]] = (int(start), int(stop))
+        for col in LOCATION_COLUMNS:
+            if col in df.columns and col != self.column:
+                finer, finer_categories = df[col].cat.codes.to_numpy(), df[col].cat.categories
+                # Rows missing either value (code -1) would decode as some other pair.
+                known = (finer >= 0) & (codes >= 0)
+                pairs = np.unique(finer[known].astype(np.int64) * len(categories) + codes[known])
+                parents: Dict[str, List[str]] = {}
+                for finer_code, primary_code in zip(*np.divmod(pairs, len(categories))):
+                    parents.setdefault(finer_categories[finer_code], []).append(categories[primary_code])
+                self.parents[col] = parents
+                self.codes[col] = finer
+        for col in [self.column, *self.parents]:
+            values = self.offsets if col == self.column else self.parents[col]
+            for value in values:
+                self.names.setdefault(normalize_text(str(value)), (col, value))
+
+    def resolve(self, location: str, column: Optional[str] = None,
+                exact: bool = False) -> Optional[Tuple[str, str]]:
+        """(column, value) for an exact or (unless `exact`) case-insensitive location name."""
+        for col in ([column] if column else [self.column, *self.parents]):
+            values = self.offsets if col == self.column else self.parents.get(col, {})
+            if location in values:
+                return col, location
+        if exact:
+            return None
+        match = self.names.get(normalize_text(str(location)))
+        if match is not None and column in (None, match[0]):
+            return match
+        return None
+
+    def slice(self, location: str, start: DateBound = None, end: DateBound = None,
+              column: Optional[str] = None, exact: bool = False) -> pd.DataFrame:
+        """Rows for `location` with start <= Date <= end (either bound optional).
+
+        With `exact`, only the exact spelling matches, as `df[df[column] == location]` would.
+        """
+        match = self.resolve(location, column, exact)
+        if match is None:
+            return self.df.iloc[0:0]
+        col, value = match
+        if col == self.column:
+            run_start, run_stop = self.offsets[value]
+            lo, hi = self._date_bounds(run_start, run_stop, start, end)
+            return self.df.iloc[lo:hi]
+        # Finer location: compare category codes only inside the primary runs
+        # that contain it.
+        code = self.df[col].cat.categories.get_loc(value)
+        positions = []
+        for parent in self.parents[col][value]:
+            run_start, run_stop = self.offsets[parent]
+            lo, hi = self._date_bounds(run_start, run_stop, start, end)
+            positions.append(lo + np.flatnonzero(self.codes[col][lo:hi] == code))
+        rows = np.concatenate(positions)
+        if len(positions) > 1:
+            rows = rows[np.argsort(self.dates[rows], kind="stable")]
+        return self.df.iloc[rows]
+
+    def _date_bounds(self, run_start: int, run_stop: int, start: DateBound, end: DateBound) -> Tuple[int, int]:
+        dates = self.dates[run_start:run_stop]
+        lo = 0 if start is None else np.searchsorted(dates, pd.Timestamp(start).to_datetime64(), "left")
+        hi = len(dates) if end is None else np.searchsorted(dates, pd.Timestamp(end).to_datetime64(), "right")
+        return run_start + int(lo), run_start + int(max(hi, lo))
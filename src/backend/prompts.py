@@ -0,0 +1,368 @@
+"""Dataset-scoped prompt templates for the /query and /summary LLM calls.
+
+The old /query prompt described all four datasets, repeated
+`columns_list` and carried five chart examples, whichever dataset was
+picked. A prompt is now built from the chosen dataset only, in two parts:
+
+- a static prefix with the role, that dataset's columns and measure
+  rules, its location columns, rollup frames, date handling and output
+  rules. It only changes with the store, so it is rendered once per
+  (kind, dataset, version) and reused. It comes first so providers with
+  prefix caching can reuse it too.
+- a short tail with the locations the question mentions (exact spelling
+  and column), the few-shot examples whose keywords best match the
+  question (2 for charts, 1 for summaries, or PROMPT_EXAMPLES), written
+  for this dataset, and then the question.
+
+The "query_sql" / "summary_sql" kinds are the same prompts for the SQL
+engine (see sql_engine): the tables are described instead of frames and
+the examples are DuckDB queries.
+
+`count_tokens` is an estimate (about four characters per token, with no
+tokenizer dependency), good enough to compare prompts. `report()` gives,
+per kind, prompts built, prefix reuse and mean tokens for /cache_stats.
+"""
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Tuple
+
+from dataset_prep import LOCATION_COLUMNS, normalize_text
+from dataset_registry import Dataset
+from derived import describe_measures
+from rollups import describe_rollups, measure_columns
+
+LOCATION_LABELS = {"Country/Region": ("country", "countries"), "Province_State": ("state", "states"),
+                   "Province/State": ("province", "provinces"), "Admin2": ("county", "counties")}
+SAMPLE_VALUES = 3
+
+
+def count_tokens(text: str) -> int:
+    """Approximate LLM tokens: each word or number costs ~1 per 4 characters, punctuation 1."""
+    return sum(math.ceil(len(piece) / 4) if piece[0].isalnum() else 1
+               for piece in re.findall(r"\w+|[^\w\s]", text))
+
+
+class Example(NamedTuple):
+    title: str
+    keywords: Tuple[str, ...]
+    code: str
+    scope: Optional[str] = None  # "global" / "us" when it only fits one family
+
+
+# Placeholders: {location} {other} {location_column} {places} {measure} {daily} {cumulative};
+# in code, locations and the example's own {title} go in as literals ({location!r}).
+QUERY_EXAMPLES = [
+    Example("Daily {measure} over time in {location}", ("trend", "over time", "daily", "line", "time series"),
+            "daily = slice_location({location!r}).groupby('Date')['{daily}'].sum().reset_index()\n"
+            "fig = px.line(daily, x='Date', y='{daily}', title={title!r})"),
+    Example("Top 10 {places} by {measure}", ("top", "most", "highest", "lowest", "rank", "bar", "which"),
+            "totals = df.groupby('{location_column}', observed=True)['{daily}'].sum().reset_index()\n"
+            "top10 = totals.sort_values('{daily}', ascending=False).head(10)\n"
+            "fig = px.bar(top10, x='{location_column}', y='{daily}', title={title!r})"),
+    Example("Daily {measure} in {location} vs {other}", ("compare", "vs", "versus", "and", "area", "between"),
+            "rows = df[df['{location_column}'].isin([{location!r}, {other!r}])]\n"
+            "daily = rows.groupby(['Date', '{location_column}'], observed=True)['{daily}'].sum().reset_index()\n"
+            "fig = px.line(daily, x='Date', y='{daily}', color='{location_column}', "
+            "title={title!r})"),
+    Example("Monthly {measure} in {location}", ("month", "monthly", "year", "yearly", "week", "weekly", "2020",
+                                                "2021", "2022", "2023"),
+            "rows = slice_location({location!r})\n"
+            "monthly = rows.groupby(['Year', 'Month'])['{daily}'].sum().reset_index()\n"
+            "monthly['Period'] = monthly['Year'].astype(str) + '-' + monthly['Month'].astype(str).str.zfill(2)\n"
+            "fig = px.bar(monthly, x='Period', y='{daily}', title={title!r})"),
+    Example("Share of {measure} among the top 5 {places}", ("share", "pie", "proportion", "percent", "distribution"),
+            "totals = df.groupby('{location_column}', observed=True)['{daily}'].sum().reset_index()\n"
+            "top5 = totals.sort_values('{daily}', ascending=False).head(5)\n"
+            "fig = px.pie(top5, names='{location_column}', values='{daily}', title={title!r})"),
+    Example("World map of {measure}", ("map", "world", "choropleth", "global", "geographic"),
+            "totals = df.groupby('Country/Region', observed=True)['{daily}'].sum().reset_index()\n"
+            "fig = px.choropleth(totals, locations='Country/Region', locationmode='country names', "
+            "color='{daily}', title={title!r})", scope="global"),
+]
+
+SUMMARY_EXAMPLES = [
+    Example("Total {measure} in {location}", ("total", "how many", "sum", "overall"),
+            "total = slice_location({location!r})['{daily}'].sum()"),
+    Example("Peak of daily {measure} in {location}", ("peak", "max", "maximum", "highest", "worst", "when"),
+            "daily = slice_location({location!r}).groupby('Date')['{daily}'].sum()\n"
+            "max_daily = daily.max()\n"
+            "peak_date = daily.idxmax()"),
+    Example("{measure} in {location} between two dates", ("between", "from", "during", "until", "since", "in 20"),
+            "total = slice_location({location!r}, start='2021-03-01', end='2021-06-30')['{daily}'].sum()"),
+]
+
+# The same questions as DuckDB queries, for engine=sql ({location_sql}: a quoted SQL literal).
+QUERY_SQL_EXAMPLES = [
+    Example("Daily {measure} over time in {location}", ("trend", "over time", "daily", "line", "time series"),
+            "-- chart: line x=Date y={daily} title=\"Daily {measure} in {location}\"\n"
+            "SELECT Date, SUM(\"{daily}\") AS \"{daily}\" FROM df WHERE \"{location_column}\" = {location_sql}\n"
+            "GROUP BY Date ORDER BY Date"),
+    Example("Top 10 {places} by {measure}", ("top", "most", "highest", "lowest", "rank", "bar", "which"),
+            "-- chart: bar x={location_column} y={daily} title=\"Top 10 {places} by {measure}\"\n"
+            "SELECT \"{location_column}\", SUM(\"{daily}\") AS \"{daily}\" FROM df\n"
+            "GROUP BY \"{location_column}\" ORDER BY \"{daily}\" DESC LIMIT 10"),
+    Example("Daily {measure} in {location} vs {other}", ("compare", "vs", "versus", "and", "area", "between"),
+            "-- chart: line x=Date y={daily} color={location_column} title=\"Daily {measure}: {location} vs {other}\"\n"
+            "SELECT Date, \"{location_column}\", SUM(\"{daily}\") AS \"{daily}\" FROM df\n"
+            "WHERE \"{location_column}\" IN ({location_sql}, {other_sql})\n"
+            "GROUP BY Date, \"{location_column}\" ORDER BY Date"),
+    Example("Monthly {measure} in {location}", ("month", "monthly", "year", "yearly", "week", "weekly", "2020",
+                                                "2021", "2022", "2023"),
+            "-- chart: bar x=Period y={daily} title=\"Monthly {measure} in {location}\"\n"
+            "SELECT printf('%d-%02d', Year, Month) AS Period, SUM(\"{daily}\") AS \"{daily}\" FROM df\n"
+            "WHERE \"{location_column}\" = {location_sql} GROUP BY Year, Month ORDER BY Year, Month"),
+    Example("Share of {measure} among the top 5 {places}", ("share", "pie", "proportion", "percent", "distribution"),
+            "-- chart: pie names={location_column} values={daily} title=\"Share of {measure}\"\n"
+            "SELECT \"{location_column}\", SUM(\"{daily}\") AS \"{daily}\" FROM df\n"
+            "GROUP BY \"{location_column}\" ORDER BY \"{daily}\" DESC LIMIT 5"),
+    Example("World map of {measure}", ("map", "world", "choropleth", "global", "geographic"),
+            "-- chart: choropleth locations=Country/Region color={daily} title=\"{measure} by country\"\n"
+            "SELECT \"Country/Region\", SUM(\"{daily}\") AS \"{daily}\" FROM df GROUP BY \"Country/Region\"",
+            scope="global"),
+]
+
+SUMMARY_SQL_EXAMPLES = [
+    Example("Total {measure} in {location}", ("total", "how many", "sum", "overall"),
+            "SELECT SUM(\"{daily}\") AS total FROM df WHERE \"{location_column}\" = {location_sql}"),
+    Example("Peak of daily {measure} in {location}", ("peak", "max", "maximum", "highest", "worst", "when"),
+            "SELECT Date AS peak_date, SUM(\"{daily}\") AS max_daily FROM df WHERE \"{location_column}\" = {location_sql}\n"
+            "GROUP BY Date ORDER BY max_daily DESC LIMIT 1"),
+    Example("{measure} in {location} between two dates", ("between", "from", "during", "until", "since", "in 20"),
+            "SELECT SUM(\"{daily}\") AS total FROM df WHERE \"{location_column}\" = {location_sql}\n"
+            "AND Date BETWEEN DATE '2021-03-01' AND DATE '2021-06-30'"),
+]
+
+QUERY_PREFIX = """You are a Python data visualization expert using Plotly and Pandas.
+
+You are working with a Pandas DataFrame `df` from the COVID-19 dataset `{dataset_key}`:
+- Columns: {columns}
+{measure_notes}
+{location_notes}
+- Pre-aggregated frames already summed by date (prefer them over grouping `df` when they answer the question):
+{rollups}
+- Filter a single {location_labels} with `slice_location({sample}, start='2021-01-01', end='2021-03-31')` (start/end optional) instead of `df[df[...] == ...]`; it returns those rows of `df`, sorted by date
+- `Date` is an already datetime64 column (the index is a plain row number, not the date): never call `pd.to_datetime` on it; for year/month/week filter on `Year`, `Month`, `Week`
+- Use `groupby(..., observed=True)` on location columns and `.reset_index()` after groupby
+
+🖼️ Output: only Python code in triple backticks, assigning the chart to `fig`. No `print()`, `fig.show()` or `return`.
+With `update_xaxes`/`update_yaxes` use valid Plotly properties only (`rangemode` is 'normal', 'tozero' or 'nonnegative').
+"""
+
+SUMMARY_PREFIX = """You are a Python data analyst working with a Pandas DataFrame `df` from the COVID-19 dataset `{dataset_key}`:
+- Columns: {columns}
+{measure_notes}
+{location_notes}
+- Pre-aggregated frames already summed by date (prefer them when they answer the query):
+{rollups}
+- Filter a single {location_labels} with `slice_location({sample}, start='2021-01-01', end='2021-03-31')` (start/end optional) instead of `df[df[...] == ...]`; it returns those rows of `df`, sorted by date
+- `Date` is an already datetime64 column (the index is a plain row number): filter date ranges on it
+
+### Task:
+Calculate ONLY what the query asks for:
+- total deaths or cases ➜ `total`
+- max daily ➜ `max_daily`
+- peak date ➜ `peak_date`
+If data is missing assign "Data not available". Only return Python code inside triple backticks. No explanations.
+"""
+
+QUERY_SQL_PREFIX = """You are a SQL data visualization expert using DuckDB.
+
+You are querying the table `df` of the COVID-19 dataset `{dataset_key}`:
+- Columns: {columns}
+{measure_notes}
+{location_notes}
+- Pre-aggregated tables already summed by date (prefer them over grouping `df` when they answer the question):
+{rollups}
+- `Date` is a TIMESTAMP: compare it with DATE literals (`Date BETWEEN DATE '2021-01-01' AND DATE '2021-03-31'`); for year/month/week use `Year`, `Month`, `Week`
+- Quote column names in double quotes (`"Country/Region"`) and values in single quotes
+
+🖼️ Output: only one DuckDB SELECT statement in triple backticks, its first line telling how to plot the result:
+`-- chart: <line|bar|scatter|area|pie|choropleth> x=<column> y=<column> color=<column> title="..."`
+(pie takes names= and values=, choropleth takes locations= and color=). Every column named there must be in the result.
+"""
+
+SUMMARY_SQL_PREFIX = """You are a SQL data analyst querying the table `df` of the COVID-19 dataset `{dataset_key}` with DuckDB:
+- Columns: {columns}
+{measure_notes}
+{location_notes}
+- Pre-aggregated tables already summed by date (prefer them when they answer the query):
+{rollups}
+- `Date` is a TIMESTAMP: compare it with DATE literals (`Date BETWEEN DATE '2021-01-01' AND DATE '2021-03-31'`)
+
+### Task:
+Write one SELECT returning a single row with ONLY the columns the query asks for:
+- total deaths or cases ➜ `total`
+- max daily ➜ `max_daily`
+- peak date ➜ `peak_date`
+Only return the SQL inside triple backticks. No explanations.
+"""
+
+QUERY_TAIL = """{mentions}
+🎯 Examples for this dataset:
+{examples}
+
+📝 A user asked: "{query}"
+"""
+
+SUMMARY_TAIL = """{mentions}
+### Examples:
+{examples}
+
+### User Query:
+"{query}"
+"""
+
+# kind -> (prefix, tail, examples, how many examples by default, example language)
+TEMPLATES = {
+    "query": (QUERY_PREFIX, QUERY_TAIL, QUERY_EXAMPLES, 2, "python"),
+    "summary": (SUMMARY_PREFIX, SUMMARY_TAIL, SUMMARY_EXAMPLES, 1, "python"),
+    "query_sql": (QUERY_SQL_PREFIX, QUERY_TAIL, QUERY_SQL_EXAMPLES, 2, "sql"),
+    "summary_sql": (SUMMARY_SQL_PREFIX, SUMMARY_TAIL, SUMMARY_SQL_EXAMPLES, 1, "sql"),
+}
+
+
+def sql_literal(value: str) -> str:
+    """A single-quoted SQL string literal ("Cote d'Ivoire" -> 'Cote d''Ivoire')."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def location_columns(dataset: Dataset) -> List[str]:
+    return [col for col in LOCATION_COLUMNS if col in dataset.df.columns]
+
+
+def mentioned_locations(dataset: Dataset, entities: FrozenSet[str]) -> List[Tuple[str, str]]:
+    """(column, value) of the known locations among a query's entities."""
+    return [dataset.vocabulary[name] for name in sorted(entities) if name in dataset.vocabulary]
+
+
+def select_examples(examples: Sequence[Example], query: str, family: str, count: int) -> List[Example]:
+    """The `count` examples whose keywords best match the query (ties keep list order)."""
+    padded = f" {normalize_text(query)} "
+    fitting = [example for example in examples if example.scope in (None, family)]
+    scores = [sum(f" {keyword}" in padded for keyword in example.keywords) for example in fitting]
+    ranked = sorted(range(len(fitting)), key=lambda i: -scores[i])
+    return [fitting[i] for i in ranked[:count]]
+
+
+def render_example(example: Example, values: Dict[str, str], language: str) -> str:
+    """An example for this dataset, its title as a comment line (and as the code's `{title}`)."""
+    title = example.title.format(**values)
+    return f"{'--' if language == 'sql' else '#'} {title}\n{example.code.format(**values, title=title)}"
+
+
+class RenderedPrompt(NamedTuple):
+    text: str
+    tokens: int
+
+
+class PromptBuilder:
+    def __init__(self, examples: Optional[int] = None, max_prefixes: int = 64):
+        self.examples = examples
+        self.max_prefixes = max_prefixes
+        self._prefixes: "OrderedDict[tuple, Tuple[str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_env(cls) -> "PromptBuilder":
+        examples = os.getenv("PROMPT_EXAMPLES")
+        return cls(examples=int(examples) if examples else None)
+
+    # ----- public API -----
+    def build(self, kind: str, dataset: Dataset, query: str, entities: FrozenSet[str] = frozenset()) -> RenderedPrompt:
+        """The prompt for one question about `dataset` ("query" or "summary")."""
+        _, tail_template, examples, default_count, language = TEMPLATES[kind]
+        prefix, prefix_tokens, reused = self._prefix(kind, dataset)
+        mentioned = mentioned_locations(dataset, entities)
+        values = self._example_values(dataset, mentioned)
+        family = "us" if "Province_State" in dataset.df.columns else "global"
+        chosen = select_examples(examples, query, family, default_count if self.examples is None else self.examples)
+        tail = tail_template.format(
+            mentions=("Locations in the question: "
+                      + ", ".join(f"{value!r} ({column})" for column, value in mentioned) + "\n") if mentioned else "",
+            examples=f"```{language}\n" + "\n\n".join(
+                render_example(example, values, language) for example in chosen) + "\n```",
+            query=query,
+        )
+        tokens = prefix_tokens + count_tokens(tail)
+        with self._lock:
+            stats = self.stats.setdefault(kind, {"prompts": 0, "prefix_reused": 0, "tokens": 0})
+            stats["prompts"] += 1
+            stats["prefix_reused"] += reused
+            stats["tokens"] += tokens
+        return RenderedPrompt(prefix + "\n" + tail, tokens)
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {kind: {**stats, "mean_tokens": round(stats["tokens"] / stats["prompts"], 1)}
+                    for kind, stats in self.stats.items()}
+
+    # ----- internals -----
+    def _prefix(self, kind: str, dataset: Dataset) -> Tuple[str, int, bool]:
+        key = (kind, dataset.key, dataset.version)
+        with self._lock:
+            if key in self._prefixes:
+                self._prefixes.move_to_end(key)
+                return (*self._prefixes[key], True)
+        prefix = self._render_prefix(kind, dataset)
+        entry = (prefix, count_tokens(prefix))
+        with self._lock:
+            # Drop this dataset's older versions along with the least recently used.
+            for stale in [k for k in self._prefixes if k[:2] == key[:2]]:
+                del self._prefixes[stale]
+            self._prefixes[key] = entry
+            while len(self._prefixes) > self.max_prefixes:
+                self._prefixes.popitem(last=False)
+        return (*entry, False)
+
+    def _render_prefix(self, kind: str, dataset: Dataset) -> str:
+        df = dataset.df
+        measures = measure_columns(df)
+        measure_notes = []
+        for cumulative in ("Cases", "Deaths"):
+            daily = f"Daily_{cumulative}"
+            if daily in measures:
+                measure_notes.append(f"- `{daily}`: new per day, use it for sums, trends and date ranges"
+                                     + (f"; `{cumulative}`: running total" if cumulative in measures else ""))
+        measure_notes += describe_measures(df.columns)
+        if any("CFR" in rollup.columns for rollup in dataset.rollups.values()):
+            measure_notes.append("- the rollups carry both Cases and Deaths (with their daily columns) and `CFR`, "
+                                 "deaths per 100 cases to date: compare them there instead of joining datasets")
+        location_notes = []
+        for col in location_columns(dataset):
+            values = df[col].cat.categories if hasattr(df[col], "cat") else df[col].dropna().unique()
+            if not len(values):
+                continue
+            sample = ", ".join(repr(value) for value in list(values[:SAMPLE_VALUES]))
+            location_notes.append(f"- {LOCATION_LABELS[col][0]}: '{col}' ({len(values)} values, e.g. {sample})")
+        template = TEMPLATES[kind][0]
+        return template.format(
+            dataset_key=dataset.key,
+            columns=", ".join(repr(col) for col in df.columns),
+            measure_notes="\n".join(measure_notes),
+            location_notes="\n".join(location_notes),
+            rollups=describe_rollups(dataset.rollups),
+            location_labels="/".join(LOCATION_LABELS[col][0] for col in location_columns(dataset)),
+            sample=repr(self._example_values(dataset, [])["location"]),
+        )
+
+    def _example_values(self, dataset: Dataset, mentioned: List[Tuple[str, str]]) -> Dict[str, str]:
+        """Fill-ins for the examples: the question's own locations where it names any."""
+        df = dataset.df
+        columns = location_columns(dataset)
+        column = mentioned[0][0] if mentioned else columns[0]
+        known = [value for col, value in mentioned if col == column]
+        samples = list(df[column].cat.categories[:2]) if hasattr(df[column], "cat") else []
+        location, other = (known + [s for s in samples if s not in known] + ["", ""])[:2]
+        daily = next((col for col in measure_columns(df) if col.startswith("Daily_")), "Daily_Cases")
+        cumulative = daily[len("Daily_"):]
+        other = other or location
+        return {
+            "location": location, "other": other, "location_column": column,
+            "location_sql": sql_literal(location), "other_sql": sql_literal(other),
+            "places": LOCATION_LABELS[column][1],
+            "measure": cumulative.lower(), "daily": daily, "cumulative": cumulative,
+        }
@@ -0,0 +1,216 @@
+"""Cache of LLM-generated code in front of the OpenRouter call.
+
+Entries are keyed on (kind, dataset_key, normalized query), kept in an
+in-memory LRU with a TTL and mirrored to SQLite so hits survive restarts.
+With LLM_CACHE_SEMANTIC=1 a miss falls back to embedding similarity
+(sentence-transformers) against cached queries for the same dataset; a
+semantic hit additionally requires the same numbers and known locations,
+so "deaths in Texas" never answers "deaths in Ohio".
+
+Hits only touch memory: last-used times are written to SQLite with the
+next put (before it evicts by them) or every LLM_CACHE_USED_FLUSH seconds,
+and SQLite has its own lock so lookups never wait on a commit. The entries
+are loaded through a short-lived connection; each process then opens its
+own on first write, so none is shared across the executor or worker forks.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+from typing import Dict, FrozenSet, Iterable, Optional
+
+import numpy as np
+
+from dataset_prep import normalize_text
+
+
+def query_entities(query: str, vocabulary: Iterable[str] = ()) -> FrozenSet[str]:
+    """Numbers and known location names mentioned in a query."""
+    query = normalize_text(query)
+    found = set(re.findall(r"\d+", query))
+    padded = f" {query} "
+    found.update(name for name in vocabulary if f" {name} " in padded)
+    return frozenset(found)
+
+
+class ResponseCache:
+    def __init__(self, path: Optional[str], max_entries: int = 1024, ttl: float = 86400,
+                 semantic: bool = False, similarity: float = 0.9, used_flush: float = 60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.used_flush = used_flush
+        self.semantic = semantic
+        self.similarity = similarity
+        self._entries: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._model = None
+        self._model_lock = threading.Lock()
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0, "saved_seconds": 0.0}
+        self._used: Dict[tuple, float] = {}  # key -> last hit, not yet written
+        self._used_flushed = time.time()
+        self._path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_pid = None
+        self._db_lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with closing(sqlite3.connect(path)) as db:
+                db.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    "kind TEXT, dataset TEXT, query TEXT, value TEXT, latency REAL, "
+                    "created REAL, used REAL, entities TEXT, embedding BLOB, "
+                    "PRIMARY KEY (kind, dataset, query))"
+                )
+                db.commit()
+                self._load(db)
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        return cls(
+            path=os.getenv("LLM_CACHE_PATH", "data/llm_cache.sqlite3") or None,
+            max_entries=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("LLM_CACHE_TTL", "86400")),
+            semantic=os.getenv("LLM_CACHE_SEMANTIC", "0") == "1",
+            similarity=float(os.getenv("LLM_CACHE_SIMILARITY", "0.9")),
+            used_flush=float(os.getenv("LLM_CACHE_USED_FLUSH", "60")),
+        )
+
+    # ----- public API -----
+    def get(self, kind: str, dataset_key: str, query: str,
+            entities: FrozenSet[str] = frozenset()) -> Optional[str]:
+        key = (kind, dataset_key, normalize_text(query))
+        with self._lock:
+            entry = self._lookup(key)
+        if entry is None and self.semantic:
+            # Embed outside the lock; the model call is the slow part.
+            query_vec = self._embed(key[2])
+            with self._lock:
+                entry = self._lookup_similar(key, entities, query_vec)
+                if entry is not None:
+                    self.stats["semantic_hits"] += 1
+        with self._lock:
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            self.stats["saved_seconds"] += entry["latency"]
+            entry["used"] = time.time()
+            if self._path is None:
+                return entry["value"]
+            self._used[entry["key"]] = entry["used"]
+            used = self._take_used() if entry["used"] - self._used_flushed >= self.used_flush else {}
+            value = entry["value"]
+        if used:
+            with self._db_lock:
+                db = self._connection()
+                self._write_used(db, used)
+                db.commit()
+        return value
+
+    def put(self, kind: str, dataset_key: str, query: str, value: str, latency: float,
+            entities: FrozenSet[str] = frozenset()) -> None:
+        key = (kind, dataset_key, normalize_text(query))
+        now = time.time()
+        embedding = self._embed(key[2]) if self.semantic else None
+        entry = {"key": key, "value": value, "latency": latency, "created": now, "used": now,
+                 "entities": entities, "embedding": embedding}
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            used = self._take_used()
+        if self._path is not None:
+            with self._db_lock:
+                db = self._connection()
+                self._write_used(db, used)
+                db.execute(
+                    "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (*key, value, latency, now, now, "\n".join(sorted(entities)),
+                     None if embedding is None else embedding.astype("float32").tobytes()),
+                )
+                db.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,))
+                db.execute(
+                    "DELETE FROM llm_cache WHERE rowid NOT IN "
+                    "(SELECT rowid FROM llm_cache ORDER BY used DESC LIMIT ?)", (self.max_entries,))
+                db.commit()
+
+    def report(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "hit_rate": self.stats["hits"] / lookups if lookups else 0.0,
+            }
+
+    # ----- internals -----
+    def _expired(self, entry: dict) -> bool:
+        return time.time() - entry["created"] > self.ttl
+
+    def _take_used(self) -> Dict[tuple, float]:
+        used, self._used = self._used, {}
+        self._used_flushed = time.time()
+        return used
+
+    def _connection(self) -> sqlite3.Connection:
+        """This process's connection, opened on first use (and again in a forked child); hold _db_lock."""
+        if self._db is None or self._db_pid != os.getpid():
+            self._db = sqlite3.connect(self._path, check_same_thread=False)
+            self._db_pid = os.getpid()
+        return self._db
+
+    @staticmethod
+    def _write_used(db: sqlite3.Connection, used: Dict[tuple, float]) -> None:
+        db.executemany("UPDATE llm_cache SET used = MAX(used, ?) WHERE kind = ? AND dataset = ? AND query = ?",
+                             [(when, *key) for key, when in used.items()])
+
+    def _lookup(self, key: tuple) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._expired(entry):
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _lookup_similar(self, key: tuple, entities: FrozenSet[str], query_vec: np.ndarray) -> Optional[dict]:
+        candidates = [
+            (k, e) for k, e in self._entries.items()
+            if k[:2] == key[:2] and e["embedding"] is not None
+            and e["entities"] == entities and not self._expired(e)
+        ]
+        if not candidates:
+            return None
+        scores = np.stack([e["embedding"] for _, e in candidates]) @ query_vec
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity:
+            return None
+        self._entries.move_to_end(candidates[best][0])
+        return candidates[best][1]
+
+    def _embed(self, text: str) -> np.ndarray:
+        if self._model is None:
+            # Concurrent first misses would each load the model.
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    self._model = SentenceTransformer(os.getenv("LLM_CACHE_EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+        return self._model.encode(text, normalize_embeddings=True)
+
+    def _load(self, db: sqlite3.Connection) -> None:
+        rows = db.execute(
+            "SELECT kind, dataset, query, value, latency, created, used, entities, embedding "
+            "FROM llm_cache WHERE created >= ? ORDER BY used DESC LIMIT ?",
+            (time.time() - self.ttl, self.max_entries),
+        ).fetchall()
+        for kind, dataset, query, value, latency, created, used, entities, embedding in reversed(rows):
+            self._entries[(kind, dataset, query)] = {
+                "key": (kind, dataset, query), "value": value, "latency": latency, "created": created, "used": used,
+                "entities": frozenset(filter(None, entities.split("\n"))),
+                "embedding": None if embedding is None else np.frombuffer(embedding, dtype="float32"),
+            }
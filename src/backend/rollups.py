@@ -0,0 +1,60 @@
+"""Precomputed aggregate cubes for the groupbys the prompts steer towards.
+
+Generated code almost always sums the county/province rows by `Date`,
+`Province_State` or `Country/Region`. These rollups are built once with
+the columnar store and handed to generated code as extra named frames,
+so typical charts aggregate thousands of rows instead of millions:
+
+- `daily_totals`:  one row per Date
+- `state_daily`:   Date x Province_State (US datasets)
+- `country_daily`: Date x Country/Region (global datasets)
+
+Each carries the daily measure (`Daily_Cases`/`Daily_Deaths`) and the
+cumulative one (`Cases`/`Deaths`), the summed `Population` where the base
+rows have one, plus Year/Month/Week. Derived measures (7-day averages,
+per-100k rates, companion counts and CFR) are added by derived.py.
+"""
+from typing import Dict, List
+
+import pandas as pd
+
+from dataset_prep import COUNT_COLUMNS, add_date_parts
+
+ROLLUP_DIMENSIONS = {
+    "daily_totals": [],
+    "state_daily": ["Province_State"],
+    "country_daily": ["Country/Region"],
+}
+
+
+def measure_columns(df: pd.DataFrame) -> List[str]:
+    return [col for col in COUNT_COLUMNS if col in df.columns]
+
+
+def build_rollups(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """Aggregate a prepared dataset into every rollup its columns allow."""
+    measures = measure_columns(df)
+    rollups = {}
+    if "Date" not in df.columns or not measures:
+        return rollups
+    summed = measures + (["Population"] if "Population" in df.columns else [])
+    for name, dims in ROLLUP_DIMENSIONS.items():
+        if not all(dim in df.columns for dim in dims):
+            continue
+        # int64 sums: global cumulative totals get close to the int32 limit.
+        frame = (
+            df.groupby(["Date", *dims], observed=True, sort=True)[summed]
+            .sum()
+            .astype("int64")
+            .reset_index()
+        )
+        rollups[name] = add_date_parts(frame)
+    return rollups
+
+
+def describe_rollups(rollups: Dict[str, pd.DataFrame]) -> str:
+    """Prompt lines listing the rollup frames available for a dataset."""
+    return "\n".join(
+        f"- `{name}`: columns {', '.join(repr(col) for col in frame.columns)}"
+        for name, frame in rollups.items()
+    )
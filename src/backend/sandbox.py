@@ -0,0 +1,46 @@
+"""Execution context for LLM-generated pandas/plotly snippets.
+
+Generated code used to get `df.copy()`, a deep copy of the whole dataset per
+request. With pandas copy-on-write enabled, `dataset_view` hands it a lazy
+shallow copy instead: untouched columns keep sharing the (read-only) dataset
+buffers and only the columns the snippet actually writes are duplicated.
+When a `LocationIndex` is passed, the snippet also gets `slice_location`,
+which returns indexed row slices of the same dataset instead of mask scans.
+Before it runs, the snippet goes through code_rewrite, which turns the
+usual mask filters and full-frame groupbys into those slices and rollup
+lookups and drops no-op or harmful calls.
+"""
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from code_cache import compile_code
+from code_rewrite import rewrite_code, snippet_schema
+from location_index import LocationIndex
+
+# Process-wide: copy-on-write is what makes the shallow views below safe.
+pd.set_option("mode.copy_on_write", True)
+
+
+def dataset_view(df: pd.DataFrame) -> pd.DataFrame:
+    """Return a copy-on-write view of a shared dataset frame."""
+    return df.copy(deep=False)
+
+
+def run_generated_code(code: str, df: pd.DataFrame, frames: Optional[Dict[str, pd.DataFrame]] = None,
+                       index: Optional[LocationIndex] = None, rewrites: Optional[List[str]] = None,
+                       **env: Any) -> Dict[str, Any]:
+    """Exec `code` (rewritten for this dataset) with `df` and any extra `frames` bound to views; return its locals.
+
+    The names of the rewrites applied are appended to `rewrites` when a list is passed.
+    """
+    code, applied = rewrite_code(code, snippet_schema(df, frames, index is not None))
+    if rewrites is not None:
+        rewrites.extend(applied)
+    local_env = {"df": dataset_view(df), **env}
+    if index is not None:
+        local_env["slice_location"] = index.slice
+    for name, frame in (frames or {}).items():
+        local_env[name] = dataset_view(frame)
+    exec(compile_code(code), {}, local_env)
+    return local_env
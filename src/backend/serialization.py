@@ -0,0 +1,156 @@
+"""Single-pass JSON encoding for figures and API responses.
+
+Plotly figures carry numpy arrays (every point of every trace). orjson
+encodes numeric and datetime64 arrays natively, so a figure goes from its
+trace dicts to bytes in one pass and is embedded into the response
+envelope as a pre-encoded fragment instead of being round-tripped through
+json.dumps/json.loads and re-encoded by jsonify.
+
+`typed_arrays` optionally replaces long numeric trace arrays with
+plotly.js typed-array specs (`{"dtype": "f8", "bdata": <base64>}`,
+plotly.js >= 2.28), each in the narrowest dtype that holds it exactly:
+daily counts stored as floats become u2/i4 at 2.7-5.3 base64 bytes per
+value instead of their decimal text, and dates become epoch milliseconds
+(f8) instead of ISO strings. plotly.js decodes them without parsing.
+"""
+import base64
+import datetime
+from typing import Any, Optional
+
+import numpy as np
+import orjson
+import pandas as pd
+from flask import Response
+
+OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+# numpy dtype -> plotly.js typed-array dtype (int64 is not supported there)
+TYPED_ARRAY_DTYPES = {"float64": "f8", "float32": "f4", "int32": "i4", "uint32": "u4",
+                      "int16": "i2", "uint16": "u2", "int8": "i1", "uint8": "u1"}
+TYPED_ARRAY_MIN_LENGTH = 32
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, pd.Timestamp):
+        return obj.isoformat()
+    if isinstance(obj, (np.ndarray, pd.Series, pd.Index)):
+        # object / non-contiguous arrays that orjson cannot take directly
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return str(obj)
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default, option=OPTIONS)
+
+
+def figure_dict(fig) -> dict:
+    """`fig.to_dict()` without its deepcopy of every trace array.
+
+    The encoder only reads the structure, so sharing the figure's own
+    containers is safe and saves the dominant cost on large figures.
+    """
+    res = {"data": fig._data, "layout": fig._layout}
+    frames = [frame._props for frame in fig._frame_objs]
+    if frames:
+        res["frames"] = frames
+    return res
+
+
+def figure_json(fig) -> bytes:
+    """Encode a Plotly figure to JSON bytes in a single pass."""
+    return dumps(figure_dict(fig))
+
+
+def _narrowest(values: np.ndarray) -> np.ndarray:
+    """The smallest plotly.js dtype that holds `values` exactly (counts stored as floats become ints)."""
+    if values.dtype.kind == "f":
+        # Only cast when the integers fit a typed-array int (uint32 at most); a float64 cast to int64 would wrap.
+        if (values.size and np.isfinite(values).all() and (values == np.round(values)).all()
+                and np.iinfo("int32").min <= values.min() and values.max() <= np.iinfo("uint32").max):
+            values = values.astype("int64")
+        elif values.dtype.itemsize > 4 and (values.astype("float32") == values).all():
+            return values.astype("float32")
+        else:
+            return values
+    if values.dtype.kind in "iu" and values.size:
+        low, high = values.min(), values.max()
+        for dtype in ("uint8", "int8", "uint16", "int16", "uint32", "int32"):
+            if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+                return values.astype(dtype)
+        return values.astype("float64")
+    return values
+
+
+def _typed_array(values: np.ndarray) -> Any:
+    if values.dtype.kind not in "iuf" or values.ndim not in (1, 2) or len(values) < TYPED_ARRAY_MIN_LENGTH:
+        return values
+    values = _narrowest(values)
+    data = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder("<"))
+    spec = {"dtype": TYPED_ARRAY_DTYPES[values.dtype.name], "bdata": base64.b64encode(data.tobytes()).decode("ascii")}
+    if values.ndim == 2:
+        spec["shape"] = f"{values.shape[0]},{values.shape[1]}"
+    return spec
+
+
+def _typed_arrays_in(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _typed_arrays_in(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) and value and isinstance(value[0], dict):
+        return [_typed_arrays_in(item) for item in value]
+    if isinstance(value, (pd.Series, pd.Index)):
+        value = value.to_numpy()
+    if isinstance(value, np.ndarray):
+        return _typed_array(value)
+    return value
+
+
+def _epoch_ms(values: Any) -> Optional[np.ndarray]:
+    """Naive datetimes (datetime64 or plotly's object arrays of datetime) as epoch ms, else None."""
+    if not isinstance(values, np.ndarray) or len(values) < TYPED_ARRAY_MIN_LENGTH:
+        return None
+    if values.dtype.kind == "O" and not isinstance(values[0], (datetime.datetime, np.datetime64)):
+        return None
+    if values.dtype.kind not in "MO":
+        return None
+    try:
+        dates = pd.DatetimeIndex(values)
+    except (TypeError, ValueError):  # mixed values
+        return None
+    if dates.tz is not None or dates.hasnans:
+        return None
+    return dates.to_numpy().astype("datetime64[ms]").astype("int64")
+
+
+def _typed_trace(trace: dict, layout: dict) -> dict:
+    trace = _typed_arrays_in(trace)
+    # Dates go as epoch milliseconds, which date axes take as is; the axis is pinned to "date".
+    for axis in ("x", "y"):
+        name = f"{axis}axis{trace.get(f'{axis}axis', axis)[1:]}"
+        settings = layout.get(name) or {}
+        if settings.get("type") not in (None, "-", "date"):
+            continue
+        millis = _epoch_ms(trace.get(axis))
+        if millis is not None:
+            trace[axis] = _typed_array(millis)
+            layout[name] = {**settings, "type": "date"}
+    return trace
+
+
+def typed_arrays(fig_dict: dict) -> dict:
+    """Figure dict whose numeric and date trace arrays (data, frames) are plotly.js typed arrays."""
+    layout = dict(fig_dict.get("layout") or {})
+    res = {**fig_dict, "data": [_typed_trace(trace, layout) for trace in fig_dict["data"]], "layout": layout}
+    if "frames" in fig_dict:
+        res["frames"] = [{**frame, "data": [_typed_trace(trace, layout) for trace in frame.get("data", [])]}
+                         for frame in fig_dict["frames"]]
+    return res
+
+
+def raw_json(data: Optional[bytes]) -> Optional[orjson.Fragment]:
+    """Wrap already-encoded JSON so `dumps` embeds it without re-encoding."""
+    return None if data is None else orjson.Fragment(data)
+
+
+def json_response(payload: Any, status: int = 200) -> Response:
+    return Response(dumps(payload), status=status, mimetype="application/json")
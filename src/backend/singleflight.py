@@ -0,0 +1,65 @@
+"""In-flight deduplication of identical work (single-flight).
+
+When a dashboard loads, several users ask the same question within the
+same second. Without coordination each request misses every cache at
+once, because nothing has been stored yet, and each calls OpenRouter and
+runs the snippet. `SingleFlight.do(stage, key, fn)` runs `fn` once per
+key at a time. Callers that arrive while it runs wait for it and get the
+same value, or the same exception. Counters per stage record how many
+calls ran and how many were coalesced into a running one.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call:
+    __slots__ = ("done", "value", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[Tuple[str, Hashable], _Call] = {}
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def do(self, stage: str, key: Hashable, fn: Callable[[], T]) -> Tuple[T, bool]:
+        """(value, shared): `fn()`, or the outcome of the identical call already running (shared=True)."""
+        with self._lock:
+            stats = self.stats.setdefault(stage, {"calls": 0, "coalesced": 0})
+            call = self._calls.get((stage, key))
+            leader = call is None
+            if leader:
+                call = self._calls[(stage, key)] = _Call()
+                stats["calls"] += 1
+            else:
+                call.waiters += 1
+                stats["coalesced"] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[(stage, key)]
+            call.done.set()
+        return call.value, False
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"in_flight": len(self._calls),
+                    "waiting": sum(call.waiters for call in self._calls.values()),
+                    **{stage: dict(stats) for stage, stats in self.stats.items()}}
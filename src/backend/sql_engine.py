@@ -0,0 +1,169 @@
+"""SQL execution mode: generated DuckDB queries instead of exec'd pandas.
+
+With `engine=sql`, /query and /summary ask the LLM for one SELECT
+statement instead of a pandas snippet. It runs on an embedded DuckDB
+connection where the dataset is the table `df` and each rollup is a table
+of its own name. All of them are registered as Arrow tables over the
+dataset's frames, without copying them. DuckDB pushes filters and
+projections into those scans and aggregates on SQL_THREADS threads (0 =
+one per core). Only the (usually small) result becomes a pandas frame.
+
+Chart queries start with a header line that says how to plot the result,
+for example:
+
+    -- chart: line x=Date y=Daily_Deaths color=Province_State title="Daily deaths"
+
+`sql_figure` feeds the result to the matching plotly express builder.
+Summary queries return one row whose total / max_daily / peak_date
+columns become the summary.
+
+duckdb is optional: without it `SqlEngine.available` is False and the
+routes refuse engine=sql. Each process has one in-memory database that
+cannot read or write files (enable_external_access=false, locked), and
+only a single SELECT is run. Every query gets its own cursor, so Flask
+threads (EXEC_WORKERS=0) can query at the same time. The dataset's Arrow
+tables are built once per version and registered on that cursor.
+"""
+import os
+import re
+import threading
+from typing import Dict, Optional, Tuple
+
+import pandas as pd
+import plotly.express as px
+import pyarrow as pa
+
+from dataset_registry import Dataset
+
+try:
+    import duckdb
+except ImportError:  # optional: engine=sql is unavailable without it
+    duckdb = None
+
+ENGINES = ("pandas", "sql")
+SQL_THREADS = int(os.getenv("SQL_THREADS", "0"))
+SQL_MEMORY_MB = int(os.getenv("SQL_MEMORY_MB", "0"))  # 0 = DuckDB's default (80% of RAM)
+CHARTS = {"line": px.line, "bar": px.bar, "scatter": px.scatter, "area": px.area, "pie": px.pie,
+          "choropleth": px.choropleth}
+CHART_ARGUMENTS = ("x", "y", "color", "names", "values", "locations", "title")
+CHART_LINE = re.compile(r"^\s*--\s*chart:\s*(\w+)(.*)$", re.MULTILINE | re.IGNORECASE)
+CHART_ARGUMENT = re.compile(r"(\w+)=(\"[^\"]*\"|'[^']*'|\S+)")
+
+
+class SqlError(Exception):
+    pass
+
+
+def engine_kind(kind: str, engine: str) -> str:
+    """Prompt / LLM cache kind of a request: "query" or "summary", suffixed for SQL."""
+    return kind if engine == "pandas" else f"{kind}_sql"
+
+
+def parse_chart(sql: str) -> Tuple[str, Dict[str, str]]:
+    """(chart type, builder arguments) from a query's `-- chart:` line; ("", {}) without one."""
+    match = CHART_LINE.search(sql)
+    if match is None:
+        return "", {}
+    arguments = {name: value.strip("\"'") for name, value in CHART_ARGUMENT.findall(match.group(2))
+                 if name in CHART_ARGUMENTS}
+    return match.group(1).lower(), arguments
+
+
+def sql_figure(sql: str, result: pd.DataFrame):
+    """The plotly express figure the query's chart line asks for (a line over Date without one)."""
+    chart, arguments = parse_chart(sql)
+    if chart not in CHARTS:
+        if chart:
+            raise SqlError(f"Unknown chart type '{chart}' (expected one of {', '.join(CHARTS)}).")
+        numeric = result.select_dtypes("number").columns
+        if "Date" not in result.columns or not len(numeric):
+            raise SqlError("The query has no `-- chart:` line and no Date / numeric columns to plot.")
+        chart, arguments = "line", {"x": "Date", "y": numeric[0]}
+    missing = [value for name, value in arguments.items() if name != "title" and value not in result.columns]
+    if missing:
+        raise SqlError(f"Chart columns not in the query result: {', '.join(missing)}")
+    if chart == "choropleth":
+        arguments.setdefault("locationmode", "country names")
+    return CHARTS[chart](result, **arguments)
+
+
+def summary_values(result: pd.DataFrame) -> Dict[str, object]:
+    """The first result row as summary values (total, max_daily, peak_date)."""
+    return {col: result[col].iloc[0] for col in result.columns} if len(result) else {}
+
+
+class SqlEngine:
+    def __init__(self, threads: int = 0, memory_mb: int = 0):
+        self.threads = threads
+        self.memory_mb = memory_mb
+        self._lock = threading.Lock()
+        self._database: Optional["duckdb.DuckDBPyConnection"] = None
+        self._tables: Dict[str, Tuple[str, Dict[str, pa.Table]]] = {}
+
+    @classmethod
+    def from_env(cls) -> "SqlEngine":
+        return cls(SQL_THREADS, SQL_MEMORY_MB)
+
+    @property
+    def available(self) -> bool:
+        return duckdb is not None
+
+    def tables(self, dataset: Dataset) -> Dict[str, pa.Table]:
+        """Arrow tables over the dataset's current frames: `df` and one per rollup."""
+        with self._lock:
+            cached = self._tables.get(dataset.key)
+            if cached is None or cached[0] != dataset.version:
+                # from_pandas shares the frames' numeric, datetime and category-code buffers.
+                tables = {"df": pa.Table.from_pandas(dataset.df, preserve_index=False)}
+                for name, frame in dataset.rollups.items():
+                    tables[name] = pa.Table.from_pandas(frame, preserve_index=False)
+                cached = self._tables[dataset.key] = (dataset.version, tables)
+            return cached[1]
+
+    def cursor(self, dataset: Dataset, sql: str) -> "duckdb.DuckDBPyConnection":
+        """A new cursor on this process's database with the tables `sql` names registered."""
+        tables = self.tables(dataset)
+        with self._lock:
+            if self._database is None:
+                self._database = self._connect()
+            cursor = self._database.cursor()
+        for name, table in tables.items():
+            if re.search(rf"\b{re.escape(name)}\b", sql):
+                cursor.register(name, table)
+        return cursor
+
+    def query(self, dataset: Dataset, sql: str) -> pd.DataFrame:
+        """Run one generated SELECT against the dataset and return its result."""
+        if duckdb is None:
+            raise SqlError("The SQL engine needs the duckdb package.")
+        try:
+            statements = duckdb.extract_statements(sql)
+        except duckdb.Error as e:
+            raise SqlError(str(e)) from e
+        if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+            raise SqlError("Only a single SELECT statement can be run.")
+        cursor = self.cursor(dataset, sql)
+        try:
+            cursor.execute(sql)
+            description = cursor.description
+            result = cursor.df()
+        except duckdb.Error as e:
+            raise SqlError(str(e)) from e
+        finally:
+            cursor.close()
+        # SUM over integers is a HUGEINT, which pandas gets as float64: counts stay integers, as with pandas.
+        for name, type_code, *_ in description:
+            if str(type_code) == "HUGEINT" and result[name].notna().all():
+                result[name] = result[name].astype("int64")
+        return result
+
+    def _connect(self) -> "duckdb.DuckDBPyConnection":
+        config = {}
+        if self.threads:
+            config["threads"] = self.threads
+        if self.memory_mb:
+            config["memory_limit"] = f"{self.memory_mb}MB"
+        database = duckdb.connect(config=config)
+        database.execute("SET enable_external_access = false")
+        database.execute("SET lock_configuration = true")
+        return database
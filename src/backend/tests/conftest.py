@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The backend is a flat set of modules run from src/backend.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from dataset_prep import prepare_dataset  # noqa: E402
+from location_index import LocationIndex  # noqa: E402
+from rollups import build_rollups  # noqa: E402
+
+COUNTIES = {"Texas": ["Harris", "Dallas", "Travis"], "California": ["Los Angeles", "Orange"],
+            "New York": ["Kings", "Queens"]}
+
+
+@pytest.fixture(scope="session")
+def us_deaths():
+    """A small prepared us_deaths-like frame, its rollups and location index."""
+    rng = np.random.default_rng(7)
+    dates = pd.date_range("2020-03-01", "2020-04-30")
+    rows = []
+    # Raw files are not in (state, date) order; prepare_dataset sorts them.
+    for state, counties in reversed(COUNTIES.items()):
+        for county in counties:
+            daily = rng.integers(0, 50, len(dates))
+            rows.append(pd.DataFrame({"Province_State": state, "Admin2": county, "Date": dates.strftime("%Y-%m-%d"),
+                                      "Deaths": daily.cumsum(), "Daily_Deaths": daily}))
+    df = prepare_dataset(pd.concat(rows, ignore_index=True))
+    return df, build_rollups(df), LocationIndex(df)
@@ -0,0 +1,114 @@
+"""Each rewrite returns what the snippet computed before it was rewritten."""
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import pytest
+
+import code_rewrite
+from code_rewrite import rewrite_code, snippet_schema
+from sandbox import run_generated_code
+
+
+def run(code, df, frames, index, rewrite, monkeypatch):
+    monkeypatch.setattr(code_rewrite, "REWRITE_CODE", rewrite)
+    rewrite_code.cache_clear()
+    try:
+        return run_generated_code(code, df, frames, index, pd=pd, px=px, go=go)
+    finally:
+        rewrite_code.cache_clear()
+
+
+def assert_same(before, after):
+    if isinstance(before, go.Figure):
+        assert before.to_json() == after.to_json()
+    elif isinstance(before, pd.DataFrame):
+        pd.testing.assert_frame_equal(before.reset_index(drop=True), after.reset_index(drop=True),
+                                      check_dtype=False, check_categorical=False)
+    elif isinstance(before, pd.Series):
+        pd.testing.assert_series_equal(before, after, check_dtype=False, check_categorical=False)
+    else:
+        assert before == after
+
+
+# (snippet, rewrite expected to fire, names to compare)
+CASES = {
+    "slice_location": (
+        "tx = df[df['Province_State'] == 'Texas']\ntotal = tx['Daily_Deaths'].sum()",
+        "slice_location", ["tx", "total"]),
+    "slice_location_dates": (
+        "tx = df[(df['Province_State'] == 'California') & (df['Date'] >= '2020-03-10') & (df['Date'] <= '2020-04-05')]\n"
+        "peak_date = tx.groupby('Date')['Daily_Deaths'].sum().idxmax()",
+        "slice_location", ["tx", "peak_date"]),
+    "slice_location_between": (
+        "c = df.loc[(df.Admin2 == 'Harris') & df['Date'].between('2020-04-01', pd.Timestamp('2020-04-20'))]",
+        "slice_location", ["c"]),
+    "slice_location_exact": (
+        "tx = df[df['Province_State'] == 'texas']\ntotal = tx['Daily_Deaths'].sum()",
+        "slice_location", ["tx", "total"]),
+    "rollup": (
+        "daily = df.groupby('Date')['Daily_Deaths'].sum()\ntotal = daily.sum()\nmax_daily = daily.max()",
+        "rollup", ["daily", "total", "max_daily"]),
+    "rollup_state": (
+        "s = df.groupby(['Province_State', 'Date'], observed=True)[['Daily_Deaths', 'Deaths']].sum().reset_index()",
+        "rollup", ["s"]),
+    "rollup_key_order": (
+        "s = df.groupby(['Date', 'Province_State'], observed=True)['Deaths'].sum()",
+        "rollup", ["s"]),
+    "drop_to_datetime": (
+        "df['Date'] = pd.to_datetime(df['Date'])\nrows = df[pd.to_datetime(df['Date']) >= '2020-04-01']\n"
+        "total = rows['Daily_Deaths'].sum()",
+        "drop_to_datetime", ["total"]),
+    "drop_show": (
+        "daily = df.groupby('Date')['Daily_Deaths'].sum().reset_index()\n"
+        "fig = px.line(daily, x='Date', y='Daily_Deaths')\nfig.show()",
+        "drop_show", ["fig"]),
+}
+
+
+@pytest.mark.parametrize("name", list(CASES))
+def test_rewrite_is_equivalent(name, us_deaths, monkeypatch):
+    code, rewrite, compared = CASES[name]
+    df, rollups, index = us_deaths
+    _, fired = rewrite_code(code, snippet_schema(df, rollups, True))
+    assert rewrite in fired
+    if rewrite == "drop_show":
+        # fig.show() cannot run here; the rewritten snippet must match it without the call.
+        before = run(code.replace("\nfig.show()", ""), df, rollups, index, False, monkeypatch)
+    else:
+        before = run(code, df, rollups, index, False, monkeypatch)
+    after = run(code, df, rollups, index, True, monkeypatch)
+    for variable in compared:
+        assert_same(before[variable], after[variable])
+
+
+def test_reset_index_plots_the_group_keys(us_deaths, monkeypatch):
+    df, rollups, index = us_deaths
+    code = "daily = df.groupby('Date')['Daily_Deaths'].sum()\nfig = px.bar(daily, x='Date', y='Daily_Deaths')"
+    _, fired = rewrite_code(code, snippet_schema(df, rollups, True))
+    assert "reset_index" in fired
+    expected = run(code.replace(".sum()", ".sum().reset_index()"), df, rollups, index, False, monkeypatch)
+    assert_same(expected["fig"], run(code, df, rollups, index, True, monkeypatch)["fig"])
+
+
+def test_daily_measure_on_a_daily_only_frame(us_deaths, monkeypatch):
+    df, rollups, index = us_deaths
+    df = df.drop(columns=["Deaths"])
+    code = "tx = df[df['Province_State'] == 'Texas']\nfig = px.line(tx, x='Date', y='Deaths', color='Admin2')"
+    _, fired = rewrite_code(code, snippet_schema(df, None, False))
+    assert fired == ("daily_measure",)
+    expected = run(code.replace("y='Deaths'", "y='Daily_Deaths'"), df, None, None, False, monkeypatch)
+    assert_same(expected["fig"], run(code, df, None, None, True, monkeypatch)["fig"])
+
+
+@pytest.mark.parametrize("code", [
+    # df is rebound before the mask, so the index no longer describes it
+    "df = df[df['Daily_Deaths'] > 0]\ntx = df[df['Province_State'] == 'Texas']",
+    # categorical keys without observed=True also yield the unobserved combinations
+    "s = df.groupby(['Province_State', 'Date'])['Daily_Deaths'].sum()",
+    # a mean is not a rollup lookup
+    "s = df.groupby('Date')['Daily_Deaths'].mean()",
+    "this is not python",
+])
+def test_unsafe_snippets_are_left_alone(code, us_deaths):
+    df, rollups, _ = us_deaths
+    assert rewrite_code(code, snippet_schema(df, rollups, True)) == (code, ())
@@ -0,0 +1,77 @@
+"""Summary fast path: what it parses, and that its answers match pandas on the full frame."""
+import pandas as pd
+import pytest
+
+from dataset_prep import location_vocabulary
+from intent_parser import SummaryFastPath, parse_summary_intent
+
+
+@pytest.fixture(scope="module")
+def vocabulary(us_deaths):
+    return location_vocabulary(us_deaths[0])
+
+
+@pytest.mark.parametrize("query, metrics, location, start, end", [
+    ("Total deaths in Texas", ["total"], ("Province_State", "Texas"), None, None),
+    ("What was the peak day of deaths in new york?", ["peak_date"], ("Province_State", "New York"), None, None),
+    ("max daily deaths in Harris between 2020-03-10 and 2020-04-10", ["max_daily"], ("Admin2", "Harris"),
+     "2020-03-10", "2020-04-10"),
+    ("How many COVID-19 deaths in the US in April 2020", ["total"], None, "2020-04-01", "2020-04-30"),
+    ("total deaths in California since 2020-04-15", ["total"], ("Province_State", "California"),
+     "2020-04-15", None),
+    ("peak date and highest daily deaths on 2020-03-20", ["peak_date", "max_daily"], None,
+     "2020-03-20", "2020-03-20"),
+])
+def test_parses_summary_questions(query, metrics, location, start, end, vocabulary):
+    intent = parse_summary_intent(query, "us_deaths", vocabulary)
+    assert intent["metrics"] == metrics
+    assert intent["measure"] == "Daily_Deaths"
+    assert intent["location"] == location
+    assert intent["start"] == (None if start is None else pd.Timestamp(start))
+    assert intent["end"] == (None if end is None else pd.Timestamp(end))
+
+
+@pytest.mark.parametrize("query", [
+    "total cases in Texas",  # the wrong measure for this dataset
+    "total cases and deaths in Texas",
+    "average deaths in Texas",  # a word it does not understand
+    "total deaths in Texas in the last 30 days",
+    "plot deaths in Texas",  # no metric
+])
+def test_leaves_other_questions_to_the_llm(query, vocabulary):
+    assert parse_summary_intent(query, "us_deaths", vocabulary) is None
+
+
+def pandas_answer(df, location, start, end):
+    """The values a generated pandas snippet computes: filter, then daily totals."""
+    rows = df if location is None else df[df[location[0]] == location[1]]
+    if start is not None:
+        rows = rows[rows["Date"] >= start]
+    if end is not None:
+        rows = rows[rows["Date"] <= end]
+    daily = rows.groupby("Date")["Daily_Deaths"].sum()
+    return {"total": daily.sum(), "max_daily": daily.max(), "peak_date": daily.idxmax()}
+
+
+@pytest.mark.parametrize("query, location, start, end", [
+    ("total, max daily and peak date of deaths", None, None, None),
+    ("total, max daily and peak date of deaths in Texas", ("Province_State", "Texas"), None, None),
+    ("total, max daily and peak date of deaths in Orange between 2020-03-05 and 2020-04-12",
+     ("Admin2", "Orange"), "2020-03-05", "2020-04-12"),
+    ("total, max daily and peak date of deaths in New York in March 2020", ("Province_State", "New York"),
+     "2020-03-01", "2020-03-31"),
+    ("total, max daily and peak date of deaths in California until 2020-03-15", ("Province_State", "California"),
+     None, "2020-03-15"),
+])
+def test_fast_path_matches_pandas(query, location, start, end, us_deaths, vocabulary):
+    df, rollups, _ = us_deaths
+    values = SummaryFastPath().answer(query, "us_deaths", "us_deaths:1:1", df, rollups, vocabulary)
+    expected = pandas_answer(df, location, start and pd.Timestamp(start), end and pd.Timestamp(end))
+    assert values == expected
+
+
+def test_fast_path_without_rows_in_range(us_deaths, vocabulary):
+    df, rollups, _ = us_deaths
+    values = SummaryFastPath().answer("total deaths in Texas in 2021", "us_deaths", "us_deaths:1:1", df, rollups,
+                                      vocabulary)
+    assert values == {"total": "Data not available"}
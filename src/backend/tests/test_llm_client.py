@@ -0,0 +1,118 @@
+"""LLMClient against a local stub of the chat-completions endpoint."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from llm_client import LLMClient, LLMError
+
+COMPLETION = json.dumps({"choices": [{"message": {"content": "fig = 1"}}]}).encode()
+
+
+class StubLLM(ThreadingHTTPServer):
+    """Answers each POST with the next scripted action: ("status", code), ("sleep", s) or ("trickle", s)."""
+
+    daemon_threads = True
+
+    def __init__(self, actions):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.actions = list(actions)
+        self.calls = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        server = self.server
+        kind, value = server.actions[min(server.calls, len(server.actions) - 1)]
+        server.calls += 1
+        if kind == "status" and value != 200:
+            self.send_response(value)
+            self.send_header("Content-Length", "4")
+            self.end_headers()
+            self.wfile.write(b"busy")
+            return
+        if kind == "sleep":
+            time.sleep(value)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        try:
+            for byte in range(len(COMPLETION)):
+                self.wfile.write(COMPLETION[byte:byte + 1])
+                self.wfile.flush()
+                if kind == "trickle":
+                    time.sleep(value)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+@pytest.fixture
+def stub(request):
+    server = StubLLM(request.param)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def client(server: StubLLM, **kwargs) -> LLMClient:
+    options = {"connect_timeout": 1.0, "read_timeout": 5.0, "deadline": 5.0, "max_retries": 3,
+               "backoff": 0.01, "min_attempt": 0.1, **kwargs}
+    return LLMClient("test-key", base_url=server.url, **options)
+
+
+@pytest.mark.parametrize("stub", [[("status", 503), ("status", 429), ("status", 200)]], indirect=True)
+def test_retries_busy_statuses(stub):
+    assert client(stub).complete([{"role": "user", "content": "q"}], "model") == "fig = 1"
+    assert stub.calls == 3
+
+
+@pytest.mark.parametrize("stub", [[("status", 400)]], indirect=True)
+def test_does_not_retry_client_errors(stub):
+    with pytest.raises(LLMError) as error:
+        client(stub).complete([{"role": "user", "content": "q"}], "model")
+    assert error.value.status_code == 400
+    assert stub.calls == 1
+
+
+@pytest.mark.parametrize("stub", [[("sleep", 1.0), ("status", 200)]], indirect=True)
+def test_read_timeout_is_retried(stub):
+    assert client(stub, read_timeout=0.3).complete([{"role": "user", "content": "q"}], "model") == "fig = 1"
+    assert stub.calls == 2
+
+
+@pytest.mark.parametrize("stub", [[("sleep", 3.0)]], indirect=True)
+def test_read_timeout_is_capped_by_the_deadline(stub):
+    started = time.monotonic()
+    with pytest.raises(LLMError):
+        client(stub, read_timeout=10.0, deadline=0.5, max_retries=0).complete([{"role": "user", "content": "q"}],
+                                                                              "model")
+    assert time.monotonic() - started < 1.5
+
+
+@pytest.mark.parametrize("stub", [[("trickle", 0.05)]], indirect=True)
+def test_trickling_body_stops_at_the_deadline(stub):
+    # every read is well within read_timeout, but the whole body takes ~2s
+    started = time.monotonic()
+    with pytest.raises(LLMError, match="deadline"):
+        client(stub, read_timeout=1.0, deadline=0.5).complete([{"role": "user", "content": "q"}], "model")
+    assert time.monotonic() - started < 1.0
+    assert stub.calls == 1
+
+
+@pytest.mark.parametrize("stub", [[("sleep", 0.4)]], indirect=True)
+def test_no_retry_without_time_for_another_attempt(stub):
+    with pytest.raises(LLMError):
+        client(stub, read_timeout=0.2, deadline=1.0, min_attempt=0.9).complete([{"role": "user", "content": "q"}],
+                                                                               "model")
+    assert stub.calls == 1
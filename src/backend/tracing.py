@@ -0,0 +1,164 @@
+"""Per-stage latency spans, Prometheus metrics and per-request trace logs.
+
+`init_app(app)` gives every request a `Trace` (reachable through
+`current_trace()`), and handlers wrap each pipeline stage in
+`trace.span("llm")`, `trace.span("prompt")`, ... Stages that run in an
+executor process come back as a `Timings` dict and are merged with
+`trace.add_timings`. When the response leaves, the trace feeds:
+
+- `covizzz_stage_seconds{route,stage}`       histogram per stage
+- `covizzz_request_seconds{route,status}`    histogram of whole requests
+- `covizzz_response_bytes{route}`            histogram of body sizes
+
+which `GET /metrics` exposes in the Prometheus text format. It also
+prints one JSON trace line per request (TRACE_LOG=0 turns that off), so
+it is easy to see whether the time went to OpenRouter or to pandas.
+"""
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+from flask import Flask, Response, g, has_request_context, request
+
+from serialization import dumps
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+TRACE_LOG = os.getenv("TRACE_LOG", "1") != "0"
+METRIC_HELP = {
+    "covizzz_stage_seconds": "Time spent in each request pipeline stage.",
+    "covizzz_request_seconds": "End-to-end request latency.",
+    "covizzz_response_bytes": "Response body size.",
+}
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[Tuple[Tuple[str, str], ...], Histogram]] = {}
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = LATENCY_BUCKETS, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def render(self) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._histograms.items()):
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(series.items()):
+                    labels = ",".join(f'{k}="{v}"' for k, v in key)
+                    cumulative = 0
+                    for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                        cumulative += count
+                        le = bound if bound == "+Inf" else f"{bound:g}"
+                        lines.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="{le}"}} {cumulative}')
+                    lines.append(f"{name}_sum{{{labels}}} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{{{labels}}} {cumulative}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+class Timings(dict):
+    """Stage name -> seconds; plain dict so it pickles back from executors."""
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self[name] = self.get(name, 0.0) + time.perf_counter() - started
+
+
+class Trace:
+    def __init__(self, route: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.route = route
+        self.started = time.perf_counter()
+        self.timings = Timings()
+        self.attributes: Dict[str, object] = {}
+
+    def span(self, stage: str):
+        return self.timings.stage(stage)
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def add_timings(self, timings: Optional[Dict[str, float]]) -> None:
+        for stage, seconds in (timings or {}).items():
+            self.record(stage, seconds)
+
+    def set(self, **attributes: object) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self, status: int, response_bytes: Optional[int]) -> None:
+        total = time.perf_counter() - self.started
+        for stage, seconds in self.timings.items():
+            METRICS.observe("covizzz_stage_seconds", seconds, route=self.route, stage=stage)
+        METRICS.observe("covizzz_request_seconds", total, route=self.route, status=str(status))
+        if response_bytes is not None:
+            METRICS.observe("covizzz_response_bytes", response_bytes, SIZE_BUCKETS, route=self.route)
+        if TRACE_LOG:
+            print("trace " + dumps({
+                "trace_id": self.id, "route": self.route, "status": status,
+                "total_ms": round(total * 1000, 2), "response_bytes": response_bytes,
+                "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in self.timings.items()},
+                **self.attributes,
+            }).decode())
+
+
+def current_trace() -> Trace:
+    """The request's trace (a throwaway one outside a request)."""
+    if has_request_context() and "trace" in g:
+        return g.trace
+    return Trace("none")
+
+
+def init_app(app: Flask, routes: Sequence[str] = ("/query", "/summary", "/batch_query", "/batch_summary")) -> None:
+    """Trace `routes` and serve GET /metrics."""
+
+    @app.before_request
+    def start_trace():
+        if request.path in routes:
+            g.trace = Trace(request.path)
+
+    @app.after_request
+    def finish_trace(response: Response) -> Response:
+        trace = g.pop("trace", None)
+        if trace is not None:
+            response.headers["X-Trace-Id"] = trace.id
+            trace.finish(response.status_code, response.calculate_content_length())
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
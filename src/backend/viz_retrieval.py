@@ -0,0 +1,87 @@
+"""Vector retrieval over visualizations.json for app2's /get_visualization.
+
+Each visualization's title, description and tags are embedded once
+(sentence-transformers) into a `visualizations` collection stored under
+VIZ_CHROMA_PATH (data/viz_chroma, untracked, so the checked-in chroma_db
+is never written to), and only entries whose text or embedding model
+changed are re-embedded on later starts. A query is embedded locally and answered with
+the top-k entries by cosine similarity; the caller decides whether the best
+match is confident enough on its own or whether the LLM should rerank the
+handful of candidates instead of reading the whole catalog.
+"""
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+COLLECTION = "visualizations"
+
+
+def visualization_text(viz: dict) -> str:
+    """The text a visualization is embedded (and matched) by."""
+    tags = ", ".join(viz.get("tags", []))
+    return f"{viz.get('title', '')}. {viz.get('description', '')} Tags: {tags}"
+
+
+class VisualizationIndex:
+    def __init__(self, visualizations: List[dict], path: str = "data/viz_chroma",
+                 model_name: str = "all-MiniLM-L6-v2", top_k: int = 5):
+        import chromadb
+        from chromadb.config import Settings
+        from sentence_transformers import SentenceTransformer
+
+        self.by_id: Dict[str, dict] = {viz["id"]: viz for viz in visualizations}
+        self.model_name = model_name
+        self.top_k = top_k
+        self._model = SentenceTransformer(model_name)
+        self._client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+        self._collection = self._client.get_or_create_collection(COLLECTION, metadata={"hnsw:space": "cosine"})
+        self.sync()
+
+    @classmethod
+    def from_env(cls, visualizations: List[dict]) -> "VisualizationIndex":
+        return cls(
+            visualizations,
+            path=os.getenv("VIZ_CHROMA_PATH", "data/viz_chroma"),
+            model_name=os.getenv("VIZ_EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+            top_k=int(os.getenv("VIZ_TOP_K", "5")),
+        )
+
+    def sync(self) -> int:
+        """Embed new or changed visualizations, drop removed ones; return how many were embedded."""
+        stored = self._collection.get(include=["documents", "metadatas"])
+        current = {
+            viz_id: (doc, meta) for viz_id, doc, meta in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        }
+        changed = [
+            viz for viz_id, viz in self.by_id.items()
+            if current.get(viz_id, (None, {}))[0] != visualization_text(viz)
+            or (current[viz_id][1] or {}).get("model") != self.model_name
+        ]
+        if changed:
+            documents = [visualization_text(viz) for viz in changed]
+            self._collection.upsert(
+                ids=[viz["id"] for viz in changed],
+                documents=documents,
+                embeddings=self._embed(documents).tolist(),
+                metadatas=[{"model": self.model_name} for _ in changed],
+            )
+        removed = [viz_id for viz_id in current if viz_id not in self.by_id]
+        if removed:
+            self._collection.delete(ids=removed)
+        return len(changed)
+
+    def search(self, query: str, k: Optional[int] = None) -> List[Tuple[dict, float]]:
+        """Top-k (visualization, cosine similarity) pairs, best first."""
+        k = min(k or self.top_k, len(self.by_id))
+        if k == 0:
+            return []
+        result = self._collection.query(query_embeddings=self._embed([query]).tolist(), n_results=k)
+        return [
+            (self.by_id[viz_id], 1.0 - float(distance))
+            for viz_id, distance in zip(result["ids"][0], result["distances"][0])
+            if viz_id in self.by_id
+        ]
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        return self._model.encode(texts, normalize_embeddings=True)
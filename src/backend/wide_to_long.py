@@ -0,0 +1,121 @@
+"""Chunked wide-to-long transform for the JHU time-series files.
+
+The raw files have one row per location and one cumulative column per date
+(~1100 of them). Melting a whole file at once, and then hash-merging
+confirmed with deaths, holds several copies of the long table in memory.
+Here the files are read in row chunks. Each chunk is melted with plain
+numpy reshapes (location-major: every date of row 0, then row 1, ...), and
+`Daily_*` is the difference from the previous date. The confirmed and
+deaths files share their row order (by UID), so they are joined
+positionally, chunk against chunk, instead of merged; each chunk pair must
+have the same ids and dates, and both files the same number of rows. Output is written
+chunk by chunk, so peak memory is bounded by `chunk_rows`, not by the file.
+
+Usage (from src/backend), to write a joined long CSV from a confirmed/deaths pair:
+    python wide_to_long.py data/time_series_covid19_confirmed_US.csv \
+        data/time_series_covid19_deaths_US.csv data/covid19_us_long.csv [--ids Admin2 Province_State]
+"""
+import argparse
+import os
+from itertools import zip_longest
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+RAW_DATE_FORMAT = "%m/%d/%y"
+CHUNK_ROWS = int(os.getenv("WIDE_CHUNK_ROWS", "256"))
+# location columns kept by default (US and global file layouts)
+LOCATION_COLUMNS = ("Admin2", "Province_State", "Country_Region", "Province/State", "Country/Region")
+
+
+def wide_date_columns(columns: Iterable[str]) -> Dict[str, pd.Timestamp]:
+    """Wide-file date columns ('1/22/20') in file order, parsed."""
+    dates = {}
+    for col in columns:
+        try:
+            dates[col] = pd.to_datetime(col, format=RAW_DATE_FORMAT)
+        except ValueError:
+            continue
+    return dates
+
+
+def melt_cumulative(ids: pd.DataFrame, cumulative: np.ndarray, dates: Sequence[pd.Timestamp],
+                    cumulative_name: str, daily_name: str, before: Optional[np.ndarray] = None) -> pd.DataFrame:
+    """Long rows for a block of wide rows: ids, Date, cumulative and daily values.
+
+    `before` holds each row's cumulative value on the day preceding `dates`
+    (zeros when `dates` starts at the beginning of the series).
+    """
+    if before is None:
+        before = np.zeros(len(cumulative), dtype=cumulative.dtype)
+    daily = np.diff(cumulative, axis=1, prepend=before.reshape(-1, 1))
+    rows = ids.loc[ids.index.repeat(len(dates))].reset_index(drop=True)
+    rows["Date"] = np.tile(np.asarray(dates, dtype="datetime64[ns]"), len(ids))
+    rows[cumulative_name] = cumulative.ravel()
+    rows[daily_name] = daily.ravel()
+    return rows
+
+
+def iter_long(path: Path, cumulative_name: str, daily_name: str, id_columns: List[str],
+              chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Melt one wide file chunk by chunk."""
+    dates = wide_date_columns(pd.read_csv(path, nrows=0).columns)
+    for chunk in pd.read_csv(path, usecols=id_columns + list(dates), chunksize=chunk_rows):
+        cumulative = chunk[list(dates)].fillna(0).to_numpy(dtype="int64")
+        yield melt_cumulative(chunk[id_columns].reset_index(drop=True), cumulative, list(dates.values()),
+                              cumulative_name, daily_name)
+
+
+def iter_joined(confirmed_path: Path, deaths_path: Path, id_columns: List[str],
+                chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Confirmed and deaths melted side by side: ids, Date, Cases, Daily_Cases, Deaths, Daily_Deaths."""
+    header = list(pd.read_csv(confirmed_path, nrows=0).columns)
+    # UID (when present) pins the row order the positional join relies on.
+    keys = ["UID"] if "UID" in header else id_columns
+    cases = iter_long(confirmed_path, "Cases", "Daily_Cases", list(dict.fromkeys(keys + id_columns)), chunk_rows)
+    deaths = iter_long(deaths_path, "Deaths", "Daily_Deaths", keys, chunk_rows)
+    for left, right in zip_longest(cases, deaths):
+        if left is None or right is None:
+            raise ValueError(f"{confirmed_path} and {deaths_path} do not have the same number of rows")
+        if len(left) != len(right) or not left[keys].equals(right[keys]) or not left["Date"].equals(right["Date"]):
+            raise ValueError(f"{confirmed_path} and {deaths_path} are not in the same row/date order")
+        left["Deaths"] = right["Deaths"].to_numpy()
+        left["Daily_Deaths"] = right["Daily_Deaths"].to_numpy()
+        yield left.drop(columns=[key for key in keys if key not in id_columns])
+
+
+def write_csv(chunks: Iterable[pd.DataFrame], out: Path) -> int:
+    """Stream chunks into one CSV (replaced atomically); return rows written."""
+    out = Path(out)
+    tmp = out.with_suffix(f".csv.{os.getpid()}.tmp")
+    rows = 0
+    try:
+        with open(tmp, "w", newline="") as f:
+            for i, chunk in enumerate(chunks):
+                chunk.to_csv(f, header=i == 0, index=False, date_format="%Y-%m-%d")
+                rows += len(chunk)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    tmp.replace(out)
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Join a JHU confirmed/deaths pair into one long CSV.")
+    parser.add_argument("confirmed", type=Path)
+    parser.add_argument("deaths", type=Path)
+    parser.add_argument("out", type=Path)
+    parser.add_argument("--ids", nargs="+", help="id columns to keep (default: the file's location columns)")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+    header = pd.read_csv(args.confirmed, nrows=0).columns
+    ids = args.ids or [col for col in LOCATION_COLUMNS if col in header]
+    rows = write_csv(iter_joined(args.confirmed, args.deaths, ids, args.chunk_rows), args.out)
+    print(f"✅ {rows} rows written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
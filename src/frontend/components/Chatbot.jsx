@@ -29,16 +29,14 @@ const Chatbot = () => {
     setLoading(true);
 
     try {
-      const response = await axios.post(
+      // GET so the browser cache revalidates repeat questions (ETag -> 304)
+      const response = await axios.get(
         "http://localhost:5000/query",
         // "https://covizzz-backend.onrender.com/query",
         {
-          query: input,
-          dataset: dataset,
-        },
-        {
-          headers: {
-            "Content-Type": "application/json",
+          params: {
+            query: input,
+            dataset: dataset,
           },
         }
       );